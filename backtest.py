@@ -0,0 +1,310 @@
+"""
+Backtests the Bollinger band order grid over stored candles for a grid of parameter sets.
+
+    python backtest.py candles.npz --grid grid.yaml --workers 8 --top 20
+    python backtest.py --download BTC-USDT --days 365 --out candles.npz
+
+Candles are read from an exchange export (exchange.export().dump(..., fmt="npz"), or the
+--download file), a Feather/Parquet candles table, or a CSV with the KCTa.get_ta column names.
+
+The grid file lists the values to try for each strategy setting; every combination is tested,
+pairing order_levels and order_volumes of the same length:
+
+    candle_length: ["1min", "5min"]
+    sma_period: [10, 20, "30:100:10"]
+    order_levels: [[1, 2, 3], [1, 2, 3, 5, 8, 13]]
+    order_volumes: [[10, 15, 25], [10, 15, 25, 40, 55, 76]]
+    fee_rate: 0.001
+
+Each order level is an independent slot that buys order_volumes[i] worth of base at the lower
+band of the previous candle and sells it at the upper band. A slot's fills depend only on the
+candle length, the SMA period and its level, never on its volume, so they are simulated once per
+level and every parameter set's equity curve is a volume-weighted sum of the per-level curves.
+Parameter sets that share a candle length and SMA period are evaluated together in one worker
+process as a single matrix product.
+"""
+import argparse
+import itertools
+import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bot_config import CANDLE_LENGTHS
+from exchanges.kucoin.kucoin_export import CANDLE_FIELDS, load_numpy
+from exchanges.kucoin.kucoin_ta import bollinger_bands
+
+log = logging.getLogger("Backtest")
+
+CANDLE_SECONDS = {
+    "1min": 60, "3min": 3 * 60, "5min": 5 * 60, "15min": 15 * 60, "30min": 30 * 60,
+    "1hour": 60 * 60, "2hour": 2 * 60 * 60, "4hour": 4 * 60 * 60, "6hour": 6 * 60 * 60,
+    "8hour": 8 * 60 * 60, "12hour": 12 * 60 * 60, "1day": 24 * 60 * 60, "1week": 7 * 24 * 60 * 60,
+}
+# KuCoin returns at most 1500 candles per request.
+_KLINE_PAGE = 1500
+# Parameter sets per matrix product; bounds memory at chunk x candles floats.
+_CHUNK = 32
+
+_candles = None
+_resampled = {}
+
+
+def load_candles(path):
+    """
+    Returns the stored candles as a structured array (CANDLE_FIELDS), oldest first, without duplicates.
+    """
+    np = load_numpy()
+    if path.endswith(".npz"):
+        with np.load(path) as archive:
+            candles = archive["candles"]
+    elif path.endswith(".csv"):
+        table = np.genfromtxt(path, delimiter=",", names=True)
+        candles = np.empty(len(table), dtype=CANDLE_FIELDS)
+        for name, _ in CANDLE_FIELDS:
+            candles[name] = table[name]
+    else:
+        import pyarrow.feather
+        import pyarrow.parquet
+
+        table = pyarrow.parquet.read_table(path) if path.endswith(".parquet") else pyarrow.feather.read_table(path)
+        candles = np.empty(table.num_rows, dtype=CANDLE_FIELDS)
+        for name, _ in CANDLE_FIELDS:
+            candles[name] = table.column(name).to_numpy()
+
+    _, unique = np.unique(candles["open_time"], return_index=True)
+    return candles[unique]
+
+
+def resample(candles, candle_length):
+    """
+    Aggregates 1-minute (or any shorter) candles into candle_length candles.
+    """
+    np = load_numpy()
+    seconds = CANDLE_SECONDS[candle_length]
+    buckets = candles["open_time"] // seconds * seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(candles)] - 1
+
+    result = np.empty(len(starts), dtype=CANDLE_FIELDS)
+    result["open_time"] = buckets[starts]
+    result["open"] = candles["open"][starts]
+    result["close"] = candles["close"][ends]
+    result["high"] = np.maximum.reduceat(candles["high"], starts)
+    result["low"] = np.minimum.reduceat(candles["low"], starts)
+    result["volume"] = np.add.reduceat(candles["volume"], starts)
+    result["amount"] = np.add.reduceat(candles["amount"], starts)
+    return result
+
+
+def _init_worker(path):
+    global _candles
+    _candles = load_candles(path)
+
+
+def _level_curves(candles, mean, std, level, fee_rate):
+    # Simulates one slot with a volume of 1 quote unit: returns its equity curve and fill count.
+    np = load_numpy()
+    count = len(candles)
+    lower = mean - std * level
+    upper = mean + std * level
+    # Orders are priced from the previous candle's bands, so there is no look-ahead.
+    with np.errstate(invalid="ignore"):
+        buys = np.flatnonzero(candles["low"][1:] <= lower[:-1]) + 1
+        sells = np.flatnonzero(candles["high"][1:] >= upper[:-1]) + 1
+
+    cash = np.zeros(count)
+    position = np.zeros(count)
+    fills = 0
+    start = 0
+    while True:
+        index = np.searchsorted(buys, start)
+        if index == len(buys):
+            break
+        bought = buys[index]
+        # A limit order that is crossed at the open fills at the open.
+        price = min(lower[bought - 1], candles["open"][bought])
+        quantity = 1.0 / price
+        cash[bought] -= 1.0 + fee_rate
+        position[bought] += quantity
+        fills += 1
+
+        index = np.searchsorted(sells, bought + 1)
+        if index == len(sells):
+            break
+        sold = sells[index]
+        price = max(upper[sold - 1], candles["open"][sold])
+        cash[sold] += quantity * price * (1.0 - fee_rate)
+        position[sold] -= quantity
+        fills += 1
+        start = sold + 1
+
+    return np.cumsum(cash) + np.cumsum(position) * candles["close"], fills
+
+
+def evaluate_group(candle_length, sma_period, parameter_sets, fee_rate):
+    """
+    Evaluates every parameter set that shares a candle length and SMA period.
+
+    Returns a list of result dicts in the order of parameter_sets.
+    """
+    np = load_numpy()
+    if candle_length not in _resampled:
+        _resampled[candle_length] = resample(_candles, candle_length)
+    candles = _resampled[candle_length]
+
+    bands = bollinger_bands(candles["close"], sma_period, [1.0])
+    mean = (bands[:, 0, 0] + bands[:, 0, 1]) / 2
+    std = (bands[:, 0, 0] - bands[:, 0, 1]) / 2
+
+    levels = sorted({float(level) for parameters in parameter_sets for level in parameters["order_levels"]})
+    column = {level: index for index, level in enumerate(levels)}
+    curves = np.empty((len(levels), len(candles)))
+    level_fills = np.empty(len(levels))
+    for index, level in enumerate(levels):
+        curves[index], level_fills[index] = _level_curves(candles, mean, std, level, fee_rate)
+
+    weights = np.zeros((len(parameter_sets), len(levels)))
+    for row, parameters in enumerate(parameter_sets):
+        for level, volume in zip(parameters["order_levels"], parameters["order_volumes"]):
+            weights[row, column[float(level)]] += volume
+
+    results = []
+    for start in range(0, len(parameter_sets), _CHUNK):
+        chunk = weights[start:start + _CHUNK]
+        equity = chunk @ curves
+        drawdown = (np.maximum.accumulate(equity, axis=1) - equity).max(axis=1)
+        fills = (chunk > 0) @ level_fills
+        for offset, parameters in enumerate(parameter_sets[start:start + _CHUNK]):
+            results.append(dict(parameters, pnl=float(equity[offset, -1]), max_drawdown=float(drawdown[offset]),
+                                fills=int(fills[offset])))
+    return results
+
+
+def _expand(values):
+    # "start:stop:step" strings expand to a range, like Python slices.
+    expanded = []
+    for value in values if isinstance(values, list) else [values]:
+        if isinstance(value, str) and ":" in value:
+            start, stop, step = (int(part) for part in value.split(":"))
+            expanded.extend(range(start, stop, step))
+        else:
+            expanded.append(value)
+    return expanded
+
+
+def build_grid(grid):
+    """
+    Returns {(candle_length, sma_period): [parameter set, ...]} for every valid combination.
+    """
+    candle_lengths = _expand(grid.get("candle_length", ["1min"]))
+    for candle_length in candle_lengths:
+        if candle_length not in CANDLE_LENGTHS:
+            raise ValueError(f"candle_length error: {candle_length} is not one of {CANDLE_LENGTHS}.")
+    sma_periods = [int(period) for period in _expand(grid.get("sma_period", [20]))]
+    level_sets = grid.get("order_levels", [[1, 2, 3]])
+    volume_sets = grid.get("order_volumes", [[10, 15, 25]])
+    if level_sets and not isinstance(level_sets[0], list):
+        level_sets = [level_sets]
+    if volume_sets and not isinstance(volume_sets[0], list):
+        volume_sets = [volume_sets]
+
+    grids = {}
+    for candle_length, sma_period in itertools.product(candle_lengths, sma_periods):
+        grids[(candle_length, sma_period)] = [
+            {"candle_length": candle_length, "sma_period": sma_period, "order_levels": levels,
+             "order_volumes": volumes}
+            for levels, volumes in itertools.product(level_sets, volume_sets) if len(levels) == len(volumes)
+        ]
+    return grids
+
+
+def run(path, grid, workers=None):
+    fee_rate = float(grid.get("fee_rate", 0.001))
+    groups = build_grid(grid)
+    total = sum(len(parameter_sets) for parameter_sets in groups.values())
+    log.info("Backtesting %s parameter sets in %s groups", total, len(groups))
+
+    results = []
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as executor:
+        futures = [executor.submit(evaluate_group, candle_length, sma_period, parameter_sets, fee_rate)
+                   for (candle_length, sma_period), parameter_sets in groups.items() if parameter_sets]
+        for future in as_completed(futures):
+            results.extend(future.result())
+    log.info("Backtested %s parameter sets in %.1fs", len(results), time.monotonic() - started)
+    return sorted(results, key=lambda result: result["pnl"], reverse=True)
+
+
+def download(symbol, days, out, sandbox=False):
+    """
+    Downloads `days` of 1-minute candles from the public KuCoin REST API into an .npz file.
+    """
+    from kucoin.client import Market
+
+    np = load_numpy()
+    market = Market(is_sandbox=sandbox)
+    end = int(time.time()) // 60 * 60
+    start = end - days * 24 * 60 * 60
+    rows = []
+    while end > start:
+        page_start = max(start, end - _KLINE_PAGE * 60)
+        page = market.get_kline(symbol, "1min", startAt=page_start, endAt=end)
+        if not page:
+            break
+        rows.extend([int(candle[0])] + [float(value) for value in candle[1:]] for candle in page)
+        end = page_start
+        # Public market data is limited per IP; stay well under it.
+        time.sleep(0.2)
+
+    values = np.array(rows, dtype="f8").reshape(-1, len(CANDLE_FIELDS))
+    candles = np.empty(len(values), dtype=CANDLE_FIELDS)
+    for index, (name, _) in enumerate(CANDLE_FIELDS):
+        candles[name] = values[:, index]
+    np.savez(out, candles=candles)
+    print(f"Saved {len(candles)} candles to {out}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the band order grid over stored candles.")
+    parser.add_argument("candles", nargs="?", help="Stored candles (.npz, .feather, .parquet or .csv).")
+    parser.add_argument("--grid", help="YAML file of parameter values to try (default: configuration.yaml).")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--top", type=int, default=20, help="Number of ranked results to print.")
+    parser.add_argument("--csv", help="Also write every result to this CSV file.")
+    parser.add_argument("--download", metavar="SYMBOL", help="Download 1-minute candles instead of backtesting.")
+    parser.add_argument("--days", type=int, default=365, help="Days of candles to download.")
+    parser.add_argument("--out", default="candles.npz", help="Output file for --download.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    if args.download:
+        download(args.download, args.days, args.out)
+        return 0
+    if not args.candles:
+        parser.error("the candles file is required")
+
+    import yaml
+
+    with open(args.grid or "configuration.yaml", "r") as file:
+        grid = yaml.safe_load(file) or {}
+    results = run(args.candles, grid, args.workers)
+
+    from tabulate import tabulate
+
+    columns = ["candle_length", "sma_period", "order_levels", "order_volumes", "pnl", "max_drawdown", "fills"]
+    rows = [[round(value, 2) if isinstance(value, float) else value for value in (result[column] for column in columns)]
+            for result in results[:args.top]]
+    print(tabulate(rows, headers=columns, tablefmt="pretty"))
+    if args.csv:
+        import csv
+
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Records the KuCoin order book feeds and compares the CPU and memory each book_mode needs.
+
+    python book_bench.py record feed.jsonl --symbol BTC-USDT --seconds 120
+    python book_bench.py replay feed.jsonl --depth 50
+
+record subscribes to /market/level2 and the level2Depth5/50 snapshot topics at once, after
+saving a REST snapshot of the full book, and writes every message as a line of JSON. Credentials,
+sandbox and rest_url are read from --config, so the local mock server can be recorded as well.
+
+replay feeds the recording through the same book code the exchange uses, once per mode: full
+and topk apply the level2 deltas on top of the REST snapshot, depth5 and depth50 apply their
+snapshot topic. It prints the CPU time per mode and message, the levels held at the end, and the
+memory retained by the book and peaked during the replay.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+import tracemalloc
+
+from exchanges.kucoin.kucoin_book import DEPTH_TOPICS, KucoinBookDepth, apply_changes, apply_depth_snapshot
+
+log = logging.getLogger("BookBench")
+
+REPLAY_MODES = ["full", "topk", "depth5", "depth50"]
+
+
+def record(path, symbol, seconds, config):
+    from kucoin.client import Market, WsToken
+    from kucoin.ws_client import KucoinWsClient
+
+    credentials = dict(key=config.get("api_key", ""), secret=config.get("api_secret", ""),
+                       passphrase=config.get("api_passphrase", ""), is_sandbox=(config.get("sandbox") == "True"),
+                       url=config.get("rest_url", ""))
+    topics = ["/market/level2:" + symbol] + [topic + symbol for topic in DEPTH_TOPICS.values()]
+
+    async def run(file):
+        count = 0
+
+        async def on_message(message):
+            nonlocal count
+            if message.get("type") == "message":
+                file.write(json.dumps(message) + "\n")
+                count += 1
+
+        client = await KucoinWsClient.create(None, WsToken(**credentials), on_message, private=False)
+        for topic in topics:
+            await client.subscribe(topic)
+        # The snapshot is taken after subscribing, so no delta between the two is missed.
+        snapshot = await asyncio.to_thread(Market(**credentials).get_aggregated_orderv3, symbol)
+        file.write(json.dumps({"type": "snapshot", "data": snapshot}) + "\n")
+        await asyncio.sleep(seconds)
+        for topic in topics:
+            await client.unsubscribe(topic)
+        return count
+
+    # The SDK reconnect task swallows cancellation, so the loop is not shut down on the way out.
+    loop = asyncio.new_event_loop()
+    with open(path, "w") as file:
+        count = loop.run_until_complete(run(file))
+    print(f"Recorded {count} messages to {path}")
+
+
+def load_feed(path):
+    snapshot = None
+    messages = []
+    with open(path) as file:
+        for line in file:
+            message = json.loads(line)
+            if message.get("type") == "snapshot":
+                snapshot = message["data"]
+            else:
+                messages.append(message)
+    return snapshot, messages
+
+
+def _snapshot_book(snapshot):
+    return {
+        "sequence": int(snapshot["sequence"]),
+        "bids": {float(price): float(size) for price, size in snapshot["bids"]},
+        "asks": {float(price): float(size) for price, size in snapshot["asks"]},
+    }
+
+
+def replay(mode, snapshot, messages, depth=50):
+    """
+    Builds the book for one mode from the recorded messages and returns it with the message count.
+    """
+    if mode in DEPTH_TOPICS:
+        prefix = DEPTH_TOPICS[mode]
+        orderbook = {"sequence": 0, "bids": {}, "asks": {}}
+        count = 0
+        for message in messages:
+            if message["topic"].startswith(prefix):
+                apply_depth_snapshot(orderbook, message["data"])
+                count += 1
+        return orderbook, count
+
+    if snapshot is None:
+        raise ValueError("the recording has no REST snapshot to apply level2 deltas to")
+    bounded = KucoinBookDepth(depth) if mode == "topk" else None
+    orderbook = _snapshot_book(snapshot)
+    if bounded is not None:
+        bounded.reset(orderbook)
+    count = 0
+    for message in messages:
+        if message["topic"].startswith("/market/level2:"):
+            apply_changes(orderbook, message["data"], bounded)
+            if bounded is not None:
+                # A drained side would be re-snapshotted live; the recording has no later snapshot.
+                bounded.trim(orderbook)
+            count += 1
+    return orderbook, count
+
+
+def measure(mode, snapshot, messages, depth=50):
+    started = time.process_time()
+    orderbook, count = replay(mode, snapshot, messages, depth)
+    cpu = time.process_time() - started
+    levels = len(orderbook["bids"]) + len(orderbook["asks"])
+    del orderbook
+
+    # Memory is measured in a second pass, since tracing allocations slows the replay down.
+    tracemalloc.start()
+    orderbook, _ = replay(mode, snapshot, messages, depth)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "mode": mode,
+        "messages": count,
+        "cpu_s": round(cpu, 3),
+        "us_per_message": round(cpu / count * 1e6, 1) if count else 0.0,
+        "levels": levels,
+        "retained_kib": round(retained / 1024, 1),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record the order book feeds and compare book modes.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="Record level2 and depth snapshot messages.")
+    record_parser.add_argument("out", help="Output .jsonl file.")
+    record_parser.add_argument("--symbol", default="BTC-USDT")
+    record_parser.add_argument("--seconds", type=float, default=60.0)
+    record_parser.add_argument("--config", default="configuration.yaml", help="Credentials and rest_url.")
+    replay_parser = commands.add_parser("replay", help="Replay a recording through each book mode.")
+    replay_parser.add_argument("feed", help="A recording made with the record command.")
+    replay_parser.add_argument("--depth", type=int, default=50, help="Levels per side kept by topk.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    if args.command == "record":
+        import yaml
+
+        try:
+            with open(args.config, "r") as file:
+                config = yaml.safe_load(file) or {}
+        except FileNotFoundError:
+            log.warning("%s not found, recording with the public endpoints only", args.config)
+            config = {}
+        record(args.out, args.symbol, args.seconds, config)
+        return 0
+
+    from tabulate import tabulate
+
+    snapshot, messages = load_feed(args.feed)
+    rows = [measure(mode, snapshot, messages, args.depth) for mode in REPLAY_MODES
+            if snapshot is not None or mode in DEPTH_TOPICS]
+    print(tabulate(rows, headers="keys", tablefmt="pretty"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+
+import yaml
+
+from check_config import Check as check
+
+log = logging.getLogger("BotConfig")
+
+CANDLE_LENGTHS = ["1min", "3min", "5min", "15min", "30min", "1hour", "2hour", "4hour", "6hour", "8hour", "12hour",
+                  "1day", "1week"]
+
+
+class BotConfig:
+    """
+    The bot configuration, parsed and validated once and shared by every component.
+
+    Values are read like a dict (config["sma_period"]), so components that take a plain dict
+    work unchanged. The file can be watched for changes: strategy parameters are swapped in place
+    and subscribers are told which keys changed, while changes to connection and other start-up
+    parameters are rejected because nothing would pick them up before a restart.
+    """
+
+    REQUIRED = {
+        "api_key": "No 'api_key' variable in the configuration file.",
+        "api_secret": "No 'api_secret' variable in the configuration file.",
+        "api_passphrase": "No 'api_passphrase' variable in the configuration file.",
+        "receiver_email": "No receiver_email variable in the configuration file.",
+        "sender_email": "No 'sender_email' variable in the configuration file.",
+        "server": "No 'server' variable in the configuration file.",
+        "port": "No 'port' variable in the configuration file.",
+        "base_currency": "No 'base_currency' variable in the configuration file.",
+        "quote_currency": "No 'quote_currency' variable in the configuration file.",
+        "account_type": "No 'account_type' variable in the configuration file.",
+        "sandbox": "No 'sandbox' variable in the configuration file.",
+        "candle_length": "No candle_length variable in the configuration file.",
+        "sma_period": "No 'sma_period' variable in the configuration file.",
+        "order_levels": "No 'order_levels' variable in the configuration file.",
+        "order_volumes": "No 'order_volumes' variable in the configuration file.",
+        "log_level": "No 'log_level' variable in the configuration file.",
+    }
+
+    # These are only read at start-up (clients, subscriptions, the mailer, the scheduler), so they are
+    # never hot-swapped. Every new key that is only read at start-up must be added here.
+    CONNECTION_KEYS = ["api_key", "api_secret", "api_passphrase", "sandbox", "base_currency", "quote_currency",
+                       "asset", "account_type", "candle_length",
+                       "receiver_email", "sender_email", "password", "server", "port",
+                       "rest_requests_per_second", "rest_workers", "rest_read_deadline",
+                       "reference_cache_path", "reference_ttls",
+                       "log_file", "smtp_starttls",
+                       "shm_publish", "shm_name", "shm_depth", "shm_interval",
+                       "rest_url", "overload_lag_ms", "overload_recover_seconds",
+                       "book_mode", "book_depth", "book_cpu_budget", "periodic_tasks",
+                       "cache_budgets", "cache_max_age", "checkpoint_path", "checkpoint_max_age",
+                       "history_page_size", "history_concurrency",
+                       "sub_accounts", "sub_account_keys"]
+
+    def __init__(self, values, path=None):
+        self.validate(values)
+        self._values = dict(values)
+        self._path = path
+        self._mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+        self._subscribers = []
+
+    @classmethod
+    def load(cls, path="configuration.yaml"):
+        with open(path, "r") as file:
+            return cls(yaml.safe_load(file) or {}, path)
+
+    @staticmethod
+    def validate(values):
+        check().config_file(BotConfig.REQUIRED, values)
+
+        if int(values["sma_period"]) < 1:
+            raise ValueError("sma_period error: the SMA period must be a positive integer.")
+        levels, volumes = values["order_levels"], values["order_volumes"]
+        if not isinstance(levels, list) or not isinstance(volumes, list):
+            raise ValueError("order_levels error: order_levels and order_volumes must be lists.")
+        if len(levels) != len(volumes):
+            raise ValueError("order_levels error: order_levels and order_volumes must have the same length.")
+        if any(not isinstance(value, (int, float)) or value <= 0 for value in levels + volumes):
+            raise ValueError("order_levels error: order levels and volumes must be positive numbers.")
+        if values["candle_length"] not in CANDLE_LENGTHS:
+            raise ValueError(f"candle_length error: {values['candle_length']} is not one of {CANDLE_LENGTHS}.")
+        if not isinstance(logging.getLevelName(str(values["log_level"]).upper()), int):
+            raise ValueError(f"log_level error: {values['log_level']} is not a logging level.")
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def as_dict(self):
+        return dict(self._values)
+
+    @property
+    def sma_period(self):
+        return int(self._values["sma_period"])
+
+    @property
+    def order_levels(self):
+        return list(self._values["order_levels"])
+
+    @property
+    def order_volumes(self):
+        return list(self._values["order_volumes"])
+
+    @property
+    def candle_length(self):
+        return self._values["candle_length"]
+
+    @property
+    def log_level(self):
+        return str(self._values["log_level"]).upper()
+
+    def subscribe(self, callback):
+        """
+        Registers callback(changes) to be called with {key: new value} after a reload.
+        """
+        self._subscribers.append(callback)
+
+    def update(self, values):
+        """
+        Validates and applies a new set of values, returning the keys that changed.
+
+        Raises:
+            ValueError: the values are invalid or change a connection parameter.
+        """
+        self.validate(values)
+        changes = {key: value for key, value in values.items() if self._values.get(key) != value}
+        changes.update({key: None for key in self._values if key not in values})
+        rejected = [key for key in changes if key in self.CONNECTION_KEYS]
+        if rejected:
+            raise ValueError(f"{', '.join(rejected)} cannot be changed while the bot is running. "
+                             f"Restart the bot to apply them.")
+        if not changes:
+            return changes
+
+        self._values = dict(values)
+        for callback in self._subscribers:
+            callback(changes)
+        return changes
+
+    def reload(self):
+        """
+        Re-reads the file if it changed since it was last read.
+        """
+        if not self._path:
+            return {}
+        mtime = os.path.getmtime(self._path)
+        if mtime == self._mtime:
+            return {}
+        self._mtime = mtime
+        try:
+            with open(self._path, "r") as file:
+                changes = self.update(yaml.safe_load(file) or {})
+        except (OSError, ValueError, yaml.YAMLError) as ex:
+            log.error(f"Configuration change rejected: {ex}")
+            return {}
+        if changes:
+            log.info("Configuration reloaded, changed: %s", ", ".join(changes))
+        return changes
+
+    async def watch(self, interval=2.0):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.reload()
+            except OSError as ex:
+                log.error(f"Could not check {self._path} for changes: {ex}")
@@ -1,8 +1,173 @@
+import atexit
+import copy
 import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s %(name)s %(levelname)s %(message)s"
 
 
 class BotLog:
     log = logging.getLogger("Bot")
+    _listener = None
+    _counter = None
 
     def __init__(self):
         self.log = logging.getLogger("Bot")
+
+
+class _ByteCountingHandler(logging.Handler):
+    """
+    Wraps the real output handlers on the listener thread and counts bytes written per logger.
+
+    The line is formatted once, here; the output handlers only write it.
+    """
+
+    def __init__(self, handlers):
+        super().__init__()
+        self._handlers = handlers
+        self._lock = threading.Lock()
+        self._bytes = {}
+        self._since = time.monotonic()
+
+    def emit(self, record):
+        line = copy.copy(record)
+        line.msg = self.format(record)
+        line.args = None
+        line.exc_info = None
+        line.exc_text = None
+        line.stack_info = None
+        for handler in self._handlers:
+            if record.levelno >= handler.level:
+                handler.handle(line)
+        size = len(line.msg) + 1
+        with self._lock:
+            self._bytes[record.name] = self._bytes.get(record.name, 0) + size
+
+    def rates(self, reset=True):
+        with self._lock:
+            elapsed = max(time.monotonic() - self._since, 1e-9)
+            rates = {name: count / elapsed for name, count in self._bytes.items()}
+            if reset:
+                self._bytes = {}
+                self._since = time.monotonic()
+        return rates
+
+    def close(self):
+        for handler in self._handlers:
+            handler.close()
+        super().close()
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue with only their message interpolated.
+
+    Like QueueHandler.prepare(), the message is built from its arguments on the thread that logs,
+    so arguments changed afterwards cannot change what is logged, and the arguments and traceback
+    are dropped so the queue does not keep them alive. The traceback is kept as text. Unlike it,
+    the line itself (time stamp, logger, level) is formatted on the listener thread.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(config):
+    """
+    Routes every logger through a queue, so emitting a record only interpolates its message on
+    the caller and never does I/O there.
+
+    A QueueHandler on the root logger hands records to a listener thread that formats and writes
+    them to stderr (and to config['log_file'] when set). The level is set once on the root logger
+    from config['log_level'] instead of by each component.
+    """
+    if BotLog._listener is not None:
+        set_level(config["log_level"])
+        return BotLog._listener
+
+    handlers = [logging.StreamHandler()]
+    if config.get("log_file"):
+        handlers.append(logging.FileHandler(config["log_file"]))
+    for handler in handlers:
+        # The counter hands them the formatted line.
+        handler.setFormatter(logging.Formatter("%(message)s"))
+
+    BotLog._counter = _ByteCountingHandler(handlers)
+    BotLog._counter.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_RecordQueueHandler(log_queue))
+    set_level(config["log_level"])
+
+    BotLog._listener = logging.handlers.QueueListener(log_queue, BotLog._counter)
+    BotLog._listener.start()
+    atexit.register(shutdown_logging)
+    return BotLog._listener
+
+
+def set_level(level):
+    logging.getLogger().setLevel(str(level).upper())
+
+
+def shutdown_logging():
+    if BotLog._listener is not None:
+        BotLog._listener.stop()
+        BotLog._listener = None
+
+
+def log_bytes_per_second(reset=True):
+    """
+    Returns {logger name: bytes per second} since the previous call.
+    """
+    if BotLog._counter is None:
+        return {}
+    return BotLog._counter.rates(reset)
+
+
+def report_lines():
+    """
+    Returns the daily report line of the loggers writing the most bytes per second.
+    """
+    rates = sorted(log_bytes_per_second().items(), key=lambda item: item[1], reverse=True)
+    if not rates:
+        return []
+    return ["Log output: " + ", ".join(f"{name} {rate:.0f} B/s" for name, rate in rates[:5])]
+
+
+class LogSampler:
+    """
+    Rate limits log records per key (e.g. per websocket topic) with a token bucket.
+
+    sample(key) returns None when the record should be dropped, or the number of records
+    dropped for that key since the last one that was let through.
+    """
+
+    def __init__(self, per_second=1.0, burst=5):
+        self._rate = float(per_second)
+        self._burst = float(burst)
+        self._buckets = {}
+
+    def sample(self, key):
+        now = time.monotonic()
+        tokens, last, dropped = self._buckets.get(key, (self._burst, now, 0))
+        tokens = min(self._burst, tokens + (now - last) * self._rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now, dropped + 1)
+            return None
+        self._buckets[key] = (tokens - 1, now, 0)
+        return dropped
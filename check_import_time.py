@@ -0,0 +1,94 @@
+"""
+Import-time regression check.
+
+Runs ``python -X importtime`` in a fresh interpreter for each entry module and fails when
+the cumulative import time exceeds the budget, when a heavy module (pandas, pandas_ta,
+tabulate) is pulled in at import, or when a module reads a YAML file while being imported.
+
+Usage:
+    python check_import_time.py [--budget SECONDS] [module ...]
+"""
+import os
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["main", "trading_strategy", "klines", "orderBook", "curl_test"]
+DEFAULT_BUDGET = 0.5
+LAZY_MODULES = ["pandas", "pandas_ta", "tabulate"]
+
+# Records every file opened while the module is imported, so config reads can be flagged.
+_PROBE = """
+import sys
+opened = []
+sys.addaudithook(lambda event, args: opened.append(str(args[0])) if event == "open" and args else None)
+import {module}
+for path in opened:
+    if path.endswith((".yaml", ".yml")):
+        print(path)
+"""
+
+
+def measure(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    total_us = 0
+    imported = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.rstrip()
+        imported.append(name.strip())
+        # Top level entries have a single space of indentation; their cumulative times add up.
+        if not name.startswith("  "):
+            total_us += int(cumulative_us)
+    config_reads = [line for line in result.stdout.splitlines() if line]
+    return total_us / 1e6, imported, config_reads
+
+
+def main(argv):
+    budget = DEFAULT_BUDGET
+    modules = []
+    args = iter(argv)
+    for arg in args:
+        if arg == "--budget":
+            budget = float(next(args))
+        else:
+            modules.append(arg)
+    modules = modules or DEFAULT_MODULES
+
+    # Interpreter start-up (site, encodings) shows up in every run and is not ours to budget.
+    baseline, _, _ = measure("sys")
+
+    failures = []
+    for module in modules:
+        try:
+            seconds, imported, config_reads = measure(module)
+        except RuntimeError as ex:
+            failures.append(str(ex))
+            continue
+        seconds = max(seconds - baseline, 0.0)
+
+        print(f"{module:<20} {seconds * 1000:8.1f} ms")
+        if seconds > budget:
+            failures.append(f"{module} took {seconds:.3f}s to import (budget {budget:.3f}s)")
+        for lazy in LAZY_MODULES:
+            if lazy in imported:
+                failures.append(f"{module} imports {lazy} at import time")
+        for path in config_reads:
+            failures.append(f"{module} reads {path} at import time")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -34,18 +34,20 @@ import yaml
 # print(response.json())
 
 from kucoin.client import User
-with open("configuration.yaml", "r") as file:
-    config = yaml.safe_load(file)
 
-client = User(
-            key=config["api_key"],
-            secret=config["api_secret"],
-            passphrase=config["api_passphrase"],
-            is_sandbox=(config["sandbox"] == "True"),
-            # is_v1api=True
-        )
-btc_accounts = client.get_account_list("BTC")
-print(btc_accounts)
+if __name__ == "__main__":
+    with open("configuration.yaml", "r") as file:
+        config = yaml.safe_load(file)
+
+    client = User(
+                key=config["api_key"],
+                secret=config["api_secret"],
+                passphrase=config["api_passphrase"],
+                is_sandbox=(config["sandbox"] == "True"),
+                # is_v1api=True
+            )
+    btc_accounts = client.get_account_list("BTC")
+    print(btc_accounts)
 # # Example for create deposit addresses in python
 # url = 'https://api.kucoin.com/api/v1/deposit-addresses'
 # now = int(time.time() * 1000)
@@ -3,16 +3,20 @@ import time
 
 from base_account import BaseAccount
 from kucoin.client import User
+from exchanges.kucoin.kucoin_balances import normalize_account_type
 from exchanges.kucoin.kucoin_exception import KucoinAPIException
+from exchanges.kucoin.kucoin_paginator import KucoinPaginator
+from exchanges.kucoin.kucoin_reference import KucoinReferenceData
+from exchanges.kucoin.kucoin_scheduler import KucoinRequestScheduler, PRIORITY_ACCOUNT_READ
 
 
 class KucoinAccount(BaseAccount):
-    def __init__(self, config, get_data_function=None, rest_update_function=None):
+    def __init__(self, config, get_data_function=None, rest_update_function=None, scheduler=None,
+                 reference_data=None, paginator=None):
         super().__init__(config)
         self._exchange = 'KuCoin'  # Update with your exchange name
         self._account_type = config["account_type"]
         self.log = logging.getLogger("KucoinAccount")
-        self.log.setLevel(config["log_level"])
         
         if callable(get_data_function):
             self._get_data = get_data_function
@@ -20,17 +24,23 @@ class KucoinAccount(BaseAccount):
         if callable(get_data_function):
             self._rest_update = rest_update_function
 
+        self._scheduler = scheduler or KucoinRequestScheduler()
+        self._reference = reference_data or KucoinReferenceData()
+        self._paginator = paginator or KucoinPaginator(self._scheduler)
         self._client = User(
             key=config["api_key"],
             secret=config["api_secret"],
             passphrase=config["api_passphrase"],
-            is_sandbox=(config["sandbox"] == "True")
+            is_sandbox=(config["sandbox"] == "True"),
+            url=config.get("rest_url", ""),
         )
 
     def get_exchange_fees(self):
+        return self._reference.get("fees", self._request_exchange_fees)
+
+    def _request_exchange_fees(self):
         try:
-            results = self._client.get_base_fee()
-            self._rest_update(results)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._client.get_base_fee, coalesce=True)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error getting base fee: {ex}")
@@ -39,13 +49,24 @@ class KucoinAccount(BaseAccount):
             self.log.error(f"Unexpected error getting base fee: {ex}")
             return None
 
+    def get_maker_fee_rate(self):
+        fees = self.get_exchange_fees()
+        return float(fees["makerFeeRate"]) if fees else None
+
+    def get_taker_fee_rate(self):
+        fees = self.get_exchange_fees()
+        return float(fees["takerFeeRate"]) if fees else None
+
     def get_account_list(self, currency=None, account_type=None):
         try:
-            results = self._client.get_account_list(currency, account_type)
+            if account_type:
+                account_type = normalize_account_type(account_type)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._client.get_account_list,
+                                           currency, account_type, coalesce=True)
             for account in results:
                 cache_object = {
                     "topic": "/account/balance",
-                    "accounts": {account_type: {currency: account}}
+                    "accounts": {account.get("type", account_type): {account["currency"]: account}}
                 }
                 self._rest_update(cache_object)
             return results
@@ -58,7 +79,7 @@ class KucoinAccount(BaseAccount):
 
     def get_account(self, account_id):
         try:
-            results = self._client.get_account(account_id)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._client.get_account, account_id, coalesce=True)
             # self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -73,7 +94,8 @@ class KucoinAccount(BaseAccount):
             kwargs = {
                 "currency": currency,
             }
-            results = self._client.get_account_ledger(**kwargs)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._client.get_account_ledger,
+                                           **kwargs, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -83,9 +105,34 @@ class KucoinAccount(BaseAccount):
             self.log.error(f"Unexpected error getting account ledger: {ex}")
             return None
 
+    def get_account_ledger_history(self, currency=None, on_page=None, **kwargs):
+        """
+        Reads every page of the account ledger concurrently.
+
+        Args:
+            currency (str): Optional; only entries of this currency.
+            on_page (callable): Optional; called as on_page(page, items) as each page arrives.
+                Without it, the entries of all pages are returned in "items".
+            kwargs: Filters of the SDK call, e.g. direction, bizType, startAt or endAt.
+
+        Returns:
+            dict: The page and item counts (see KucoinPaginator.fetch), or None on failure.
+        """
+        if currency:
+            kwargs["currency"] = currency
+        try:
+            return self._paginator.fetch(self._client.get_account_ledger, on_page=on_page, **kwargs)
+        except KucoinAPIException as ex:
+            self.log.error(f"API error getting account ledger history: {ex}")
+            return None
+        except Exception as ex:
+            self.log.error(f"Unexpected error getting account ledger history: {ex}")
+            return None
+
     def get_account_hold(self, account_id):
         try:
-            results = self._client.get_account_hold(account_id)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._client.get_account_hold,
+                                           account_id, coalesce=True)
             # self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -97,7 +144,8 @@ class KucoinAccount(BaseAccount):
 
     def get_sub_account(self, sub_user_id):
         try:
-            results = self._client.get_sub_account(sub_user_id)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._client.get_sub_account,
+                                           sub_user_id, coalesce=True)
             # self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -109,7 +157,7 @@ class KucoinAccount(BaseAccount):
 
     def get_sub_accounts(self):
         try:
-            results = self._client.get_sub_accounts()
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._client.get_sub_accounts, coalesce=True)
             # self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -121,7 +169,8 @@ class KucoinAccount(BaseAccount):
 
     def get_transferable(self, currency, account_type=None):
         try:
-            results = self._client.get_transferable(currency, str(account_type).upper())
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._client.get_transferable,
+                                           currency, normalize_account_type(account_type).upper(), coalesce=True)
             cache_object = {
                 "topic": "/account/balance",
                 "accounts": {account_type: {currency: results}}
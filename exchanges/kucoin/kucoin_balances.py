@@ -0,0 +1,149 @@
+import collections
+import threading
+
+# The config names the spot account "spot"; the API calls it "trade".
+_ACCOUNT_TYPES = {"spot": "trade"}
+
+
+def normalize_account_type(account_type):
+    account_type = str(account_type).lower()
+    return _ACCOUNT_TYPES.get(account_type, account_type)
+
+
+class KucoinBalanceLedger:
+    """
+    Balances keyed by account type and currency.
+
+    The ledger is seeded from the account list / transferable REST results and then kept up to
+    date from '/account/balance' websocket messages. Funds reserved by orders we have submitted,
+    but whose hold the exchange has not reported yet, are tracked locally so the spendable amount
+    can be answered without a REST round trip.
+
+    Orders are placed from worker threads while websocket messages are applied on the event loop,
+    so every method holds the ledger's lock.
+    """
+
+    def __init__(self, max_reported=1000):
+        self._balances = {}
+        self._pending = {}
+        self._pending_totals = {}
+        self._order_ids = {}
+        # Order ids whose hold was reported, for orders whose id was not known yet at the time.
+        self._reported = collections.OrderedDict()
+        self._max_reported = max_reported
+        self._lock = threading.Lock()
+
+    def _entry(self, account_type, currency):
+        key = (normalize_account_type(account_type), currency)
+        if key not in self._balances:
+            self._balances[key] = {"available": 0.0, "hold": 0.0, "total": 0.0, "time": 0}
+        return self._balances[key]
+
+    def seed(self, account_type, currency, balance):
+        """
+        Sets a balance from a REST result (an account list item or a transferable result).
+        """
+        with self._lock:
+            entry = self._entry(balance.get("type", account_type), currency)
+            entry["available"] = float(balance.get("available", 0))
+            entry["hold"] = float(balance.get("holds", balance.get("hold", 0)))
+            entry["total"] = float(balance.get("balance", entry["available"] + entry["hold"]))
+
+    def apply_ws_update(self, data):
+        """
+        Applies an '/account/balance' message body.
+
+        The message carries the new absolute available/hold/total values, so older messages that
+        arrive late are ignored by their time stamp.
+        """
+        account_type = data.get("relationEvent", "trade").split(".")[0]
+        with self._lock:
+            entry = self._entry(account_type, data["currency"])
+            event_time = int(data.get("time", 0))
+            if event_time and event_time < entry["time"]:
+                return
+            entry["available"] = float(data["available"])
+            entry["hold"] = float(data["hold"])
+            entry["total"] = float(data["total"])
+            entry["time"] = event_time
+
+            # Once the exchange reports the hold of one of our orders it is no longer pending.
+            order_id = (data.get("relationContext") or {}).get("orderId")
+            client_oid = self._order_ids.get(order_id)
+            if client_oid is not None:
+                self._release(client_oid)
+            elif order_id:
+                # The push can arrive before the order placement returns the order id.
+                self._reported[order_id] = True
+                if len(self._reported) > self._max_reported:
+                    self._reported.popitem(last=False)
+
+    def reserve(self, client_oid, account_type, currency, amount):
+        """
+        Reserves funds for an order that was submitted but not yet reflected in the balances.
+        """
+        key = (normalize_account_type(account_type), currency)
+        with self._lock:
+            self._release(client_oid)
+            self._pending[client_oid] = [key, float(amount), None]
+            self._pending_totals[key] = self._pending_totals.get(key, 0.0) + float(amount)
+
+    def set_order_id(self, client_oid, order_id):
+        with self._lock:
+            if client_oid not in self._pending:
+                return
+            if self._reported.pop(order_id, None):
+                self._release(client_oid)
+                return
+            self._pending[client_oid][2] = order_id
+            self._order_ids[order_id] = client_oid
+
+    def release(self, client_oid):
+        with self._lock:
+            self._release(client_oid)
+
+    def _release(self, client_oid):
+        if client_oid not in self._pending:
+            return
+        key, amount, order_id = self._pending.pop(client_oid)
+        self._pending_totals[key] -= amount
+        self._order_ids.pop(order_id, None)
+
+    def release_order(self, order_id):
+        with self._lock:
+            client_oid = self._order_ids.get(order_id)
+            if client_oid is not None:
+                self._release(client_oid)
+
+    def get(self, account_type, currency):
+        with self._lock:
+            entry = self._balances.get((normalize_account_type(account_type), currency))
+            return dict(entry) if entry is not None else None
+
+    def pending(self, account_type, currency):
+        with self._lock:
+            return self._pending_totals.get((normalize_account_type(account_type), currency), 0.0)
+
+    def spendable(self, account_type, currency):
+        key = (normalize_account_type(account_type), currency)
+        with self._lock:
+            entry = self._balances.get(key)
+            if entry is None:
+                return 0.0
+            return max(entry["available"] - self._pending_totals.get(key, 0.0), 0.0)
+
+    def restore(self, accounts):
+        """
+        Loads balances in the form returned by snapshot(), e.g. from a checkpoint.
+        """
+        with self._lock:
+            for account_type, currencies in accounts.items():
+                for currency, entry in currencies.items():
+                    self._entry(account_type, currency).update(entry)
+
+    def snapshot(self):
+        accounts = {}
+        with self._lock:
+            for (account_type, currency), entry in self._balances.items():
+                accounts.setdefault(account_type, {})[currency] = dict(entry)
+        return accounts
@@ -0,0 +1,149 @@
+import heapq
+import time
+
+# full:    every level of /market/level2 is kept.
+# topk:    /market/level2 deltas, but only the best book_depth levels per side are kept.
+# depth5,
+# depth50: the book is replaced by each /spotMarket/level2Depth snapshot; no deltas are applied.
+# auto:    topk until book updates use more than book_cpu_budget of a core, then depth50.
+BOOK_MODES = ["full", "topk", "depth5", "depth50", "auto"]
+DEPTH_TOPICS = {
+    "depth5": "/spotMarket/level2Depth5:",
+    "depth50": "/spotMarket/level2Depth50:",
+}
+
+
+def apply_changes(orderbook, data, depth=None):
+    """
+    Applies a /market/level2 delta to a book of {price: size} dicts.
+
+    Args:
+        orderbook (dict): The book, with "bids", "asks" and "sequence".
+        data (dict): The "data" field of the websocket message.
+        depth (KucoinBookDepth): Optional; discards levels outside the best K.
+    """
+    changes = data["changes"]
+
+    # Deltas at or below the snapshot sequence are already part of the book.
+    book_sequence = int(orderbook.get("sequence", 0))
+
+    for side in ["asks", "bids"]:
+        if side in changes:
+            levels = orderbook[side]
+            for change in changes[side]:
+                price, size, sequence = change
+                if int(sequence) <= book_sequence:
+                    continue
+
+                price = float(price)
+                size = float(size)
+                if depth is not None and not depth.accepts(side, price):
+                    continue
+
+                if size == 0:
+                    levels.pop(price, None)
+                else:
+                    levels[price] = size
+
+    orderbook["sequence"] = max(book_sequence, int(data["sequenceEnd"]))
+
+
+def apply_depth_snapshot(orderbook, data):
+    """
+    Replaces both sides of the book with a /spotMarket/level2Depth snapshot.
+    """
+    orderbook["bids"] = {float(price): float(size) for price, size in data["bids"]}
+    orderbook["asks"] = {float(price): float(size) for price, size in data["asks"]}
+    orderbook["time"] = data.get("timestamp")
+
+
+class KucoinBookDepth:
+    """
+    Bounds a full-depth book to the best levels on each side; readers use the best `depth`.
+
+    A trim keeps twice the depth, and a side is only trimmed again once it has grown past four
+    times the depth, so trimming is amortized over many deltas. After a trim, deltas for prices
+    worse than the last kept level are discarded, since the levels around them are no longer known.
+    As soon as a trimmed side drains below the depth (the price moved into the discarded range),
+    the best `depth` levels are no longer exact and trim() reports that the book needs a new
+    snapshot. The levels kept beyond the depth absorb ordinary price moves without one.
+    """
+
+    KEEP = 2
+    TRIM_PAST = 4
+
+    def __init__(self, depth):
+        self.depth = depth
+        self._cutoff = {"bids": None, "asks": None}
+
+    def accepts(self, side, price):
+        cutoff = self._cutoff[side]
+        if cutoff is None:
+            return True
+        return price >= cutoff if side == "bids" else price <= cutoff
+
+    def reset(self, orderbook):
+        """
+        Trims a freshly loaded snapshot.
+        """
+        self._cutoff = {"bids": None, "asks": None}
+        for side in ["bids", "asks"]:
+            self._trim_side(orderbook, side)
+
+    def trim(self, orderbook):
+        """
+        Trims sides that have grown past four times the depth.
+
+        Returns:
+            bool: True when a trimmed side has fewer than `depth` levels and the book should be
+            re-snapshotted.
+        """
+        starved = False
+        for side in ["bids", "asks"]:
+            if len(orderbook[side]) > self.TRIM_PAST * self.depth:
+                self._trim_side(orderbook, side)
+            elif self._cutoff[side] is not None and len(orderbook[side]) < self.depth:
+                starved = True
+        return starved
+
+    def _trim_side(self, orderbook, side):
+        levels = orderbook[side]
+        keep = self.KEEP * self.depth
+        if len(levels) <= keep:
+            return
+        best = heapq.nlargest(keep, levels) if side == "bids" else heapq.nsmallest(keep, levels)
+        orderbook[side] = {price: levels[price] for price in best}
+        self._cutoff[side] = best[-1]
+
+
+class BookLoadMonitor:
+    """
+    Measures the share of one core spent on order book updates.
+
+    Wrap each update in start()/stop(); over_budget() compares the CPU time of the last window
+    to its wall time.
+    """
+
+    def __init__(self, budget=0.05, window_seconds=10.0):
+        self.budget = budget
+        self._window = window_seconds
+        self._window_start = time.monotonic()
+        self._cpu = 0.0
+        self._started = None
+        self.last_share = 0.0
+
+    def start(self):
+        self._started = time.thread_time()
+
+    def stop(self):
+        self._cpu += time.thread_time() - self._started
+
+    def over_budget(self):
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self._window:
+            return False
+        self.last_share = self._cpu / elapsed
+        self._cpu = 0.0
+        self._window_start = now
+        return self.last_share > self.budget
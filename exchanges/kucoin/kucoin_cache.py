@@ -0,0 +1,206 @@
+import collections
+import logging
+import sys
+import time
+
+log = logging.getLogger("KucoinCache")
+
+NAMESPACES = ["book", "candles", "trades", "orders", "balances", "reference"]
+# Approximate bytes per namespace; None means the namespace is only measured, never evicted.
+DEFAULT_BUDGETS = {
+    "book": None,
+    "candles": 1024 * 1024,
+    "trades": 512 * 1024,
+    "orders": 4 * 1024 * 1024,
+    "balances": None,
+    # Fees, account data and the like: dropping them would lose state that is not refetched.
+    "reference": None,
+}
+# Seconds after which finished orders and trades are evicted regardless of the budget.
+DEFAULT_MAX_AGE = {
+    "trades": 60 * 60,
+    "orders": 24 * 60 * 60,
+}
+# Budgets are checked at most this often per namespace, since measuring walks the entries.
+_CHECK_INTERVAL = 1.0
+_SIZE_SAMPLE = 32
+
+
+def namespace_of(key):
+    if key.startswith("/market/level2") or key.startswith("/spotMarket/level2"):
+        return "book"
+    if key == "klines":
+        return "candles"
+    if key.startswith("/market/match"):
+        return "trades"
+    if key == "orders":
+        return "orders"
+    if key in ("/margin/position", "position"):
+        return "balances"
+    return "reference"
+
+
+def _deep_size(obj):
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(key) + _deep_size(value) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_size(item) for item in obj)
+    return size
+
+
+def _approximate_size(container):
+    # Large containers are sized from a sample of their entries.
+    items = list(container.items()) if isinstance(container, dict) else list(container)
+    if len(items) <= _SIZE_SAMPLE:
+        return _deep_size(container)
+    step = len(items) / _SIZE_SAMPLE
+    sample = sum(_deep_size(items[int(index * step)]) for index in range(_SIZE_SAMPLE))
+    return sys.getsizeof(container) + int(sample * len(items) / _SIZE_SAMPLE)
+
+
+def order_done(order):
+    return order.get("status") == "done" or order.get("isActive") is False
+
+
+class KucoinCacheStore(dict):
+    """
+    The live cache of one exchange instance, with its keys grouped into namespaces.
+
+    It is still read like the dict it replaces (data["orders"], data.get("klines")), but every
+    key belongs to a namespace (book, candles, trades, orders, balances, reference) with its own
+    memory budget. enforce() evicts from a namespace that is over budget: finished orders past
+    their maximum age first and then the least recently updated finished ones, and the oldest
+    trades and candles. Open orders, the book, balances and reference entries are never evicted.
+    """
+
+    def __init__(self, budgets=None, max_age=None):
+        super().__init__()
+        self._budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self._max_age = dict(DEFAULT_MAX_AGE, **(max_age or {}))
+        self._touched = {}
+        self._evicted = collections.Counter()
+        self._checked_at = {}
+        self._sizes = {}
+        self._over_budget_warned = False
+
+    def keys_in(self, namespace):
+        return [key for key in self if namespace_of(key) == namespace]
+
+    def touch(self, order_id):
+        """
+        Marks an order as just updated, for least-recently-updated eviction.
+        """
+        self._touched[order_id] = time.monotonic()
+
+    def size_of(self, namespace):
+        size = sum(_approximate_size(self[key]) if isinstance(self[key], (dict, list)) else _deep_size(self[key])
+                   for key in self.keys_in(namespace))
+        self._sizes[namespace] = size
+        return size
+
+    def enforce(self, namespace, force=False):
+        """
+        Evicts entries of a namespace past their maximum age or over its budget.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at.get(namespace, 0.0) < _CHECK_INTERVAL:
+            return
+        self._checked_at[namespace] = now
+
+        if namespace == "orders":
+            self._expire_orders(now)
+        elif namespace == "trades":
+            self._expire_trades()
+
+        budget = self._budgets.get(namespace)
+        if budget is None:
+            return
+        size = self.size_of(namespace)
+        if size <= budget:
+            return
+        if namespace == "orders":
+            self._evict_orders(size, budget)
+        elif namespace in ("trades", "candles"):
+            self._trim_lists(namespace, size, budget)
+        self.size_of(namespace)
+
+    def _expire_orders(self, now):
+        orders = self.get("orders")
+        if not orders:
+            return
+        max_age = self._max_age.get("orders")
+        expired = [oid for oid, order in orders.items()
+                   if order_done(order) and now - self._touched.get(oid, now) > max_age]
+        for oid in expired:
+            del orders[oid]
+            self._touched.pop(oid, None)
+        self._evicted["orders"] += len(expired)
+
+    def _evict_orders(self, size, budget):
+        orders = self["orders"]
+        done = sorted((oid for oid, order in orders.items() if order_done(order)),
+                      key=lambda oid: self._touched.get(oid, 0.0))
+        per_order = size / len(orders) if orders else 0
+        excess = int((size - budget) / per_order) + 1 if per_order else 0
+        for oid in done[:excess]:
+            del orders[oid]
+            self._touched.pop(oid, None)
+        self._evicted["orders"] += min(excess, len(done))
+        if excess > len(done) and not self._over_budget_warned:
+            self._over_budget_warned = True
+            log.warning("Open orders alone exceed the orders cache budget of %s bytes", budget)
+
+    def _expire_trades(self):
+        max_age = self._max_age.get("trades")
+        cutoff_ns = (time.time() - max_age) * 1e9
+        for key in self.keys_in("trades"):
+            trades = self[key]
+            keep = [trade for trade in trades if int(trade.get("time", 0)) >= cutoff_ns]
+            if len(keep) != len(trades):
+                self._evicted["trades"] += len(trades) - len(keep)
+                trades[:] = keep
+
+    def _trim_lists(self, namespace, size, budget):
+        # Trades are kept oldest first and candles newest first; the oldest entries go.
+        for key in self.keys_in(namespace):
+            entries = self[key]
+            if not entries:
+                continue
+            keep = max(1, int(len(entries) * budget / size))
+            excess = len(entries) - keep
+            if excess <= 0:
+                continue
+            if namespace == "trades":
+                del entries[:excess]
+            else:
+                del entries[keep:]
+            self._evicted[namespace] += excess
+
+    def stats(self):
+        """
+        Returns entries, approximate bytes, budget and evictions per namespace.
+        """
+        result = {}
+        for namespace in NAMESPACES:
+            entries = 0
+            for key in self.keys_in(namespace):
+                value = self[key]
+                if namespace == "book":
+                    entries += len(value.get("bids", {})) + len(value.get("asks", {}))
+                else:
+                    entries += len(value) if isinstance(value, (dict, list)) else 1
+            result[namespace] = {
+                "entries": entries,
+                "bytes": self.size_of(namespace),
+                "budget": self._budgets.get(namespace),
+                "evicted": self._evicted[namespace],
+            }
+        return result
+
+    def report_lines(self):
+        lines = ["Cache:"]
+        for namespace, stats in self.stats().items():
+            lines.append(f"  {namespace}: {stats['entries']} entries, ~{stats['bytes'] // 1024} KiB, "
+                         f"{stats['evicted']} evicted")
+        return lines
@@ -0,0 +1,184 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+log = logging.getLogger("KucoinCheckpoint")
+
+_MAGIC = b"KCCP"
+_FORMAT_VERSION = 1
+# magic, format version, generation, payload length, payload CRC-32
+_HEADER = struct.Struct("<4sIQQI")
+# Slots stay a multiple of the page size, so each one can be flushed on its own.
+_INITIAL_SLOT_SIZE = 64 * mmap.PAGESIZE
+
+
+class KucoinCheckpoint:
+    """
+    Keeps the latest state checkpoint in a memory-mapped file that survives a crash mid-write.
+
+    The file holds two slots. A save writes the payload into the slot that does not hold the
+    newest checkpoint, then its header (generation, length and CRC-32), and flushes that slot, so
+    the previous checkpoint stays intact until the new one is complete. load() returns the valid
+    slot with the highest generation; a torn write fails its CRC and the other slot is used. A
+    payload too large for a slot is written to a new file with larger slots, which is then moved
+    into place with os.replace.
+    """
+
+    def __init__(self, path, max_age=300):
+        self._path = path
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._slot_size = 0
+        self._generation = 0
+        self._saves = 0
+        self._bytes = 0
+        self._save_seconds = None
+        self._loaded_age = None
+
+    def path(self):
+        return self._path
+
+    def _open(self):
+        if self._map is not None:
+            return
+        if not os.path.exists(self._path):
+            self._write_file(self._path, _INITIAL_SLOT_SIZE)
+        self._file = open(self._path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._slot_size = len(self._map) // 2
+
+    def _write_file(self, path, slot_size, generation=0, payload=b""):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as file:
+            file.truncate(2 * slot_size)
+            if payload:
+                file.seek((generation % 2) * slot_size)
+                file.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, generation, len(payload), zlib.crc32(payload)))
+                file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._map = None
+        self._file = None
+
+    def _read_slot(self, index):
+        offset = index * self._slot_size
+        magic, version, generation, length, crc = _HEADER.unpack_from(self._map, offset)
+        if magic != _MAGIC or version != _FORMAT_VERSION or length > self._slot_size - _HEADER.size:
+            return None
+        start = offset + _HEADER.size
+        payload = self._map[start:start + length]
+        if zlib.crc32(payload) != crc:
+            log.warning("Checkpoint slot %s of %s is torn, ignoring it", index, self._path)
+            return None
+        try:
+            return generation, json.loads(payload)
+        except ValueError:
+            return None
+
+    def load(self, expected=None):
+        """
+        Returns the newest checkpointed state, or None if there is none or it is not usable.
+
+        Args:
+            expected (dict): Optional; fields the state must match (e.g. the symbol), since a
+                checkpoint taken for another market or account must not be restored.
+        """
+        with self._lock:
+            if not os.path.exists(self._path):
+                return None
+            try:
+                self._open()
+                slots = [slot for slot in (self._read_slot(0), self._read_slot(1)) if slot is not None]
+            except (OSError, ValueError, struct.error) as ex:
+                log.warning(f"Ignoring unreadable checkpoint {self._path}: {ex}")
+                self._close_map()
+                return None
+            if not slots:
+                return None
+            generation, state = max(slots, key=lambda slot: slot[0])
+            # Later saves continue from the newest generation, so they never overwrite it.
+            self._generation = generation
+
+        age = time.time() - state.get("saved_at", 0) / 1000
+        for key, value in (expected or {}).items():
+            if state.get(key) != value:
+                log.info("Ignoring checkpoint %s: %s is %r, expected %r", self._path, key, state.get(key), value)
+                return None
+        if age > self._max_age or age < -60:
+            log.info("Ignoring checkpoint %s: it is %.0fs old (max %ss)", self._path, age, self._max_age)
+            return None
+        self._loaded_age = age
+        return state
+
+    def save(self, state):
+        """
+        Writes state as the newest checkpoint. Safe to call from a worker thread.
+
+        Args:
+            state (dict): JSON serializable state; "saved_at" is set to the current time in ms.
+
+        Returns:
+            int: The size of the checkpoint in bytes.
+        """
+        started = time.monotonic()
+        payload = json.dumps(dict(state, saved_at=int(time.time() * 1000)), separators=(",", ":")).encode()
+        with self._lock:
+            self._open()
+            generation = self._generation + 1
+            if _HEADER.size + len(payload) > self._slot_size:
+                slot_size = self._slot_size
+                while _HEADER.size + len(payload) > slot_size:
+                    slot_size *= 2
+                self._close_map()
+                tmp_path = self._path + ".tmp"
+                self._write_file(tmp_path, slot_size, generation, payload)
+                os.replace(tmp_path, self._path)
+                self._open()
+            else:
+                offset = (generation % 2) * self._slot_size
+                self._map[offset + _HEADER.size:offset + _HEADER.size + len(payload)] = payload
+                _HEADER.pack_into(self._map, offset, _MAGIC, _FORMAT_VERSION, generation, len(payload),
+                                  zlib.crc32(payload))
+                self._map.flush(offset, self._slot_size)
+            self._generation = generation
+            self._saves += 1
+            self._bytes = len(payload)
+            self._save_seconds = time.monotonic() - started
+        return len(payload)
+
+    def close(self):
+        with self._lock:
+            self._close_map()
+
+    def stats(self):
+        """
+        Returns the generation and size of the last checkpoint, the time its save took and the
+        age of the checkpoint restored at start-up.
+        """
+        return {
+            "generation": self._generation,
+            "saves": self._saves,
+            "bytes": self._bytes,
+            "slot_bytes": self._slot_size,
+            "save_ms": round(self._save_seconds * 1000, 2) if self._save_seconds is not None else None,
+            "restored_age_seconds": round(self._loaded_age, 1) if self._loaded_age is not None else None,
+        }
+
+    def report_lines(self):
+        stats = self.stats()
+        return [f"Checkpoint: generation {stats['generation']}, {stats['bytes'] // 1024} KiB, "
+                f"last save {stats['save_ms']}ms"]
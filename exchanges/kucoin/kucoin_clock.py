@@ -0,0 +1,134 @@
+import collections
+import logging
+import threading
+import time
+
+log = logging.getLogger("KucoinClock")
+
+
+class KucoinClock:
+    """
+    Estimates the exchange clock from server timestamp samples, NTP style.
+
+    Each sample is a server timestamp with the local monotonic times the request was sent and
+    answered; the server time is assumed to belong to the midpoint, so the error is at most half
+    the round trip. Only the samples whose round trip is within `rtt_factor` times (and at least
+    1ms) of the smallest one in the window are trusted. The offset is taken from the sample with
+    the smallest round trip. The drift (how fast the offset changes, in parts per million) comes
+    from a least-squares fit over the best sample of every `group` consecutive samples, among the
+    trusted ones.
+
+    Exchange time is extrapolated from the monotonic clock, so steps of the local wall clock
+    do not affect it.
+    """
+
+    def __init__(self, sample_function=None, window=64, group=4, max_drift_ppm=500.0, rtt_factor=1.5):
+        self._sample_function = sample_function
+        self._samples = collections.deque(maxlen=window)
+        self._group = group
+        self._rtt_factor = rtt_factor
+        self._max_drift = max_drift_ppm / 1e6
+        self._lock = threading.Lock()
+        # exchange ms = monotonic ms + _base + _drift * (monotonic ms - _reference)
+        self._base = None
+        self._reference = 0.0
+        self._drift = 0.0
+        self._wall_offset = 0.0
+        self._rtt = None
+        self._synced_at = None
+
+    def sync(self, samples=1):
+        """
+        Takes `samples` server timestamp samples and updates the estimate.
+
+        Returns:
+            bool: True if at least one sample succeeded.
+        """
+        updated = False
+        for _ in range(samples):
+            sample = self._sample_function()
+            if sample is not None:
+                self.add_sample(*sample)
+                updated = True
+        if updated:
+            log.debug("Exchange clock offset %.1fms, rtt %.1fms, drift %.2fppm", self._wall_offset, self._rtt,
+                      self._drift * 1e6)
+        return updated
+
+    def add_sample(self, sent, received, wall_midpoint, server_ms):
+        """
+        Args:
+            sent (float): time.monotonic() before the request.
+            received (float): time.monotonic() after the response.
+            wall_midpoint (float): time.time() at the midpoint of the request.
+            server_ms (int): The server timestamp in milliseconds.
+        """
+        midpoint_ms = (sent + received) * 500
+        rtt_ms = (received - sent) * 1000
+        with self._lock:
+            self._samples.append((midpoint_ms, rtt_ms, server_ms - midpoint_ms, server_ms - wall_midpoint * 1000))
+            self._estimate()
+            self._synced_at = time.monotonic()
+
+    def _estimate(self):
+        samples = list(self._samples)
+        best = min(samples, key=lambda sample: sample[1])
+        # A slow round trip is usually an asymmetric one, whose midpoint misplaces the server time.
+        max_rtt = max(best[1] * self._rtt_factor, best[1] + 1.0)
+        trusted = [min(samples[index:index + self._group], key=lambda sample: sample[1])
+                   for index in range(0, len(samples), self._group)]
+        trusted = [sample for sample in trusted if sample[1] <= max_rtt]
+        self._rtt = best[1]
+        self._reference = best[0]
+        self._base = best[2]
+        self._wall_offset = best[3]
+
+        self._drift = 0.0
+        if len(trusted) >= 3 and trusted[-1][0] - trusted[0][0] >= 60000:
+            count = len(trusted)
+            mean_t = sum(sample[0] for sample in trusted) / count
+            mean_o = sum(sample[2] for sample in trusted) / count
+            spread = sum((sample[0] - mean_t) ** 2 for sample in trusted)
+            if spread:
+                slope = sum((sample[0] - mean_t) * (sample[2] - mean_o) for sample in trusted) / spread
+                self._drift = max(-self._max_drift, min(self._max_drift, slope))
+
+    def synced(self):
+        return self._base is not None
+
+    def now_ms(self):
+        """
+        Returns the current exchange time in milliseconds, or local time before the first sync.
+        """
+        # The estimate is replaced from the sync thread; its three parts must come from one estimate.
+        with self._lock:
+            base, reference, drift = self._base, self._reference, self._drift
+        if base is None:
+            return time.time() * 1000
+        monotonic_ms = time.monotonic() * 1000
+        return monotonic_ms + base + drift * (monotonic_ms - reference)
+
+    def feed_latency_ms(self, exchange_time_ms):
+        """
+        Milliseconds between an exchange time stamp and now, in exchange time.
+        """
+        return self.now_ms() - exchange_time_ms
+
+    def stats(self):
+        """
+        Returns the offset of the exchange clock from the local wall clock, the round trip of the
+        sample it came from, the drift and the time since the last sample.
+        """
+        with self._lock:
+            return {
+                "offset_ms": round(self._wall_offset, 2) if self._base is not None else None,
+                "rtt_ms": round(self._rtt, 2) if self._rtt is not None else None,
+                "drift_ppm": round(self._drift * 1e6, 2),
+                "samples": len(self._samples),
+                "last_sync_seconds": round(time.monotonic() - self._synced_at, 1) if self._synced_at else None,
+            }
+
+    def report_lines(self):
+        stats = self.stats()
+        return [f"Exchange clock offset: {stats['offset_ms']}ms (rtt {stats['rtt_ms']}ms, "
+                f"drift {stats['drift_ppm']}ppm)"]
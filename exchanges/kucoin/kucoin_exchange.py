@@ -1,21 +1,41 @@
+import asyncio
 import copy
 import datetime
 import logging
 import os
-
-import yaml
+import time
 
 from base_exchange import BaseExchange
+from bot_log import LogSampler
+from overload import OverloadController
+from readiness import ReadinessBarrier
 from kucoin.client import WsToken
-from kucoin.ws_client import KucoinWsClient
 
 from exchanges.kucoin.kucoin_trade import KucoinTrade
 from exchanges.kucoin.kucoin_account import KucoinAccount
+from exchanges.kucoin.kucoin_balances import KucoinBalanceLedger
+from exchanges.kucoin.kucoin_cache import KucoinCacheStore, order_done
+from exchanges.kucoin.kucoin_checkpoint import KucoinCheckpoint
+from exchanges.kucoin.kucoin_clock import KucoinClock
+from exchanges.kucoin.kucoin_book import (BOOK_MODES, DEPTH_TOPICS, BookLoadMonitor, KucoinBookDepth,
+                                           apply_changes, apply_depth_snapshot)
+from exchanges.kucoin.kucoin_export import KucoinExport
+from exchanges.kucoin.kucoin_fills import KucoinFillsLedger
+from exchanges.kucoin.kucoin_latency import KucoinOrderLatency
 from exchanges.kucoin.kucoin_market import KucoinMarket
+from exchanges.kucoin.kucoin_paginator import KucoinPaginator
+from exchanges.kucoin.kucoin_price import KucoinLastPrice
+from exchanges.kucoin.kucoin_reference import KucoinReferenceData
+from exchanges.kucoin.kucoin_scheduler import KucoinRequestScheduler
+from exchanges.kucoin.kucoin_shm import KucoinSharedPublisher
+from exchanges.kucoin.kucoin_socket import KucoinSocket
+from exchanges.kucoin.kucoin_subaccounts import KucoinSubAccounts
 from exchanges.kucoin.kucoin_ta import KCTa
 from check_config import Check as check
 
 log = logging.getLogger("KucoinExchange")
+# Websocket topics push up to several messages per 100ms; at DEBUG only a sample of them is logged.
+_ws_debug_sampler = LogSampler(per_second=1.0, burst=5)
 
 
 def _check_config_file(config):
@@ -28,28 +48,126 @@ def _check_config_file(config):
 
 
 class KucoinExchange(BaseExchange):
-    _kc_cache = {}
     _MAX_TABLE_LENGTH = 200
+    _MAX_INIT_ATTEMPTS = 5
+    # Orders and fills are re-synced from slightly before the last message to cover clock skew.
+    _RESYNC_MARGIN_MS = 5000
+    # A failed order book snapshot is retried after 0.5s, doubling up to 30s.
+    _BOOK_RESYNC_RETRY_SECONDS = 0.5
+    _BOOK_RESYNC_MAX_RETRY_SECONDS = 30
+    _REQUIRED_DATA = ["fees", "balances", "orders", "fills", "klines", "book", "websocket"]
+    # These topics are only served on a connection opened with a private token.
+    _PRIVATE_TOPICS = ['/spotMarket/tradeOrders', '/account/balance', '/margin/position']
     _send_ws_update = None
     _cache_initialized = False
 
     def __init__(self, config):
         _check_config_file(config)
-        log.setLevel(config["log_level"])
 
-        self._market = KucoinMarket(config, self._get_data, self._update_websocket_data_store)
-        self._account = KucoinAccount(config, self._get_data, self._update_websocket_data_store)
-        self._trade = KucoinTrade(config, self._get_data, self._update_websocket_data_store)
-        self._ta = KCTa(config, self.get_snapshot)
+        # Owned by this instance; every key belongs to a namespace with its own memory budget.
+        self._kc_cache = KucoinCacheStore(config.get("cache_budgets"), config.get("cache_max_age"))
+        self._loop = None
+        self._last_message_ms = None
+        self._book_resyncing = False
+        self._book_buffer = []
+        self._book_pending = []
+        self._book_coalescing = False
+        # Set while a book restored from a checkpoint has not been confirmed by the feed.
+        self._book_restored = False
+        self._restored = None
+        self._readiness = ReadinessBarrier(self._REQUIRED_DATA)
+        self._balances = KucoinBalanceLedger()
+        # One scheduler for all three wrappers, so they share the rate limit and priorities.
+        self._scheduler = KucoinRequestScheduler(
+            requests_per_second=config.get("rest_requests_per_second", 20),
+            workers=config.get("rest_workers", 4),
+            read_deadline=config.get("rest_read_deadline", 10.0),
+        )
+        # Reference data lives apart from the live cache and survives restarts on disk.
+        self._reference = KucoinReferenceData(
+            config.get("reference_cache_path", ".cache/kucoin_reference.json"),
+            config.get("reference_ttls"),
+        )
+        # History endpoints are read page by page, several pages at a time, under the same limit.
+        self._paginator = KucoinPaginator(
+            self._scheduler,
+            page_size=config.get("history_page_size", 500),
+            concurrency=config.get("history_concurrency", 4),
+        )
+        # Fed by the ticker and match topics, newest by trade sequence.
+        self._last_price = KucoinLastPrice()
+        self._market = KucoinMarket(config, self._get_data, self._rest_update, self._scheduler, self._reference,
+                                    self._last_price)
+        self._account = KucoinAccount(config, self._get_data, self._rest_update, self._scheduler, self._reference,
+                                      self._paginator)
+        # Balances and open orders of the sub-accounts, refreshed by the sub_accounts periodic task.
+        self._sub_accounts = None
+        if config.get("sub_accounts", False):
+            self._sub_accounts = KucoinSubAccounts(config, self._account, self._scheduler, self._last_price.price)
+        # Exchange time, for lag measurements and resync windows.
+        self._clock = KucoinClock(self._market.get_server_time_sample)
+        self._order_latency = KucoinOrderLatency()
+        # Position and PnL from our own fills, deduplicated by tradeId.
+        self._fills = KucoinFillsLedger(self._market.get_trade_symbol(), self._fee_rate)
+        self._trade = KucoinTrade(config, self._get_data, self._rest_update, self._balances, self._scheduler,
+                                  self._order_latency, self._paginator)
+        self._export = KucoinExport(self._get_data, self._market.get_trade_symbol())
+        self._candle_version = 0
+        self._candle_closes = 0
+        self._candle_close_listeners = []
+        self._ta = KCTa(config, self.get_snapshot, self._export.candles, self.candle_version)
         self._time_delta = config["candle_length"]
+        # State is checkpointed periodically so a restart only has to catch up.
+        self._checkpoint = None
+        self._checkpoint_identity = {
+            "symbol": self._market.get_trade_symbol(),
+            "account_type": config["account_type"],
+            "candle_length": config["candle_length"],
+            "sandbox": config["sandbox"],
+        }
+        checkpoint_path = config.get("checkpoint_path",
+                                     ".cache/kucoin_checkpoint_" + self._market.get_trade_symbol() + ".bin")
+        if checkpoint_path:
+            self._checkpoint = KucoinCheckpoint(checkpoint_path, config.get("checkpoint_max_age", 300))
+        # Other local processes can read the live book and candles from shared memory.
+        self._shm = None
+        if config.get("shm_publish", False):
+            self._shm = KucoinSharedPublisher(
+                config.get("shm_name", "kucoin_" + self._market.get_trade_symbol()),
+                depth=config.get("shm_depth", 20),
+            )
+        # Publishing a full book scans every level for the top ones, so it is rate limited.
+        self._shm_interval = config.get("shm_interval", 0.05)
+        self._shm_published_at = 0.0
+        self._shm_timer = None
+        # Work is shed in steps when websocket messages are handled later than they were sent.
+        self._overload = OverloadController(
+            thresholds_ms=config.get("overload_lag_ms", [250, 1000, 3000]),
+            recover_seconds=config.get("overload_recover_seconds", 5.0),
+            now_ms=self._clock.now_ms,
+        )
+        # How the order book is fed: full or top-K level2 deltas, or level2Depth snapshots.
+        self._book_mode = config.get("book_mode", "full")
+        if self._book_mode not in BOOK_MODES:
+            raise ValueError(f"book_mode must be one of {BOOK_MODES}, got {self._book_mode!r}")
+        self._book_depth = None
+        if self._book_mode in ("topk", "auto"):
+            self._book_depth = KucoinBookDepth(config.get("book_depth", 50))
+        self._book_monitor = None
+        if self._book_mode == "auto":
+            self._book_monitor = BookLoadMonitor(config.get("book_cpu_budget", 0.05))
         self._token = WsToken(
             key=config["api_key"],
             secret=config["api_secret"],
             passphrase=config["api_passphrase"],
             is_sandbox=(config["sandbox"] == "True"),
+            url=config.get("rest_url", ""),
         )
 
+        # KucoinSocket connections; the SDK reconnects them on its own and reports it.
         self._ws_client = None
+        self._ws_private_client = None
+        self._resync_task = None
         self._websocket_topics = [
             # Private channels.
             '/spotMarket/tradeOrders',
@@ -58,16 +176,16 @@ class KucoinExchange(BaseExchange):
             # '/spotMarket/advancedOrders'
 
             # public channels
-            # '/market/ticker:' + self.market().get_trade_symbol(),  # Push frequency: once every 100ms
+            '/market/ticker:' + self.market().get_trade_symbol(),  # Push frequency: once every 100ms
             # '/market/snapshot:' + self.market().get_trade_symbol(),  # Push frequency: once every 2s
             # '/spotMarket/level2Depth5:' + self.market().get_trade_symbol(),  # Push frequency: once every 100ms
             '/market/candles:' + self.market().get_trade_symbol() + "_" + config["candle_length"],
             # Push frequency: real-time
             # '/indicator/index:' + self.market().get_market_symbol(),
-            # '/market/match:' + self.market().get_trade_symbol(),  # Push frequency: real-time
+            '/market/match:' + self.market().get_trade_symbol(),  # Push frequency: real-time
             # '/indicator/markPrice:' + self.market().get_market_symbol(),
             # '/margin/fundingBook:' + self.market().get_base_symbol() + ',' + self.market().get_quote_symbol(),
-            '/market/level2:' + self.market().get_trade_symbol(),  # Push frequency: real-time
+            self._book_topic(),
         ]
 
         self._sequence = 0
@@ -87,6 +205,122 @@ class KucoinExchange(BaseExchange):
     def ta(self):
         return self._ta
 
+    def export(self):
+        return self._export
+
+    def candle_version(self):
+        # Bumped on every candle update, so derived data (e.g. bands) can be cached per version.
+        return self._candle_version
+
+    def candle_closes(self):
+        # Bumped when a new candle opens, i.e. when the previous one has closed.
+        return self._candle_closes
+
+    def on_candle_close(self, callback):
+        """
+        Registers callback(candle), called with the closed candle when the next one opens.
+        """
+        self._candle_close_listeners.append(callback)
+
+    def readiness(self):
+        return self._readiness
+
+    def last_price(self):
+        return self._last_price
+
+    def order_latency(self):
+        return self._order_latency
+
+    def fills(self):
+        return self._fills
+
+    def sub_accounts(self):
+        return self._sub_accounts
+
+    def _fee_rate(self, liquidity):
+        # Read from the reference cache without blocking; websocket match events carry no fee.
+        fees = self._reference.peek("fees")
+        if not fees:
+            return 0.0
+        return float(fees["takerFeeRate"] if liquidity == "taker" else fees["makerFeeRate"])
+
+    def clock(self):
+        return self._clock
+
+    def checkpoint(self):
+        return self._checkpoint
+
+    def book_mode(self):
+        return self._book_mode
+
+    def _book_topic(self):
+        if self._book_mode in DEPTH_TOPICS:
+            # Push frequency: once every 100ms
+            return DEPTH_TOPICS[self._book_mode] + self.market().get_trade_symbol()
+        # Push frequency: real-time
+        return '/market/level2:' + self.market().get_trade_symbol()
+
+    def overload(self):
+        return self._overload
+
+    def scheduler(self):
+        return self._scheduler
+
+    def paginator(self):
+        return self._paginator
+
+    def reference(self):
+        return self._reference
+
+    def register_report_sections(self, report):
+        """
+        Registers the exchange's sections of the daily report (see metrics.ReportSections).
+        """
+        report.register("account", self._report_account)
+        report.register("last_price", self._last_price.report_lines)
+        report.register("position", self._report_position)
+        report.register("overload", self._overload.report_lines)
+        report.register("clock", self._clock.report_lines)
+        if self._checkpoint is not None:
+            report.register("checkpoint", self._checkpoint.report_lines)
+        if self._sub_accounts is not None:
+            report.register("sub_accounts", self._report_sub_accounts)
+        report.register("cache", self._kc_cache.report_lines)
+        report.register("order_latency", self._order_latency.report_lines)
+
+    def _report_account(self):
+        market = self.market()
+        lines = [f"Symbol: {market.get_trade_symbol()}", "", "Balances:"]
+        for account_type, currencies in self._balances.snapshot().items():
+            for currency, balance in currencies.items():
+                lines.append(f"  {account_type} {currency}: available {balance['available']}, "
+                             f"hold {balance['hold']}, total {balance['total']}")
+        lines.append(f"Spendable: {self.spendable_base()} {market.get_base_symbol()}, "
+                     f"{self.spendable_quote()} {market.get_quote_symbol()}")
+        orders = self.account().ws_get_orders() or {}
+        open_orders = [order for order in orders.values() if order.get("isActive") or order.get("status") == "open"]
+        lines.append(f"Open orders: {len(open_orders)}")
+        return lines
+
+    def _report_position(self):
+        market = self.market()
+        fills = self._fills.stats(self._last_price.price())
+        return [f"Position: {fills['position']} {market.get_base_symbol()} at {fills['average_price']}, "
+                f"realized {fills['realized_pnl']}, unrealized {fills['unrealized_pnl']}, "
+                f"fees {fills['fees']} {market.get_quote_symbol()} ({fills['fills']} fills)"]
+
+    def _report_sub_accounts(self):
+        market = self.market()
+        stats = self._sub_accounts.stats()
+        lines = [f"Sub-accounts: {stats['sub_accounts']}, refresh p50 {stats['p50_ms']}ms, "
+                 f"p99 {stats['p99_ms']}ms, stale {stats['stale'] or 'none'}"]
+        exposure = self._sub_accounts.exposure()
+        for name, values in list(exposure["sub_accounts"].items()) + [("total", exposure["total"])]:
+            lines.append(f"  {name}: {values['base']} {market.get_base_symbol()}, {values['quote']} "
+                         f"{market.get_quote_symbol()}, open buys {values['open_buy_funds']}, "
+                         f"open sells {values['open_sell_size']}, value {values['value']}")
+        return lines
+
     def initialize(self):
         log.debug("Initializing account data...")
         print("Initializing account data...")
@@ -102,75 +336,354 @@ class KucoinExchange(BaseExchange):
         self._cache_initialized = True
         return
 
+    async def initialize_async(self):
+        """
+        Loads fees, balances, orders, fills, klines and the order book snapshot concurrently.
+
+        The SDK clients are blocking, so every request runs in a worker thread and all of them are
+        in flight at once. Each piece is marked on the readiness barrier as soon as it has loaded;
+        pieces that are already loaded are skipped, so a failed initialization can be retried.
+
+        If a recent checkpoint is found, its state is restored first and only the catch-up
+        requests are made: orders, fills and candles since the checkpoint, the active orders and
+        the account balances. The restored book is kept if the first delta continues its sequence.
+        """
+        self._loop = asyncio.get_running_loop()
+        base = self.market().get_base_symbol()
+        quote = self.market().get_quote_symbol()
+        account_type = self.market().get_market_type()
+        pieces = {
+            "fees": [self.account().get_exchange_fees],
+            "balances": [
+                lambda: self.account().get_account_list(base, account_type),
+                lambda: self.account().get_account_list(quote, account_type),
+                lambda: self.account().get_transferable(base, account_type),
+                lambda: self.account().get_transferable(quote, account_type),
+            ],
+            "orders": [self.trade().get_order_list],
+            "fills": [lambda: self.trade().get_fill_history(account_type)],
+            "klines": [self.market().get_kline],
+            "book": [self.market().get_aggregated_orderv3],
+        }
+        if self._restored is None:
+            self._restored = self._checkpoint is not None and self._restore_checkpoint()
+        if self._restored:
+            pieces["balances"] = pieces["balances"][:2]
+            pieces.update((name, [request]) for name, request in self._catch_up_requests().items())
+            if self._book_restored:
+                # Confirmed, or re-snapshotted, by the first book message on the websocket.
+                del pieces["book"]
+        await asyncio.gather(
+            # A few samples up front, so the first messages are already timed in exchange time.
+            asyncio.to_thread(self._clock.sync, 4),
+            *(self._load_piece(name, requests) for name, requests in pieces.items()),
+        )
+        self._cache_initialized = True
+
+    async def _load_piece(self, name, requests):
+        if self._readiness.is_ready(name):
+            return
+        await asyncio.gather(*(self._fetch_with_retry(name, request) for request in requests))
+        self._readiness.mark_ready(name)
+
+    async def _fetch_with_retry(self, name, request):
+        # The REST wrappers log and return None on failure.
+        for attempt in range(self._MAX_INIT_ATTEMPTS):
+            results = await asyncio.to_thread(request)
+            if results is not None:
+                return results
+            delay = min(2 ** attempt, 30)
+            log.warning("Could not load %s, retrying in %ss...", name, delay)
+            await asyncio.sleep(delay)
+        raise ConnectionError(f"Could not load {name} after {self._MAX_INIT_ATTEMPTS} attempts.")
+
+    def _rest_update(self, message):
+        """
+        Applies a REST result to the cache on the event loop thread.
+
+        REST calls made from worker threads hand their results to the loop, so the cache is only
+        ever mutated by one thread and the results land before the awaiting task resumes.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            if self._loop is not None and self._loop.is_running():
+                self._loop.call_soon_threadsafe(self._update_websocket_data_store, message)
+                return
+        self._update_websocket_data_store(message)
+
     def _get_data(self):
         return self._kc_cache
 
     def get_snapshot(self):
-        return copy.deepcopy(self._kc_cache)
+        return copy.deepcopy(dict(self._kc_cache))
+
+    def cache(self):
+        return self._kc_cache
 
     def ws_is_connected(self):
         return self._ws_client is not None
 
-    def uninitialize_ws(self):
+    async def uninitialize_ws(self):
+        """
+        Closes both websocket connections, so the old ones cannot keep delivering messages into
+        the cache alongside a new connection (see KucoinSocket.close).
+        """
+        sockets = [socket for socket in (self._ws_client, self._ws_private_client) if socket is not None]
         self._ws_client = None
+        self._ws_private_client = None
+        if self._resync_task is not None:
+            self._resync_task.cancel()
+            self._resync_task = None
+        await asyncio.gather(*(socket.close() for socket in sockets))
+
+    def close_shared_memory(self):
+        if self._shm_timer is not None:
+            self._shm_timer.cancel()
+            self._shm_timer = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+    async def resync_async(self):
+        """
+        Catches the cache up after a websocket outage without rebuilding it.
+
+        Only the candles since the newest cached candle, the orders and fills since the last
+        message seen and the active orders are requested. The order book is not re-downloaded
+        here: the first delta on the new socket is checked against the book sequence, and a
+        snapshot is only fetched if a gap is found.
+        """
+        self._loop = asyncio.get_running_loop()
+        requests = list(self._catch_up_requests().values())
+        started = time.monotonic()
+        await asyncio.gather(*(asyncio.to_thread(request) for request in requests))
+        log.info("Resynced %s requests in %.3fs", len(requests), time.monotonic() - started)
+
+    def _on_reconnect(self):
+        # The SDK reconnected a socket: orders, fills and candles may have changed while it was down.
+        # A resync already running read from before this outage, so another one follows it.
+        self._resync_task = asyncio.ensure_future(self._resync_after(self._resync_task))
+
+    async def _resync_after(self, previous):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            await self.resync_async()
+        except Exception as ex:
+            log.error(f"Resync after a reconnect failed: {ex}")
+
+    def _catch_up_requests(self):
+        # Orders and fills since the last message seen, and candles since the newest cached one.
+        now_ms = int(self._clock.now_ms())
+        since_ms = (self._last_message_ms or now_ms) - self._RESYNC_MARGIN_MS
+        account_type = self.market().get_market_type()
+        open_ids = {oid for oid, order in (self._kc_cache.get("orders") or {}).items() if not order_done(order)}
+        requests = {
+            "orders": lambda: self._catch_up_orders(since_ms, open_ids),
+            "fills": lambda: self.trade().get_fill_history(account_type, startAt=since_ms),
+            "klines": self.market().get_kline,
+        }
+        klines = self._kc_cache.get("klines")
+        if klines:
+            requests["klines"] = lambda: self.market().get_kline(startAt=klines[0][0], endAt=now_ms // 1000)
+        return requests
+
+    def _catch_up_orders(self, since_ms, open_ids):
+        """
+        Reads the orders created since since_ms and the active ones; runs in a worker thread.
+
+        The history since the last message misses an order created before it that was filled or
+        canceled meanwhile, so each of open_ids (the orders the cache holds as open) that is no
+        longer active is read again by id, or marked done if that read fails.
+        """
+        active = set()
+
+        def on_page(page, items):
+            active.update(order["id"] for order in items)
+
+        if self.trade().get_order_history(on_page=on_page, status="active") is None:
+            return None
+        results = self.trade().get_order_history(startAt=since_ms)
+        if results is None:
+            return None
+        for oid in open_ids - active:
+            if self.trade().get_order_details(oid) is None:
+                log.warning("Order %s is no longer active and could not be read, marking it done", oid)
+                self._rest_update({"topic": "tradeOrders", "data": [{"id": oid, "isActive": False}]})
+        return results
+
+    def checkpoint_state(self):
+        """
+        Returns the state kept in a checkpoint: candles, open orders, balances, the indicator state
+        and the last seen sequences (order book, trades) and message time.
+        """
+        orders = self._kc_cache.get("orders") or {}
+        book = self._kc_cache.get('/market/level2:' + self._market.get_trade_symbol())
+        return dict(
+            self._checkpoint_identity,
+            klines=[list(candle) for candle in self._kc_cache.get("klines", [])],
+            orders={oid: dict(order) for oid, order in orders.items() if not order_done(order)},
+            balances=self._balances.snapshot(),
+            fills=self._fills.snapshot(),
+            indicators={
+                "sma_period": self._ta.get_period(),
+                "candle_version": self._candle_version,
+                "candle_closes": self._candle_closes,
+            },
+            last_price={
+                "price": self._last_price.price(),
+                "sequence": self._last_price.sequence(),
+                "exchange_time_ms": self._last_price.exchange_time_ms(),
+            },
+            book={
+                "sequence": int(book.get("sequence", 0)),
+                "bids": list(book["bids"].items()),
+                "asks": list(book["asks"].items()),
+            } if book else None,
+            last_message_ms=self._last_message_ms,
+        )
+
+    async def checkpoint_async(self):
+        """
+        Saves a checkpoint once every piece of state has loaded. The state is copied on the event
+        loop and written from a worker thread.
+        """
+        if self._checkpoint is None or not self._readiness.is_ready():
+            return None
+        return await asyncio.to_thread(self._checkpoint.save, self.checkpoint_state())
+
+    def _restore_checkpoint(self):
+        state = self._checkpoint.load(self._checkpoint_identity)
+        if state is None:
+            return False
+        try:
+            klines = [[int(candle[0])] + [float(value) for value in candle[1:]] for candle in state["klines"]]
+            orders = dict(state["orders"])
+            indicators = state["indicators"]
+            fills = state["fills"]
+            last_price = state["last_price"]
+            book = state["book"]
+            if book is not None and int(book["sequence"]) <= 0:
+                book = None
+        except (KeyError, TypeError, ValueError) as ex:
+            log.warning(f"Ignoring malformed checkpoint: {ex}")
+            return False
+
+        self._kc_cache["klines"] = klines
+        self._kc_cache["orders"] = orders
+        for oid in orders:
+            self._kc_cache.touch(oid)
+        self._balances.restore(state["balances"])
+        self._fills.restore(fills)
+        self._candle_version = indicators["candle_version"]
+        self._candle_closes = indicators["candle_closes"]
+        if last_price["price"] is not None:
+            self._last_price.restore(last_price["price"], last_price["sequence"], last_price["exchange_time_ms"])
+        # Orders and fills are caught up from the last message seen before the checkpoint.
+        self._last_message_ms = state["last_message_ms"] or state["saved_at"]
+        if book is not None:
+            self._initialize_order_book({"results": {
+                "sequence": int(book["sequence"]),
+                "bids": {float(price): float(size) for price, size in book["bids"]},
+                "asks": {float(price): float(size) for price, size in book["asks"]},
+            }})
+            self._book_restored = True
+        log.info("Restored checkpoint from %.1fs ago: %s candles, %s open orders, book sequence %s",
+                 self._checkpoint.stats()["restored_age_seconds"], len(klines), len(orders),
+                 book["sequence"] if book is not None else None)
+        return True
+
+    def _confirm_restored_book(self, orderbook, data):
+        # A restored book is only trusted if the first delta continues its sequence.
+        self._book_restored = False
+        sequence = int(orderbook.get("sequence", 0))
+        if int(data["data"]["sequenceStart"]) <= sequence + 1 <= int(data["data"]["sequenceEnd"]):
+            self._readiness.mark_ready("book")
+            return True
+        log.info("Checkpointed order book is behind the feed, resyncing...")
+        self._start_book_resync(data)
+        return False
 
     def set_on_message(self, send_ws_update):
         self._send_ws_update = send_ws_update
 
     async def _receive_ws_message(self, ws_msg):
+        self._last_message_ms = int(self._clock.now_ms())
+        self._overload.observe_message(ws_msg.get("data"))
+        if (self._overload.coalesce_book or self._book_pending) and "/market/level2" in ws_msg.get("topic", ""):
+            self._queue_book_delta(ws_msg)
+            return
         result = self._update_websocket_data_store(ws_msg)
 
         if self._send_ws_update and result:
             self._send_ws_update(self._get_data(), ws_msg)
 
+    def _queue_book_delta(self, ws_msg):
+        # Deltas received in the same event loop tick are applied together and published once.
+        self._book_pending.append(ws_msg)
+        if len(self._book_pending) == 1:
+            asyncio.get_running_loop().call_soon(self._flush_book_deltas)
+
+    def _flush_book_deltas(self):
+        pending, self._book_pending = self._book_pending, []
+        self._book_coalescing = True
+        try:
+            result = None
+            for message in pending:
+                result = self._update_websocket_data_store(message) or result
+        finally:
+            self._book_coalescing = False
+        orderbook = self._kc_cache.get(pending[-1]["topic"])
+        if self._shm is not None and orderbook:
+            self._publish_book(orderbook)
+        if self._send_ws_update and result:
+            self._send_ws_update(self._get_data(), pending[-1])
+
     ###### WEBSOCKET CLIENT ######
     async def connect_websocket_client(self):
-        with open("configuration.yaml", "r") as file:
-            config = yaml.safe_load(file)
-        _check_config_file(config)
-
-        ws_token = WsToken(
-            key=config["api_key"],
-            secret=config["api_secret"],
-            passphrase=config["api_passphrase"]
-        )
-
-        # Create the handle_msg function with access to orderbook
-        async def print_message(msg):
-            print(msg)
-
-        # Connect to WebSocket
-        client = await KucoinWsClient.create(None,
-                                             client=ws_token,
-                                             callback=self._receive_ws_message,
-                                             private=False)
+        # Connect to WebSocket: one connection for public topics and one for private topics.
+        client = await KucoinSocket(self._token, self._receive_ws_message, private=False,
+                                    on_reconnect=self._on_reconnect).open()
+        private_client = await KucoinSocket(self._token, self._receive_ws_message, private=True,
+                                            on_reconnect=self._on_reconnect).open()
         for topic in self._websocket_topics:
-            await client.subscribe(topic)
+            await (private_client if topic in self._PRIVATE_TOPICS else client).subscribe(topic)
 
         self._ws_client = client
+        self._ws_private_client = private_client
+        self._readiness.mark_ready("websocket")
         return True
 
     ####### WEBSOCKET FUNCTIONS #######
     def _update_websocket_data_store(self, message):
-        log.debug(message)
         """
                 Handles WebSocket messages to update the account data in real time.
 
                 Args:
                     message (dict): A dictionary of message data.
                 """
+        if log.isEnabledFor(logging.DEBUG):
+            dropped = _ws_debug_sampler.sample(message.get("topic"))
+            if dropped is not None:
+                log.debug("%s (%s similar messages suppressed)", message, dropped)
         if "topic" not in message:
-            # This is an exchange REST result
-            self._kc_cache = message
+            # This is an exchange REST result with no place in the live cache.
+            return None
+
+        if "/market/ticker" in message["topic"]:
+            self._last_price.update(message["data"], "ticker")
             return None
 
         if "/market/match" in message["topic"]:
+            self._last_price.update(message["data"], "match")
             topic = message["topic"]
             if topic not in self._kc_cache:
                 self._kc_cache[topic] = []
-            self._kc_cache["topic"].append(message["data"])
+            self._kc_cache[topic].append(message["data"])
             if len(self._kc_cache[topic]) > self._MAX_TABLE_LENGTH:
-                del (self._kc_cache[topic][-1])
+                del (self._kc_cache[topic][0])
+            self._kc_cache.enforce("trades")
             return None
 
         if "/margin/position" in message["topic"]:
@@ -198,69 +711,89 @@ class KucoinExchange(BaseExchange):
             if topic not in self._kc_cache:
                 return None
 
+            if self._book_monitor is None:
+                self.update_order_book(message)
+                return 1
+            self._book_monitor.start()
             self.update_order_book(message)
+            self._book_monitor.stop()
+            if self._book_monitor.over_budget():
+                self._switch_to_depth_snapshots()
+            return 1
+
+        if "/spotMarket/level2Depth" in message['topic']:
+            orderbook = self._kc_cache.setdefault('/market/level2:' + self._market.get_trade_symbol(),
+                                                  {"sequence": 0, "bids": {}, "asks": {}})
+            apply_depth_snapshot(orderbook, message["data"])
+            if self._book_restored:
+                self._book_restored = False
+                self._readiness.mark_ready("book")
+            if self._shm is not None:
+                self._shm.publish_book(orderbook)
             return 1
 
         if "candles" in message["topic"]:
             self.update_klines(message)
             return None
 
-        if "tradeOrders" or "fills" in message['topic']:
+        if message["topic"] == "fills":
+            # REST fills feed the fills ledger; they are trades, not orders.
+            self._fills.apply_rest(message["data"])
+            return 1
+
+        if "tradeOrders" in message['topic']:
             # if order_data['type'] in ['received', 'open', 'match', 'filled', 'canceled', 'update']:
             #     pass
+            if isinstance(message.get("data"), dict):
+                self._order_latency.ws_event(message["data"])
+                self._fills.apply_ws_match(message["data"])
+            if isinstance(message.get("data"), dict) and message["data"].get("status") == "done":
+                # A finished order can no longer be holding funds.
+                self._balances.release(message["data"].get("clientOid"))
             self.update_orders(message)
             return 1
 
     def update_balances(self, data=None):
         """
-        Updates the balances dictionary using either provided data or the REST client.
+        Updates the balance ledger using either provided data or the REST client.
 
         Args:
-            data (dict): Optional; a dictionary of balance data.
+            data (dict): Optional; a REST cache object or an '/account/balance' websocket message.
         """
-        if data:
-            if "accounts" not in self._kc_cache:
-                # Initializing the data_store
-                self._kc_cache["accounts"] = {
-                    self._market.get_market_type(): {
-                        self._market.get_base_symbol(): {},
-                        self._market.get_quote_symbol(): {}
-                    }
-                }
-
-            if "data" not in data:
-                # this is a REST message
-                for currency in data["accounts"][self._market.get_market_type()]:
-                    self._kc_cache["accounts"][self._market.get_market_type()][currency].update(
-                        data["accounts"][self.market().get_market_type()][currency])
-            else:
-                # Update the balances dictionary using WebSocket data
-                for balance in data:
-                    if balance['currency'] not in self._kc_cache["accounts"]:
-                        self._kc_cache["accounts"] = balance["currency"]
-
-                    self._kc_cache[balance['currency']] = {
-                        'available': float(balance['available']),
-                        'holds': float(balance['holds'])
-                    }
+        if not data:
+            # Re-seed the ledger from the REST client.
+            account_type = self.market().get_market_type()
+            self.account().get_account_list(self.market().get_base_symbol(), account_type)
+            self.account().get_account_list(self.market().get_quote_symbol(), account_type)
+            return
+
+        if "data" not in data:
+            # this is a REST message
+            for account_type, currencies in data["accounts"].items():
+                for currency, balance in currencies.items():
+                    self._balances.seed(account_type, currency, balance)
         else:
+            # Update the ledger using WebSocket data
+            self._balances.apply_ws_update(data["data"])
+
+    def balances(self):
+        return self._balances
 
-            # Fetch the current account balances using the REST client
-            balances = self.exchange.account().get().balances()
-            # if "accounts" not in self._web_socket_data_store:
-            #     self._web_socket_data_store["accounts"] = balances["currency"]
-            # # Update the balances dictionary
-            # for balance in balances:
-            #     self._web_socket_data_store[balance['currency']] = {
-            #         'available': float(balance['available']),
-            #         'holds': float(balance['holds'])
-            #     }
+    def spendable_base(self):
+        return self._balances.spendable(self.market().get_market_type(), self.market().get_base_symbol())
+
+    def spendable_quote(self):
+        return self._balances.spendable(self.market().get_market_type(), self.market().get_quote_symbol())
 
     def _initialize_order_book(self, message):
         # Convert price and size values to floats
         orderbook = message["results"]
         self._kc_cache['/market/level2:' + self._market.get_trade_symbol()] = orderbook
         # self._print_market_book(orderbook, 13)
+        if self._book_depth is not None:
+            self._book_depth.reset(orderbook)
+        if self._shm is not None:
+            self._shm.publish_book(orderbook)
         return
 
     def update_order_book(self, data):
@@ -269,36 +802,95 @@ class KucoinExchange(BaseExchange):
         if not orderbook:
             return
 
-        # Cache the changes data
-        changes = data["data"]["changes"]
+        if self._book_resyncing:
+            self._book_buffer.append(data)
+            return
 
-        # Apply the changes to the local order book
-        for side in ["asks", "bids"]:
-            if side in changes:
-                for change in changes[side]:
-                    price, size, sequence = change
+        if self._book_restored and not self._confirm_restored_book(orderbook, data):
+            return
 
-                    # Convert price and size to float
-                    price = float(price)
-                    size = float(size)
+        if int(data["data"]["sequenceStart"]) > int(orderbook.get("sequence", 0)) + 1:
+            # Deltas were missed (e.g. while the socket was down); the book must be re-snapshotted.
+            self._start_book_resync(data)
+            return
 
-                    if size == 0:
-                        if price in orderbook[side]:
-                            del orderbook[side][price]
-                    else:
-                        orderbook[side][price] = size
+        self._apply_book_changes(orderbook, data)
 
-        # Update the sequence of the order book
-        orderbook["sequence"] = data["data"]["sequenceEnd"]
+    def _start_book_resync(self, data):
+        if self._loop is None or not self._loop.is_running():
+            log.warning("Order book sequence gap detected, but no event loop is running to resync it.")
+            return
+        log.info("Order book sequence gap detected, resyncing...")
+        self._book_resyncing = True
+        self._book_buffer = [data]
+        self._loop.create_task(self._resync_book(data["topic"]))
+
+    async def _resync_book(self, topic):
+        delay = self._BOOK_RESYNC_RETRY_SECONDS
+        try:
+            # Deltas stay buffered until a snapshot arrives. Replayed onto the stale book, they
+            # would move its sequence past the gap, and the gap would never be detected again.
+            while await asyncio.to_thread(self.market().get_aggregated_orderv3) is None:
+                log.warning("Order book snapshot failed, retrying in %.1fs (%s deltas buffered)",
+                            delay, len(self._book_buffer))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self._BOOK_RESYNC_MAX_RETRY_SECONDS)
+            self._readiness.mark_ready("book")
+            orderbook = self._kc_cache[topic]
+            for buffered in self._book_buffer:
+                self._apply_book_changes(orderbook, buffered)
+        finally:
+            self._book_buffer = []
+            self._book_resyncing = False
+
+    def _apply_book_changes(self, orderbook, data):
+        apply_changes(orderbook, data["data"], self._book_depth)
+        if self._book_depth is not None and self._book_depth.trim(orderbook) and not self._book_resyncing:
+            # The price moved past the levels that were kept; only a snapshot can refill the side.
+            self._start_book_resync(data)
+            return
+        if self._shm is not None and not self._book_coalescing:
+            self._publish_book(orderbook)
+
+    def _publish_book(self, orderbook):
+        # A bounded (topk) book is published on every delta. A full book is published at most
+        # every shm_interval seconds, and its latest state once the interval has passed.
+        if self._book_depth is not None:
+            self._shm.publish_book(orderbook)
+            return
+        now = time.monotonic()
+        wait = self._shm_published_at + self._shm_interval - now
+        if wait <= 0:
+            self._shm_published_at = now
+            self._shm.publish_book(orderbook)
+        elif self._shm_timer is None and self._loop is not None and self._loop.is_running():
+            self._shm_timer = self._loop.call_later(wait, self._publish_pending_book)
+
+    def _publish_pending_book(self):
+        self._shm_timer = None
+        orderbook = self._kc_cache.get(self._book_topic())
+        if self._shm is not None and orderbook:
+            self._shm_published_at = time.monotonic()
+            self._shm.publish_book(orderbook)
+
+    def _switch_to_depth_snapshots(self):
+        if self._loop is None or not self._loop.is_running() or self._ws_client is None:
+            return
+        log.warning("Order book updates used %.1f%% of a core (budget %.1f%%), switching to level2Depth50 snapshots",
+                    self._book_monitor.last_share * 100, self._book_monitor.budget * 100)
+        old_topic = self._book_topic()
+        self._book_mode = "depth50"
+        self._book_depth = None
+        self._book_monitor = None
+        new_topic = self._book_topic()
+        self._websocket_topics[self._websocket_topics.index(old_topic)] = new_topic
+        self._loop.create_task(self._replace_subscription(old_topic, new_topic))
+
+    async def _replace_subscription(self, old_topic, new_topic):
+        await self._ws_client.subscribe(new_topic)
+        await self._ws_client.unsubscribe(old_topic)
 
     def update_orders(self, update_message=None):
-        # Check to see if this is a received update or an update request
-        topic = update_message["topic"]
-        if topic == "fills":
-            oKey = "orderId"
-        else:
-            oKey = "id"
-
         if not update_message:
             self.trade().get_order_list()
             return
@@ -307,12 +899,18 @@ class KucoinExchange(BaseExchange):
             # Initializing the data_store
             self._kc_cache["orders"] = {}
 
-        for order in update_message["data"]:
-            oid = order[oKey]
+        orders = update_message["data"]
+        if isinstance(orders, dict):
+            # A websocket order event carries a single order, identified by orderId.
+            orders = [orders]
+        for order in orders:
+            oid = order.get("id") or order["orderId"]
             if oid not in self._kc_cache["orders"]:
                 self._kc_cache["orders"][oid] = order
             else:
                 self._kc_cache["orders"][oid].update(order)
+            self._kc_cache.touch(oid)
+        self._kc_cache.enforce("orders")
         return
 
     def update_klines(self, message=None):
@@ -320,11 +918,13 @@ class KucoinExchange(BaseExchange):
             self._kc_cache["klines"] = []
 
         if "subject" not in message:
-            # This is a REST UPDATE
-            # Convert the data types
+            # This is a REST UPDATE, possibly a backfill overlapping the cached candles.
+            # Explicitly convert the first value to int and the rest to float
+            candles = {candle[0]: candle for candle in self._kc_cache["klines"]}
             for candle in message["data"]["candles"]:
-                # Explicitly convert the first value to int and the rest to float
-                self._kc_cache["klines"].append([int(candle[0])] + [float(x) for x in candle[1:]])
+                candles[int(candle[0])] = [int(candle[0])] + [float(x) for x in candle[1:]]
+            self._kc_cache["klines"] = sorted(candles.values(), key=lambda candle: candle[0], reverse=True)
+            self._candle_closes += 1
 
         else:
             raw_update_candle = message["data"]["candles"]
@@ -334,6 +934,10 @@ class KucoinExchange(BaseExchange):
             if not self._kc_cache["klines"] or update_candle[0] > self._kc_cache["klines"][0][0]:
                 # This is a new minute, insert the new candle at the top
                 self._kc_cache["klines"].insert(0, update_candle)
+                self._candle_closes += 1
+                if len(self._kc_cache["klines"]) > 1:
+                    for callback in self._candle_close_listeners:
+                        callback(self._kc_cache["klines"][1])
                 # Remove the last element if the length exceeds 100
                 if len(self._kc_cache["klines"]) > 100:
                     self._kc_cache["klines"].pop()
@@ -343,6 +947,10 @@ class KucoinExchange(BaseExchange):
 
             # if len(self._kc_cache["klines"]) > self._MAX_TABLE_LENGTH:
             #     del (self._kc_cache["klines"][-1])
+        self._candle_version += 1
+        if self._shm is not None:
+            self._shm.publish_candles(self._kc_cache["klines"])
+        self._kc_cache.enforce("candles")
         return
 
     def _convert_length_to_delta(self, _time_delta):
@@ -373,7 +981,8 @@ class KucoinExchange(BaseExchange):
 
         return None
 
-    def unsubscribe(self):
-        if self._ws_client:
-            for topic in self._websocket_topics:
-                self._ws_client.subscribe(topic)
+    async def unsubscribe(self):
+        for topic in self._websocket_topics:
+            client = self._ws_private_client if topic in self._PRIVATE_TOPICS else self._ws_client
+            if client:
+                await client.unsubscribe(topic)
@@ -0,0 +1,171 @@
+import logging
+import os
+import time
+
+log = logging.getLogger("KucoinExport")
+
+_np = None
+
+
+def load_numpy():
+    """
+    Imports numpy on first use and returns the module, so importing the exchange stays cheap.
+    """
+    global _np
+    if _np is None:
+        import numpy as np
+        _np = np
+    return _np
+
+
+BOOK_FIELDS = [("price", "f8"), ("size", "f8")]
+# Same column names as KCTa.get_ta, in KuCoin candle order.
+CANDLE_FIELDS = [("open_time", "i8"), ("open", "f8"), ("close", "f8"), ("high", "f8"), ("low", "f8"),
+                 ("volume", "f8"), ("amount", "f8")]
+TRADE_FIELDS = [("sequence", "i8"), ("time", "i8"), ("price", "f8"), ("size", "f8"), ("side", "U4"),
+                ("tradeId", "U32")]
+ORDER_FIELDS = [("id", "U32"), ("clientOid", "U40"), ("side", "U4"), ("type", "U8"), ("status", "U8"),
+                ("price", "f8"), ("size", "f8"), ("dealSize", "f8"), ("createdAt", "i8")]
+
+
+def _number(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class KucoinExport:
+    """
+    Columnar export of the live exchange cache.
+
+    Book sides, candles, trades and orders come out as NumPy structured arrays, built straight
+    from the cache without a deep copy or per-row dicts, or as Arrow record batches when pyarrow
+    is installed. dump() writes all of them to Feather or Parquet files for offline analysis.
+    """
+
+    def __init__(self, get_data_function, trade_symbol):
+        self._get_data = get_data_function
+        self._symbol = trade_symbol
+
+    def book(self, side, depth=None):
+        """
+        Returns one side of the order book, best price first.
+
+        Args:
+            side (str): 'bids' or 'asks'.
+            depth (int): Optional; number of levels to return.
+        """
+        np = load_numpy()
+        orderbook = self._get_data().get('/market/level2:' + self._symbol) or {}
+        levels = orderbook.get(side) or {}
+        array = np.fromiter(levels.items(), dtype=BOOK_FIELDS, count=len(levels))
+        array.sort(order="price")
+        if side == "bids":
+            array = array[::-1]
+        return array[:depth] if depth else array
+
+    def candles(self):
+        """
+        Returns the cached candles, newest first like the cache.
+        """
+        np = load_numpy()
+        klines = self._get_data().get("klines") or []
+        if not klines:
+            return np.empty(0, dtype=CANDLE_FIELDS)
+        values = np.array(klines, dtype="f8")
+        array = np.empty(len(klines), dtype=CANDLE_FIELDS)
+        for index, (name, _) in enumerate(CANDLE_FIELDS):
+            array[name] = values[:, index]
+        return array
+
+    def trades(self):
+        """
+        Returns the cached '/market/match' trades, oldest first.
+        """
+        np = load_numpy()
+        matches = self._get_data().get('/market/match:' + self._symbol) or []
+        return np.fromiter(
+            ((int(match.get("sequence", 0)), int(match.get("time", 0)), _number(match.get("price")),
+              _number(match.get("size")), match.get("side", ""), match.get("tradeId", "")) for match in matches),
+            dtype=TRADE_FIELDS, count=len(matches))
+
+    def orders(self):
+        """
+        Returns the cached orders. REST and websocket order updates name some fields differently;
+        in a websocket update "type" is the event (open, match, filled...) and "orderType" the
+        order type.
+        """
+        np = load_numpy()
+        orders = self._get_data().get("orders") or {}
+        return np.fromiter(
+            ((str(order.get("id") or order.get("orderId") or oid), order.get("clientOid") or "",
+              order.get("side", ""), order.get("orderType") or order.get("type") or "",
+              order.get("status") or ("open" if order.get("isActive") else "done"),
+              _number(order.get("price")), _number(order.get("size")),
+              _number(order.get("dealSize", order.get("filledSize"))),
+              int(order.get("createdAt") or order.get("orderTime") or 0)) for oid, order in orders.items()),
+            dtype=ORDER_FIELDS, count=len(orders))
+
+    def arrays(self):
+        return {
+            "bids": self.book("bids"),
+            "asks": self.book("asks"),
+            "candles": self.candles(),
+            "trades": self.trades(),
+            "orders": self.orders(),
+        }
+
+    @staticmethod
+    def to_record_batch(array):
+        """
+        Converts a structured array into a pyarrow.RecordBatch, one Arrow column per field.
+        """
+        import pyarrow as pa
+
+        return pa.RecordBatch.from_arrays([pa.array(array[name]) for name in array.dtype.names],
+                                          names=list(array.dtype.names))
+
+    def record_batches(self):
+        return {name: self.to_record_batch(array) for name, array in self.arrays().items()}
+
+    def dump(self, directory, fmt="feather"):
+        """
+        Writes every table to <directory>/<symbol>_<table>_<timestamp>.<fmt> and returns the paths.
+
+        Args:
+            directory (str): Output directory; created if missing.
+            fmt (str): 'feather' or 'parquet', or 'npz' for a single NumPy archive. Feather and
+                Parquet need pyarrow; without it the tables are written to an .npz archive instead.
+        """
+        if fmt not in ("feather", "parquet", "npz"):
+            raise ValueError(f"Unknown export format {fmt}; use 'feather', 'parquet' or 'npz'.")
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        prefix = os.path.join(directory, f"{self._symbol}_")
+        arrays = self.arrays()
+
+        if fmt != "npz":
+            try:
+                import pyarrow as pa
+            except ImportError:
+                log.warning("pyarrow is not installed, exporting to .npz instead of .%s", fmt)
+                fmt = "npz"
+        if fmt == "npz":
+            path = f"{prefix}{stamp}.npz"
+            load_numpy().savez(path, **arrays)
+            log.info("Exported %s tables to %s", len(arrays), path)
+            return [path]
+
+        if fmt == "feather":
+            from pyarrow.feather import write_feather as write
+        else:
+            from pyarrow.parquet import write_table as write
+
+        paths = []
+        for name, array in arrays.items():
+            path = f"{prefix}{name}_{stamp}.{fmt}"
+            write(pa.Table.from_batches([self.to_record_batch(array)]), path)
+            paths.append(path)
+        log.info("Exported %s tables to %s", len(paths), directory)
+        return paths
@@ -0,0 +1,194 @@
+import collections
+import threading
+
+
+def _fill_time_ms(fill):
+    # REST fills carry createdAt in ms; websocket match events carry ts in ns.
+    stamp = int(fill.get("createdAt") or fill.get("ts") or 0)
+    return stamp // 1000000 if stamp > 10 ** 17 else stamp
+
+
+class KucoinFillsLedger:
+    """
+    Net position, average entry price, realized PnL and fees for one symbol, built from our fills.
+
+    Every fill is applied once, keyed by tradeId, and updates the running totals in constant time
+    with average cost accounting: buys and sells that add to the position move the average entry
+    price, fills that reduce it realize (price - average entry) on the reduced size, and a fill
+    that flips the position opens the remainder at its own price. Unrealized PnL is the position
+    valued at a mark price.
+
+    Fills come from REST history (fee included) and from websocket match events (no fee, so it
+    is estimated from the maker or taker fee rate). When the REST fill of a trade already seen on
+    the websocket arrives, only its fee is corrected. Fills are expected in trade order; each
+    REST batch is sorted by time before it is applied.
+    """
+
+    def __init__(self, symbol, fee_rate_function=None, max_trades=100000):
+        self._symbol = symbol
+        self._base, self._quote = symbol.split("-")
+        self._fee_rate = fee_rate_function
+        self._lock = threading.Lock()
+        # tradeId -> [fee in quote, estimated], oldest first, for deduplication and fee corrections.
+        self._trades = collections.OrderedDict()
+        self._max_trades = max_trades
+        self._position = 0.0
+        self._average_price = 0.0
+        self._realized = 0.0
+        self._fees = 0.0
+        self._fees_by_currency = collections.Counter()
+        self._volume = 0.0
+        # The tradeIds are capped (and trimmed in snapshots), so the fills are counted separately.
+        self._fill_count = 0
+        self._counts = collections.Counter()
+        self._last_fill_ms = 0
+
+    def apply_rest(self, fills):
+        """
+        Applies REST fill items (GET /api/v1/fills) for this symbol, oldest first.
+
+        Returns:
+            int: The number of fills that were new.
+        """
+        fills = sorted((fill for fill in fills if fill.get("symbol") == self._symbol),
+                       key=lambda fill: (_fill_time_ms(fill), fill.get("tradeId", "")))
+        added = 0
+        with self._lock:
+            for fill in fills:
+                fee = float(fill.get("fee", 0))
+                fee_currency = fill.get("feeCurrency", self._quote)
+                added += self._add(fill["tradeId"], fill["side"], float(fill["price"]), float(fill["size"]),
+                                   fee, fee_currency, _fill_time_ms(fill), "rest")
+        return added
+
+    def apply_ws_match(self, data):
+        """
+        Applies a /spotMarket/tradeOrders "match" event body.
+
+        Returns:
+            bool: True if the trade was new.
+        """
+        if data.get("type") != "match" or data.get("symbol") != self._symbol or "tradeId" not in data:
+            return False
+        price = float(data["matchPrice"])
+        size = float(data["matchSize"])
+        rate = self._fee_rate(data.get("liquidity")) if self._fee_rate is not None else 0.0
+        with self._lock:
+            return self._add(data["tradeId"], data["side"], price, size, price * size * (rate or 0.0), self._quote,
+                             _fill_time_ms(data), "ws", estimated=True)
+
+    def _add(self, trade_id, side, price, size, fee, fee_currency, time_ms, source, estimated=False):
+        # Fees charged in the base currency are valued at the fill price.
+        fee_quote = fee * price if fee_currency == self._base else fee
+        known = self._trades.get(trade_id)
+        if known is not None:
+            if known[1] and not estimated:
+                # The REST fill of a trade seen on the websocket: replace the estimated fee.
+                self._fees += fee_quote - known[0]
+                self._fees_by_currency[self._quote] -= known[0]
+                self._fees_by_currency[fee_currency] += fee
+                self._trades[trade_id] = [fee_quote, False]
+                self._counts["fee_corrections"] += 1
+            else:
+                self._counts["duplicates"] += 1
+            return False
+
+        self._trades[trade_id] = [fee_quote, estimated]
+        if len(self._trades) > self._max_trades:
+            self._trades.popitem(last=False)
+
+        quantity = size if side == "buy" else -size
+        position = self._position
+        if position == 0 or (position > 0) == (quantity > 0):
+            self._average_price = (self._average_price * abs(position) + price * size) / (abs(position) + size)
+        else:
+            closed = min(size, abs(position))
+            self._realized += closed * (price - self._average_price) * (1 if position > 0 else -1)
+            if size > abs(position):
+                self._average_price = price
+        self._position = position + quantity
+        if abs(self._position) < 1e-12:
+            self._position = 0.0
+            self._average_price = 0.0
+
+        self._fees += fee_quote
+        self._fees_by_currency[fee_currency] += fee
+        self._volume += price * size
+        self._fill_count += 1
+        self._last_fill_ms = max(self._last_fill_ms, time_ms)
+        self._counts[source] += 1
+        return True
+
+    def snapshot(self, recent_trades=1000):
+        """
+        Returns the running totals and the most recent tradeIds, e.g. for a checkpoint.
+        """
+        with self._lock:
+            return {
+                "position": self._position,
+                "average_price": self._average_price,
+                "realized": self._realized,
+                "fees": self._fees,
+                "fees_by_currency": dict(self._fees_by_currency),
+                "volume": self._volume,
+                "fill_count": self._fill_count,
+                "last_fill_ms": self._last_fill_ms,
+                "trades": list(self._trades.items())[-recent_trades:],
+            }
+
+    def restore(self, state):
+        """
+        Loads totals from snapshot(). Fills after the snapshot are applied on top; the tradeIds it
+        holds keep fills it already counted from being applied again.
+        """
+        with self._lock:
+            self._position = float(state["position"])
+            self._average_price = float(state["average_price"])
+            self._realized = float(state["realized"])
+            self._fees = float(state["fees"])
+            self._fees_by_currency = collections.Counter(state["fees_by_currency"])
+            self._volume = float(state["volume"])
+            self._last_fill_ms = int(state["last_fill_ms"])
+            self._trades = collections.OrderedDict((trade_id, list(known)) for trade_id, known in state["trades"])
+            self._fill_count = int(state.get("fill_count", len(self._trades)))
+
+    def position(self):
+        return self._position
+
+    def average_price(self):
+        return self._average_price
+
+    def realized_pnl(self):
+        return self._realized
+
+    def unrealized_pnl(self, mark_price):
+        if mark_price is None or self._position == 0:
+            return 0.0
+        return self._position * (mark_price - self._average_price)
+
+    def fees(self):
+        return self._fees
+
+    def last_fill_ms(self):
+        return self._last_fill_ms
+
+    def stats(self, mark_price=None):
+        """
+        Returns the position, average entry, realized and unrealized PnL (in the quote currency,
+        unrealized at mark_price), fees and fill counts.
+        """
+        with self._lock:
+            unrealized = self.unrealized_pnl(mark_price)
+            return {
+                "position": self._position,
+                "average_price": self._average_price,
+                "realized_pnl": self._realized,
+                "unrealized_pnl": unrealized,
+                "fees": self._fees,
+                "fees_by_currency": {currency: fee for currency, fee in self._fees_by_currency.items() if fee},
+                "net_pnl": self._realized + unrealized - self._fees,
+                "volume": self._volume,
+                "fills": self._fill_count,
+                "sources": dict(self._counts),
+                "last_fill_ms": self._last_fill_ms,
+            }
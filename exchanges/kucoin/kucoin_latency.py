@@ -0,0 +1,157 @@
+import collections
+import threading
+import time
+
+from metrics import percentiles
+
+# Order lifecycle stages, in the order they normally happen: submit, ack, received, open, match, done.
+# Measured intervals: (name, from stage, to stage). submit_to_ack is the REST path and
+# submit_to_received the websocket path; comparing them shows which one is slower.
+INTERVALS = [
+    ("submit_to_ack", "submit", "ack"),
+    ("submit_to_received", "submit", "received"),
+    ("ack_to_received", "ack", "received"),
+    ("received_to_open", "received", "open"),
+    ("submit_to_open", "submit", "open"),
+    ("submit_to_match", "submit", "match"),
+    ("submit_to_done", "submit", "done"),
+]
+
+
+class KucoinOrderLatency:
+    """
+    Times each order from submission to completion, keyed by clientOid.
+
+    submit and ack are stamped around the REST call, the rest from the tradeOrders websocket
+    events, on the local monotonic clock. The websocket events can arrive before the REST call
+    returns, so stages are stamped in whatever order they come; an order that is done before its
+    ack is kept for up to `grace` seconds to wait for it. Once an order is done and acknowledged
+    its intervals are added to the samples of its order type and side; orders that never finish
+    are dropped after max_age seconds.
+    """
+
+    def __init__(self, samples=1000, max_age=24 * 60 * 60, grace=60.0):
+        self._lock = threading.Lock()
+        self._orders = {}
+        # Done orders still waiting for their ack, oldest first.
+        self._unacked = collections.OrderedDict()
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=samples))
+        self._counts = collections.Counter()
+        self._max_age = max_age
+        self._grace = grace
+
+    def submitted(self, clientOid, order_type, side):
+        with self._lock:
+            self._orders[clientOid] = {"type": order_type, "side": side, "submit": time.monotonic()}
+            self._counts["submitted"] += 1
+
+    def acknowledged(self, clientOid, accepted=True):
+        with self._lock:
+            order = self._orders.get(clientOid)
+            if order is None:
+                return
+            order["ack"] = time.monotonic()
+            if not accepted:
+                # Rejected over REST: only the REST path is measured.
+                del self._orders[clientOid]
+                self._unacked.pop(clientOid, None)
+                self._counts["rejected"] += 1
+                self._record(order)
+            elif "done" in order:
+                self._finish(clientOid, order)
+
+    def ws_event(self, data):
+        """
+        Stamps the stage of a /spotMarket/tradeOrders message body.
+        """
+        if not isinstance(data, dict):
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            order = self._orders.get(data.get("clientOid"))
+            if order is None:
+                return
+            event_type = data.get("type")
+            if event_type in ("received", "open", "match"):
+                order.setdefault(event_type, now)
+            if (data.get("status") == "done" or event_type in ("filled", "canceled")) and "done" not in order:
+                order["done"] = now
+                if "ack" in order:
+                    self._finish(data["clientOid"], order)
+                else:
+                    self._unacked[data["clientOid"]] = order
+
+    def _finish(self, clientOid, order):
+        del self._orders[clientOid]
+        self._unacked.pop(clientOid, None)
+        self._counts["done"] += 1
+        self._record(order)
+
+    def _record(self, order):
+        key = (order["type"], order["side"])
+        for name, start, end in INTERVALS:
+            if start in order and end in order:
+                self._samples[key + (name,)].append(order[end] - order[start])
+
+    def _expire(self, now):
+        # A done order whose ack has not come within the grace period is recorded without it.
+        while self._unacked:
+            clientOid, order = next(iter(self._unacked.items()))
+            if now - order["done"] <= self._grace:
+                break
+            self._finish(clientOid, order)
+        if len(self._orders) < 100:
+            return
+        for clientOid in [clientOid for clientOid, order in self._orders.items()
+                          if now - order["submit"] > self._max_age]:
+            del self._orders[clientOid]
+            self._counts["expired"] += 1
+
+    def stats(self):
+        """
+        Returns {"type/side": {interval: {count, p50_ms, p90_ms, p99_ms, max_ms}}}.
+        """
+        result = {}
+        with self._lock:
+            samples = {key: list(values) for key, values in self._samples.items()}
+        for (order_type, side, name), values in samples.items():
+            summary = percentiles(values, points=(50, 90, 99))
+            result.setdefault(f"{order_type}/{side}", {})[name] = {
+                "count": summary["count"],
+                "p50_ms": summary["p50"],
+                "p90_ms": summary["p90"],
+                "p99_ms": summary["p99"],
+                "max_ms": summary["max"],
+            }
+        return result
+
+    def counts(self):
+        """
+        Returns the number of orders in flight and of orders submitted, done, rejected and expired.
+        """
+        with self._lock:
+            result = {"in_flight": len(self._orders)}
+            for name in ("submitted", "done", "rejected", "expired"):
+                result[name] = self._counts[name]
+        return result
+
+    def summary(self):
+        """
+        Returns a text table of the p50/p99 of each interval per order type and side.
+        """
+        from tabulate import tabulate
+
+        rows = []
+        for key, intervals in sorted(self.stats().items()):
+            for name, _, _ in INTERVALS:
+                if name in intervals:
+                    values = intervals[name]
+                    rows.append([key, name, values["count"], values["p50_ms"], values["p99_ms"], values["max_ms"]])
+        if not rows:
+            return "No completed orders."
+        return tabulate(rows, headers=["order", "interval", "count", "p50 ms", "p99 ms", "max ms"])
+
+    def report_lines(self):
+        counts = ", ".join(f"{value} {name.replace('_', ' ')}" for name, value in self.counts().items())
+        return ["", f"Order latency ({counts}):", self.summary(), ""]
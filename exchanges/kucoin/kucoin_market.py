@@ -3,13 +3,15 @@ import logging
 from base_market import BaseMarket
 from kucoin.client import Market
 from exchanges.kucoin.kucoin_exception import KucoinAPIException
+from exchanges.kucoin.kucoin_reference import KucoinReferenceData
+from exchanges.kucoin.kucoin_scheduler import KucoinRequestScheduler, PRIORITY_MARKET_READ
 
 
 class KucoinMarket(BaseMarket):
-    def __init__(self, config, get_data_function=None, rest_update_function=None):
+    def __init__(self, config, get_data_function=None, rest_update_function=None, scheduler=None,
+                 reference_data=None, last_price=None):
         super().__init__(config)
         self.log = logging.getLogger("KucoinMarket")
-        self.log.setLevel(config["log_level"])
 
         self._time_delta = config["candle_length"]
 
@@ -20,17 +22,24 @@ class KucoinMarket(BaseMarket):
             self._rest_update = rest_update_function
 
         self._exchange = "Kucoin"
+        self._scheduler = scheduler or KucoinRequestScheduler()
+        self._reference = reference_data or KucoinReferenceData()
+        self._last_price = last_price
         self._market = Market(
             key=config["api_key"],
             secret=config["api_secret"],
             passphrase=config["api_passphrase"],
-            is_sandbox=(config["sandbox"] == "True")
+            is_sandbox=(config["sandbox"] == "True"),
+            url=config.get("rest_url", ""),
         )
 
     def get_fiat_price(self, **kwargs):
+        key = "fiat_price:" + ",".join(f"{name}={value}" for name, value in sorted(kwargs.items()))
+        return self._reference.get(key, lambda: self._request_fiat_price(**kwargs))
+
+    def _request_fiat_price(self, **kwargs):
         try:
-            results = self._market.get_fiat_price(**kwargs)
-            self._rest_update(results)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_fiat_price, **kwargs, coalesce=True)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error getting fiat price: {ex}")
@@ -40,7 +49,7 @@ class KucoinMarket(BaseMarket):
 
     def get_all_tickers(self):
         try:
-            results = self._market.get_all_tickers()
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_all_tickers, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -51,7 +60,8 @@ class KucoinMarket(BaseMarket):
 
     def get_kline(self, **kwargs):
         try:
-            results = self._market.get_kline(self.get_trade_symbol(), self._time_delta, **kwargs)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_kline,
+                                           self.get_trade_symbol(), self._time_delta, **kwargs, coalesce=True)
             cache_object = {
                 "topic": "candles",
                 "data": {
@@ -67,9 +77,13 @@ class KucoinMarket(BaseMarket):
         return None
 
     def get_currency_detail_v2(self, currency, chain=None):
+        return self._reference.get(f"currency_detail_v2:{currency}:{chain}",
+                                   lambda: self._request_currency_detail_v2(currency, chain))
+
+    def _request_currency_detail_v2(self, currency, chain=None):
         try:
-            results = self._market.get_currency_detail_v2(currency, chain)
-            self._rest_update(results)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_currency_detail_v2,
+                                           currency, chain, coalesce=True)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error getting currency detail v2 for {currency}: {ex}")
@@ -80,7 +94,7 @@ class KucoinMarket(BaseMarket):
 
     def get_atomic_order(self, symbol):
         try:
-            results = self._market.get_atomic_order(symbol)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_atomic_order, symbol, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -91,7 +105,7 @@ class KucoinMarket(BaseMarket):
 
     def get_ticker(self, symbol):
         try:
-            results = self._market.get_ticker(symbol)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_ticker, symbol, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -102,7 +116,7 @@ class KucoinMarket(BaseMarket):
 
     def get_atomic_orderv3(self, symbol):
         try:
-            results = self._market.get_atomic_orderv3(symbol)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_atomic_orderv3, symbol, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -112,9 +126,11 @@ class KucoinMarket(BaseMarket):
         return None
 
     def get_market_list(self):
+        return self._reference.get("markets", self._request_market_list)
+
+    def _request_market_list(self):
         try:
-            results = self._market.get_market_list()
-            self._rest_update(results)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_market_list, coalesce=True)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error getting market list: {ex}")
@@ -122,12 +138,56 @@ class KucoinMarket(BaseMarket):
             self.log.error(f"Unexpected error getting market list: {ex}")
         return None
 
+    def get_symbol_list(self):
+        return self._reference.get("symbols", self._request_symbol_list)
+
+    def _request_symbol_list(self):
+        try:
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_symbol_list, coalesce=True)
+            return results
+        except KucoinAPIException as ex:
+            self.log.error(f"API error getting symbol list: {ex}")
+        except Exception as ex:
+            self.log.error(f"Unexpected error getting symbol list: {ex}")
+        return None
+
+    def get_symbol_info(self, symbol=None):
+        symbol = symbol or self.get_trade_symbol()
+        for info in self.get_symbol_list() or []:
+            if info["symbol"] == symbol:
+                return info
+        return None
+
+    def _get_symbol_value(self, field, symbol=None):
+        info = self.get_symbol_info(symbol)
+        if info is None or info.get(field) is None:
+            return None
+        return float(info[field])
+
+    def get_price_increment(self, symbol=None):
+        return self._get_symbol_value("priceIncrement", symbol)
+
+    def get_base_increment(self, symbol=None):
+        return self._get_symbol_value("baseIncrement", symbol)
+
+    def get_quote_increment(self, symbol=None):
+        return self._get_symbol_value("quoteIncrement", symbol)
+
+    def get_base_min_size(self, symbol=None):
+        return self._get_symbol_value("baseMinSize", symbol)
+
+    def get_quote_min_size(self, symbol=None):
+        return self._get_symbol_value("quoteMinSize", symbol)
+
     def get_aggregated_orderv3(self):
         try:
-            results = self._market.get_aggregated_orderv3(self.get_trade_symbol())
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_aggregated_orderv3,
+                                           self.get_trade_symbol(), coalesce=True)
+            # Coalesced callers share the raw result, so convert into a copy.
+            results = dict(results)
             results["asks"] = {float(price): float(size) for price, size in results["asks"]}
             results["bids"] = {float(price): float(size) for price, size in results["bids"]}
-
+            results["sequence"] = int(results["sequence"])
 
             cache_object = {
                 "topic": "init_order_book",
@@ -143,9 +203,11 @@ class KucoinMarket(BaseMarket):
         return None
 
     def get_currencies(self):
+        return self._reference.get("currencies", self._request_currencies)
+
+    def _request_currencies(self):
         try:
-            results = self._market.get_currencies()
-            self._rest_update(results)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_currencies, coalesce=True)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error getting currencies: {ex}")
@@ -155,7 +217,7 @@ class KucoinMarket(BaseMarket):
 
     def get_server_timestamp(self):
         try:
-            results = self._market.get_server_timestamp()
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_server_timestamp, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -164,10 +226,32 @@ class KucoinMarket(BaseMarket):
             self.log.error(f"Unexpected error getting server timestamp: {ex}")
         return None
 
+    def get_server_time_sample(self):
+        """
+        Returns (sent, received, wall midpoint, server ms) for clock estimation, or None.
+
+        The request is timed inside the scheduler worker, so queueing is not counted as round trip.
+        """
+        def timed_request():
+            sent = time.monotonic()
+            wall = time.time()
+            server_ms = self._market.get_server_timestamp()
+            received = time.monotonic()
+            return sent, received, wall + (received - sent) / 2, int(server_ms)
+
+        try:
+            return self._scheduler.call(PRIORITY_MARKET_READ, timed_request)
+        except KucoinAPIException as ex:
+            self.log.error(f"API error sampling server time: {ex}")
+        except Exception as ex:
+            self.log.error(f"Unexpected error sampling server time: {ex}")
+        return None
+
     def get_currency_detail(self, currency, chain=None):
         try:
             self.log.warning("get_currency_detail is depreciated. Please update your code")
-            results = self._market.get_currency_detail(currency, chain)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_currency_detail,
+                                           currency, chain, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -179,7 +263,7 @@ class KucoinMarket(BaseMarket):
 
     def get_server_status(self):
         try:
-            results = self._market.get_server_status()
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_server_status, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -190,7 +274,8 @@ class KucoinMarket(BaseMarket):
 
     def get_part_order(self, pieces, symbol):
         try:
-            results = self._market.get_part_order(pieces, symbol)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_part_order,
+                                           pieces, symbol, coalesce=True)
             # self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -201,7 +286,8 @@ class KucoinMarket(BaseMarket):
 
     def get_trade_histories(self, symbol):
         try:
-            results = self._market.get_trade_histories(symbol)
+            results = self._scheduler.call(PRIORITY_MARKET_READ, self._market.get_trade_histories,
+                                           symbol, coalesce=True)
             # self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -248,7 +334,11 @@ class KucoinMarket(BaseMarket):
         return None
 
     def ws_get_last_price(self):
-        return self._get_data()["klines"][0][2]
+        if self._last_price is not None and self._last_price.price() is not None:
+            return self._last_price.price()
+        # Until the first ticker or match arrives, fall back to the close of the current candle.
+        klines = self._get_data().get("klines")
+        return klines[0][2] if klines else None
 
     def ws_get_order_book(self):
         return self._get_data()["/market/level2:" + self.get_trade_symbol()]
@@ -0,0 +1,693 @@
+"""
+Local stand-in for the KuCoin REST and websocket APIs, for load and latency testing.
+
+    python -m exchanges.kucoin.kucoin_mock_server --port 8800 --level2-rate 200 --latency-ms 20
+
+then point the bot at it in configuration.yaml:
+
+    rest_url: "http://127.0.0.1:8800"
+
+The bullet token endpoints hand out the websocket address, so the SDK websocket client follows
+the REST url. Credentials are accepted without checking signatures.
+
+Implemented: bullet tokens, server time/status, klines, the aggregated (v3) book, ticker, trade
+histories, base fee, accounts and transferable balances, limit/market (margin) order placement,
+cancel by id, client id or all, order and fill lists, the account ledger and sub-account
+balances. The level2, level2Depth5/50, candles, match, ticker, tradeOrders and account balance
+topics are pushed at configurable rates; every REST response and websocket message can be
+delayed, level2 sequence numbers can be skipped to exercise the bot's resync path, and the
+websocket connections can be dropped to exercise reconnects.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from websockets.exceptions import ConnectionClosed
+
+log = logging.getLogger("KucoinMockServer")
+
+_CANDLE_SECONDS = {
+    "1min": 60, "3min": 3 * 60, "5min": 5 * 60, "15min": 15 * 60, "30min": 30 * 60,
+    "1hour": 60 * 60, "2hour": 2 * 60 * 60, "4hour": 4 * 60 * 60, "6hour": 6 * 60 * 60,
+    "8hour": 8 * 60 * 60, "12hour": 12 * 60 * 60, "1day": 24 * 60 * 60, "1week": 7 * 24 * 60 * 60,
+}
+
+
+class MockApiError(Exception):
+    def __init__(self, code, message, status=400):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+class KucoinMockServer:
+    """
+    In-process mock exchange: a threaded HTTP server for REST and a websockets server, sharing
+    one simulated market for a single symbol.
+
+    All market and account state lives on the server's event loop thread; REST handler threads
+    hand their requests to the loop, so no locking is needed.
+
+    Args:
+        level2_rate, match_rate, candle_rate (float): Websocket messages per second per topic.
+        latency_ms, jitter_ms (float): Delay added to every REST response and websocket message.
+        gap_rate (float): Probability that a level2 message skips sequence numbers.
+        sub_accounts (list): Names of the sub-accounts; each holds a share of the master balances.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8800, ws_port=None, symbol="BTC-USDT", price=30000.0,
+                 level2_rate=10.0, match_rate=2.0, candle_rate=1.0, latency_ms=0.0, jitter_ms=0.0,
+                 gap_rate=0.0, seed=None, balances=None, sub_accounts=("strategy-a", "strategy-b")):
+        self.host = host
+        self.port = port
+        self.ws_port = ws_port or port + 1
+        self.symbol = symbol
+        self.base, self.quote = symbol.split("-")
+        self.level2_rate = level2_rate
+        self.match_rate = match_rate
+        self.candle_rate = candle_rate
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.gap_rate = gap_rate
+        self._random = random.Random(seed)
+
+        self._tick = 0.1
+        self._price = price
+        self._sequence = 1
+        self._bids = {}
+        self._asks = {}
+        self._candles = {}
+        self._orders = {}
+        self._fills = []
+        self._ledger = []
+        self.sub_accounts = list(sub_accounts)
+        self._accounts = {}
+        for account_type in ("trade", "margin"):
+            for currency, amount in (balances or {self.base: 1.0, self.quote: 100000.0}).items():
+                self._accounts[(account_type, currency)] = {"available": float(amount), "holds": 0.0}
+        self._connections = {}
+        self.messages_sent = 0
+
+        self._loop = None
+        self._http = None
+        self._threads = []
+        self._ready = threading.Event()
+        self._reset_book()
+        self._backfill_candles(1500)
+
+    ####### SIMULATED MARKET #######
+    def _round(self, price):
+        return round(round(price / self._tick) * self._tick, 1)
+
+    def _reset_book(self):
+        self._bids = {self._round(self._price - self._tick * (i + 1)): self._size() for i in range(50)}
+        self._asks = {self._round(self._price + self._tick * (i + 1)): self._size() for i in range(50)}
+
+    def _size(self):
+        return round(self._random.uniform(0.001, 2.0), 4)
+
+    def _backfill_candles(self, count, candle_length="1min"):
+        seconds = _CANDLE_SECONDS[candle_length]
+        now = int(time.time()) // seconds * seconds
+        price = self._price
+        for index in range(count, 0, -1):
+            open_price = price
+            price = price * (1 + self._random.gauss(0, 0.0008))
+            high = max(open_price, price) * (1 + abs(self._random.gauss(0, 0.0003)))
+            low = min(open_price, price) * (1 - abs(self._random.gauss(0, 0.0003)))
+            volume = self._random.uniform(0.5, 20)
+            self._candles[now - index * seconds] = [now - index * seconds, open_price, price, high, low, volume,
+                                                   volume * price]
+        self._price = price
+        self._reset_book()
+
+    def _current_candle(self, now):
+        open_time = int(now) // 60 * 60
+        if open_time not in self._candles:
+            self._candles[open_time] = [open_time, self._price, self._price, self._price, self._price, 0.0, 0.0]
+        return self._candles[open_time]
+
+    def _next_changes(self):
+        # Move the mid price and change a few levels on each side around it.
+        self._price = max(self._tick, self._price + self._random.choice((-1, 0, 1)) * self._tick)
+        changes = {"asks": [], "bids": []}
+        for _ in range(self._random.randint(1, 4)):
+            side = self._random.choice(("asks", "bids"))
+            offset = self._random.randint(1, 50) * self._tick
+            price = self._round(self._price + offset if side == "asks" else self._price - offset)
+            size = 0.0 if self._random.random() < 0.3 else self._size()
+            self._sequence += 1
+            book = self._asks if side == "asks" else self._bids
+            if size:
+                book[price] = size
+            else:
+                book.pop(price, None)
+            changes[side].append([str(price), str(size), str(self._sequence)])
+        # Levels that crossed the new mid are gone.
+        for price in [price for price in self._bids if price >= self._price]:
+            del self._bids[price]
+        for price in [price for price in self._asks if price <= self._price]:
+            del self._asks[price]
+        return changes
+
+    ####### REST #######
+    async def handle_rest(self, method, path, params, headers):
+        await self._delay()
+        route = path.rstrip("/")
+        if route in ("/api/v1/bullet-public", "/api/v1/bullet-private"):
+            return self._bullet(route.endswith("private"))
+        if route == "/api/v1/timestamp":
+            return int(time.time() * 1000)
+        if route == "/api/v1/status":
+            return {"status": "open", "msg": "mock"}
+        if route == "/api/v1/market/candles":
+            return self._rest_candles(params)
+        if route in ("/api/v3/market/orderbook/level2", "/api/v2/market/orderbook/level2"):
+            return self._rest_book()
+        if route == "/api/v1/market/orderbook/level1":
+            return self._rest_ticker()
+        if route == "/api/v1/market/histories":
+            return self._rest_trade_histories()
+        if route == "/api/v1/base-fee":
+            return {"takerFeeRate": "0.001", "makerFeeRate": "0.001"}
+        if route == "/api/v1/accounts":
+            return self._rest_accounts(params)
+        if route == "/api/v1/accounts/transferable":
+            return self._rest_transferable(params)
+        if route in ("/api/v1/orders", "/api/v1/margin/order") and method == "POST":
+            return await self._place_order(params, "MARGIN_TRADE" if "margin" in route else "TRADE")
+        if route == "/api/v1/orders" and method == "DELETE":
+            return {"cancelledOrderIds": [await self._cancel(order) for order in list(self._orders.values())
+                                          if order["isActive"]]}
+        if route.startswith("/api/v1/orders/") and method == "DELETE":
+            return {"cancelledOrderIds": [await self._cancel(self._find_order(order_id=route.rsplit("/", 1)[1]))]}
+        if route.startswith("/api/v1/order/client-order/") and method == "DELETE":
+            order = self._find_order(client_oid=route.rsplit("/", 1)[1])
+            return {"cancelledOrderId": await self._cancel(order), "clientOid": order["clientOid"]}
+        if route.startswith("/api/v1/orders/"):
+            return self._find_order(order_id=route.rsplit("/", 1)[1])
+        if route.startswith("/api/v1/order/client-order/"):
+            return self._find_order(client_oid=route.rsplit("/", 1)[1])
+        if route in ("/api/v1/orders", "/api/v1/limit/orders"):
+            return self._page(self._filter(self._orders.values(), params), params, route == "/api/v1/orders")
+        if route == "/api/v1/sub-accounts":
+            return [self._rest_sub_account(name) for name in self.sub_accounts]
+        if route.startswith("/api/v1/sub-accounts/"):
+            return self._rest_sub_account(route.rsplit("/", 1)[1])
+        if route == "/api/v1/accounts/ledgers":
+            return self._page(self._filter(self._ledger, params), params, True)
+        if route in ("/api/v1/fills", "/api/v1/limit/fills"):
+            return self._page(self._filter(self._fills, params), params, route == "/api/v1/fills")
+        raise MockApiError("404000", f"{method} {path} is not implemented by the mock server", 404)
+
+    def _bullet(self, private):
+        return {
+            "token": uuid.uuid4().hex + ("-private" if private else ""),
+            "instanceServers": [{
+                "endpoint": f"ws://{self.host}:{self.ws_port}/endpoint",
+                # The SDK passes this as websockets' ssl argument, which must be None for ws:// URIs.
+                "encrypt": None,
+                "protocol": "websocket",
+                "pingInterval": 18000,
+                "pingTimeout": 10000,
+            }],
+        }
+
+    def _rest_candles(self, params):
+        seconds = _CANDLE_SECONDS[params.get("type", "1min")]
+        start = int(params.get("startAt") or 0)
+        end = int(params.get("endAt") or time.time())
+        buckets = {}
+        for open_time in sorted(self._candles):
+            if not start <= open_time <= end:
+                continue
+            candle = self._candles[open_time]
+            bucket = open_time // seconds * seconds
+            if bucket not in buckets:
+                buckets[bucket] = [bucket] + candle[1:]
+            else:
+                merged = buckets[bucket]
+                merged[2] = candle[2]
+                merged[3] = max(merged[3], candle[3])
+                merged[4] = min(merged[4], candle[4])
+                merged[5] += candle[5]
+                merged[6] += candle[6]
+        candles = sorted(buckets.values(), key=lambda candle: candle[0], reverse=True)[:1500]
+        return [[str(candle[0])] + [f"{value:.8f}" for value in candle[1:]] for candle in candles]
+
+    def _rest_book(self):
+        return {
+            "sequence": str(self._sequence),
+            "time": int(time.time() * 1000),
+            "bids": [[str(price), str(self._bids[price])] for price in sorted(self._bids, reverse=True)],
+            "asks": [[str(price), str(self._asks[price])] for price in sorted(self._asks)],
+        }
+
+    def _rest_ticker(self):
+        best_bid = max(self._bids) if self._bids else self._price
+        best_ask = min(self._asks) if self._asks else self._price
+        return {"sequence": str(self._sequence), "price": str(self._price), "size": "0.01",
+                "bestBid": str(best_bid), "bestBidSize": str(self._bids.get(best_bid, 0)),
+                "bestAsk": str(best_ask), "bestAskSize": str(self._asks.get(best_ask, 0)),
+                "time": int(time.time() * 1000)}
+
+    def _rest_trade_histories(self):
+        return [{"sequence": fill["tradeId"], "price": fill["price"], "size": fill["size"], "side": fill["side"],
+                 "time": fill["createdAt"] * 1000000} for fill in self._fills[-100:]]
+
+    def _account_item(self, account_type, currency):
+        account = self._accounts.setdefault((account_type, currency), {"available": 0.0, "holds": 0.0})
+        return {"id": f"{account_type}-{currency}", "currency": currency, "type": account_type,
+                "balance": f"{account['available'] + account['holds']:.8f}",
+                "available": f"{account['available']:.8f}", "holds": f"{account['holds']:.8f}"}
+
+    def _rest_sub_account(self, name):
+        if name not in self.sub_accounts:
+            raise MockApiError("400100", "sub-account not exist.")
+        # Each sub-account holds a fixed share of the master balances.
+        share = 1.0 / (2 + self.sub_accounts.index(name))
+        items = []
+        for currency in (self.base, self.quote):
+            account = self._accounts.get(("trade", currency), {"available": 0.0, "holds": 0.0})
+            items.append({"currency": currency, "balance": str((account["available"] + account["holds"]) * share),
+                          "available": str(account["available"] * share), "holds": str(account["holds"] * share),
+                          "baseCurrency": self.base, "baseCurrencyPrice": str(self._price), "baseAmount": "0"})
+        return {"subUserId": name, "subName": name, "mainAccounts": [], "tradeAccounts": items, "marginAccounts": []}
+
+    def _rest_accounts(self, params):
+        return [self._account_item(account_type, currency) for account_type, currency in sorted(self._accounts)
+                if params.get("currency") in (None, currency) and params.get("type") in (None, account_type)]
+
+    def _rest_transferable(self, params):
+        account_type = str(params.get("type", "TRADE")).lower()
+        item = self._account_item("trade" if account_type == "main" else account_type, params.get("currency"))
+        return {"currency": item["currency"], "balance": item["balance"], "available": item["available"],
+                "holds": item["holds"], "transferable": item["available"]}
+
+    @staticmethod
+    def _filter(items, params):
+        items = list(items)
+        if "status" in params:
+            active = params["status"] == "active"
+            items = [item for item in items if item.get("isActive", False) == active]
+        for name in ("symbol", "side", "tradeType", "orderId", "currency"):
+            if name in params:
+                items = [item for item in items if item.get(name) == params[name]]
+        if "startAt" in params:
+            items = [item for item in items if item["createdAt"] >= int(params["startAt"])]
+        if "endAt" in params:
+            items = [item for item in items if item["createdAt"] <= int(params["endAt"])]
+        return sorted(items, key=lambda item: item["createdAt"], reverse=True)
+
+    @staticmethod
+    def _page(items, params, paginated):
+        if not paginated:
+            return items[:1000]
+        page = int(params.get("currentPage", 1))
+        size = int(params.get("pageSize", 50))
+        return {"currentPage": page, "pageSize": size, "totalNum": len(items),
+                "totalPage": max(1, -(-len(items) // size)), "items": items[(page - 1) * size:page * size]}
+
+    def _find_order(self, order_id=None, client_oid=None):
+        for order in self._orders.values():
+            if order["id"] == order_id or (client_oid and order["clientOid"] == client_oid):
+                return order
+        raise MockApiError("400100", "order not exist.")
+
+    ####### ORDERS #######
+    async def _place_order(self, params, trade_type):
+        side = params.get("side")
+        order_type = params.get("type", "limit")
+        if side not in ("buy", "sell") or params.get("symbol") != self.symbol:
+            raise MockApiError("400100", "Invalid side or symbol.")
+        price = float(params.get("price") or 0)
+        size = float(params.get("size") or 0)
+        funds = float(params.get("funds") or 0)
+        if order_type == "limit" and (price <= 0 or size <= 0):
+            raise MockApiError("400100", "Limit orders need a price and a size.")
+        if order_type == "market":
+            price = min(self._asks) if side == "buy" and self._asks else max(self._bids) if self._bids else self._price
+            size = size or funds / price
+
+        account_type = "margin" if trade_type == "MARGIN_TRADE" else "trade"
+        currency, amount = (self.quote, price * size) if side == "buy" else (self.base, size)
+        account = self._accounts.setdefault((account_type, currency), {"available": 0.0, "holds": 0.0})
+        if account["available"] < amount - 1e-12:
+            raise MockApiError("200004", "Balance insufficient!")
+
+        order_id = uuid.uuid4().hex[:24]
+        now = int(time.time() * 1000)
+        order = {
+            "id": order_id, "symbol": self.symbol, "opType": "DEAL", "type": order_type, "side": side,
+            "price": str(price), "size": str(size), "funds": str(funds), "dealFunds": "0", "dealSize": "0",
+            "fee": "0", "feeCurrency": self.quote, "stp": "", "stop": "", "stopTriggered": False,
+            "stopPrice": "0", "timeInForce": params.get("timeInForce", "GTC"), "postOnly": False,
+            "hidden": False, "iceberg": False, "visibleSize": "0", "cancelAfter": 0, "channel": "API",
+            "clientOid": params.get("clientOid", ""), "remark": None, "tags": None, "isActive": True,
+            "cancelExist": False, "createdAt": now, "tradeType": trade_type, "accountType": account_type,
+        }
+        self._orders[order_id] = order
+        self._move_funds(order, currency, -amount, amount)
+        await self._order_event(order, "received", "new")
+
+        if order_type == "market":
+            await self._fill(order, price)
+        else:
+            await self._order_event(order, "open", "open")
+        return {"orderId": order_id}
+
+    async def _cancel(self, order):
+        if not order["isActive"]:
+            raise MockApiError("400100", "order_not_exist_or_not_allow_to_cancel")
+        order["isActive"] = False
+        order["cancelExist"] = True
+        remaining = float(order["size"]) - float(order["dealSize"])
+        if order["side"] == "buy":
+            self._move_funds(order, self.quote, remaining * float(order["price"]), -remaining * float(order["price"]))
+        else:
+            self._move_funds(order, self.base, remaining, -remaining)
+        await self._order_event(order, "canceled", "done")
+        return order["id"]
+
+    async def _fill(self, order, price):
+        size = float(order["size"]) - float(order["dealSize"])
+        funds = size * price
+        fee = funds * 0.001
+        order["dealSize"] = order["size"]
+        order["dealFunds"] = str(float(order["dealFunds"]) + funds)
+        order["fee"] = str(float(order["fee"]) + fee)
+        order["isActive"] = False
+        trade_id = uuid.uuid4().hex[:24]
+        self._fills.append({
+            "symbol": self.symbol, "tradeId": trade_id, "orderId": order["id"], "counterOrderId": uuid.uuid4().hex[:24],
+            "side": order["side"], "liquidity": "maker" if order["type"] == "limit" else "taker",
+            "forceTaker": False, "price": str(price), "size": str(size), "funds": str(funds), "fee": str(fee),
+            "feeRate": "0.001", "feeCurrency": self.quote, "stop": "", "type": order["type"],
+            "createdAt": int(time.time() * 1000), "tradeType": order["tradeType"],
+        })
+
+        for currency, amount in ((self.base, size), (self.quote, -funds - fee)):
+            if order["side"] == "sell":
+                amount = -size if currency == self.base else funds - fee
+            self._ledger.append({
+                "id": uuid.uuid4().hex[:24], "currency": currency, "amount": str(abs(amount)), "fee": "0",
+                "balance": "0", "accountType": order["accountType"].upper(), "bizType": "Exchange",
+                "direction": "in" if amount > 0 else "out", "createdAt": int(time.time() * 1000),
+                "context": {"symbol": self.symbol, "orderId": order["id"], "tradeId": trade_id},
+            })
+
+        held_price = float(order["price"])
+        if order["side"] == "buy":
+            self._move_funds(order, self.quote, size * held_price - funds - fee, -size * held_price)
+            self._move_funds(order, self.base, size, 0.0)
+        else:
+            self._move_funds(order, self.base, 0.0, -size)
+            self._move_funds(order, self.quote, funds - fee, 0.0)
+        await self._order_event(order, "match", "match", matchPrice=str(price), matchSize=str(size), tradeId=trade_id,
+                                liquidity="maker" if order["type"] == "limit" else "taker")
+        await self._order_event(order, "filled", "done")
+
+    def _move_funds(self, order, currency, available, holds):
+        account = self._accounts.setdefault((order["accountType"], currency), {"available": 0.0, "holds": 0.0})
+        account["available"] += available
+        account["holds"] += holds
+        self._publish("/account/balance", "account.balance", {
+            "accountId": f"{order['accountType']}-{currency}", "currency": currency,
+            "total": f"{account['available'] + account['holds']:.8f}", "available": f"{account['available']:.8f}",
+            "availableChange": f"{available:.8f}", "hold": f"{account['holds']:.8f}", "holdChange": f"{holds:.8f}",
+            "relationEvent": f"{order['accountType']}.hold" if holds else f"{order['accountType']}.setted",
+            "relationEventId": uuid.uuid4().hex[:24],
+            "relationContext": {"symbol": self.symbol, "orderId": order["id"]},
+            "time": str(int(time.time() * 1000)),
+        }, private=True)
+
+    async def _order_event(self, order, event_type, status, **extra):
+        now_ns = time.time_ns()
+        data = {
+            "symbol": self.symbol, "orderType": order["type"], "side": order["side"], "orderId": order["id"],
+            "type": event_type, "orderTime": order["createdAt"] * 1000000, "size": order["size"],
+            "filledSize": order["dealSize"], "price": order["price"], "clientOid": order["clientOid"],
+            "remainSize": str(float(order["size"]) - float(order["dealSize"])), "status": status, "ts": now_ns,
+        }
+        data.update(extra)
+        self._publish("/spotMarket/tradeOrders", "orderChange", data, private=True)
+
+    async def _match_resting_orders(self, trade_price):
+        matched = [order for order in self._orders.values() if order["isActive"] and order["type"] == "limit" and (
+            (order["side"] == "buy" and float(order["price"]) >= trade_price) or
+            (order["side"] == "sell" and float(order["price"]) <= trade_price))]
+        for order in matched:
+            await self._fill(order, float(order["price"]))
+
+    ####### WEBSOCKET #######
+    async def _delay(self):
+        if self.latency_ms or self.jitter_ms:
+            await asyncio.sleep(max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+    def _publish(self, topic, subject, data, private=False):
+        message = {"type": "message", "topic": topic, "subject": subject, "data": data}
+        if private:
+            message["channelType"] = "private"
+        payload = None
+        for connection, topics in list(self._connections.items()):
+            if topic in topics:
+                payload = payload or json.dumps(message)
+                self._loop.create_task(self._send(connection, payload))
+
+    async def _send(self, connection, payload):
+        await self._delay()
+        try:
+            await connection.send(payload)
+            self.messages_sent += 1
+        except Exception:
+            self._connections.pop(connection, None)
+
+    async def _handle_ws(self, connection):
+        query = parse_qs(urlparse(connection.request.path).query)
+        private = query.get("token", [""])[0].endswith("-private")
+        connect_id = query.get("connectId", [uuid.uuid4().hex])[0]
+        self._connections[connection] = set()
+        await connection.send(json.dumps({"id": connect_id, "type": "welcome"}))
+        try:
+            async for raw in connection:
+                request = json.loads(raw)
+                if request.get("type") == "ping":
+                    await connection.send(json.dumps({"id": request.get("id"), "type": "pong"}))
+                    continue
+                topic = request.get("topic", "")
+                if request.get("type") == "subscribe":
+                    if request.get("privateChannel") and not private:
+                        await connection.send(json.dumps({"id": request.get("id"), "type": "error", "code": 401,
+                                                          "data": "private channel needs a private token"}))
+                        continue
+                    self._connections[connection].add(topic)
+                elif request.get("type") == "unsubscribe":
+                    self._connections[connection].discard(topic)
+                if request.get("response"):
+                    await connection.send(json.dumps({"id": request.get("id"), "type": "ack"}))
+        except ConnectionClosed:
+            # The bot closes a connection right after unsubscribing, before the acks are sent.
+            pass
+        finally:
+            self._connections.pop(connection, None)
+
+    async def _feed(self, rate, step):
+        if rate <= 0:
+            return
+        while True:
+            await asyncio.sleep(1.0 / rate)
+            try:
+                await step()
+            except Exception as ex:
+                log.error(f"Mock feed error: {ex}")
+
+    async def _level2_step(self):
+        start = self._sequence + 1
+        if self.gap_rate and self._random.random() < self.gap_rate:
+            # Skip a few sequence numbers, as if messages were lost on the way.
+            self._sequence += self._random.randint(1, 5)
+            start = self._sequence + 1
+        changes = self._next_changes()
+        self._publish(f"/market/level2:{self.symbol}", "trade.l2update", {
+            "changes": changes, "sequenceEnd": self._sequence, "sequenceStart": start, "symbol": self.symbol,
+            "time": int(time.time() * 1000),
+        })
+        for depth in (5, 50):
+            topic = f"/spotMarket/level2Depth{depth}:{self.symbol}"
+            if not any(topic in topics for topics in self._connections.values()):
+                continue
+            bids = sorted(self._bids.items(), reverse=True)[:depth]
+            asks = sorted(self._asks.items())[:depth]
+            self._publish(topic, "level2", {
+                "bids": [[str(price), str(size)] for price, size in bids],
+                "asks": [[str(price), str(size)] for price, size in asks],
+                "timestamp": int(time.time() * 1000),
+            })
+
+    async def _match_step(self):
+        side = self._random.choice(("buy", "sell"))
+        price = min(self._asks) if side == "buy" and self._asks else max(self._bids) if self._bids else self._price
+        size = self._size()
+        now = time.time()
+        candle = self._current_candle(now)
+        candle[2] = price
+        candle[3] = max(candle[3], price)
+        candle[4] = min(candle[4], price)
+        candle[5] += size
+        candle[6] += size * price
+        self._sequence += 1
+        self._publish(f"/market/match:{self.symbol}", "trade.l3match", {
+            "sequence": str(self._sequence), "type": "match", "symbol": self.symbol, "side": side,
+            "price": str(price), "size": str(size), "tradeId": uuid.uuid4().hex[:24],
+            "takerOrderId": uuid.uuid4().hex[:24], "makerOrderId": uuid.uuid4().hex[:24],
+            "time": str(time.time_ns()),
+        })
+        self._publish(f"/market/ticker:{self.symbol}", "trade.ticker",
+                      dict(self._rest_ticker(), price=str(price), size=str(size)))
+        await self._match_resting_orders(price)
+
+    async def _candle_step(self):
+        now = time.time()
+        candle = self._current_candle(now)
+        candle[2] = self._price
+        candle[3] = max(candle[3], self._price)
+        candle[4] = min(candle[4], self._price)
+        for topic in {topic for topics in self._connections.values() for topic in topics
+                      if topic.startswith(f"/market/candles:{self.symbol}_")}:
+            candle_length = topic.rsplit("_", 1)[1]
+            seconds = _CANDLE_SECONDS.get(candle_length, 60)
+            open_time = candle[0] // seconds * seconds
+            candles = [self._candles[time_] for time_ in sorted(self._candles)
+                       if open_time <= time_ < open_time + seconds]
+            merged = [open_time, candles[0][1], candles[-1][2], max(c[3] for c in candles),
+                      min(c[4] for c in candles), sum(c[5] for c in candles), sum(c[6] for c in candles)]
+            self._publish(topic, "trade.candles.update", {
+                "symbol": self.symbol, "candles": [str(merged[0])] + [f"{value:.8f}" for value in merged[1:]],
+                "time": time.time_ns(),
+            })
+
+    ####### LIFECYCLE #######
+    def start(self):
+        """
+        Starts the servers in background threads and returns once they accept connections.
+        """
+        thread = threading.Thread(target=self._run_loop, name="kucoin-mock-loop", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        self._ready.wait()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                url = urlparse(self.path)
+                params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    params.update(json.loads(self.rfile.read(length) or b"{}"))
+                try:
+                    data = asyncio.run_coroutine_threadsafe(
+                        server.handle_rest(self.command, url.path, params, dict(self.headers)), server._loop).result()
+                    status, body = 200, {"code": "200000", "data": data}
+                except MockApiError as ex:
+                    status, body = ex.status, {"code": ex.code, "msg": str(ex)}
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_DELETE = _handle
+
+            def log_message(self, format, *args):
+                log.debug(format, *args)
+
+        self._http = ThreadingHTTPServer((self.host, self.port), Handler)
+        thread = threading.Thread(target=self._http.serve_forever, name="kucoin-mock-rest", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        log.info("Mock KuCoin REST on http://%s:%s, websocket on ws://%s:%s", self.host, self.port, self.host,
+                 self.ws_port)
+        return self
+
+    def _run_loop(self):
+        from websockets.asyncio.server import serve
+
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        async def main():
+            async with serve(self._handle_ws, self.host, self.ws_port):
+                self._ready.set()
+                await asyncio.gather(
+                    self._feed(self.level2_rate, self._level2_step),
+                    self._feed(self.match_rate, self._match_step),
+                    self._feed(self.candle_rate, self._candle_step),
+                    self._stopped.wait(),
+                )
+
+        self._stopped = asyncio.Event()
+        self._main = self._loop.create_task(main())
+        try:
+            self._loop.run_until_complete(self._main)
+        except asyncio.CancelledError:
+            pass
+
+    def drop_connections(self):
+        """
+        Closes every websocket connection from the server side, as a network failure would.
+        """
+        async def close():
+            for connection in list(self._connections):
+                await connection.close()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result(timeout=5)
+
+    def stop(self):
+        if self._http is not None:
+            self._http.shutdown()
+            self._http.server_close()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._main.cancel)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local KuCoin REST and websocket stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800, help="REST port; the websocket uses port + 1.")
+    parser.add_argument("--symbol", default="BTC-USDT")
+    parser.add_argument("--price", type=float, default=30000.0, help="Starting price.")
+    parser.add_argument("--level2-rate", type=float, default=10.0, help="Level2 messages per second.")
+    parser.add_argument("--match-rate", type=float, default=2.0, help="Trades per second.")
+    parser.add_argument("--candle-rate", type=float, default=1.0, help="Candle updates per second.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response and message.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- variation of the delay.")
+    parser.add_argument("--gap-rate", type=float, default=0.0, help="Probability a level2 message skips sequences.")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    server = KucoinMockServer(args.host, args.port, symbol=args.symbol, price=args.price,
+                              level2_rate=args.level2_rate, match_rate=args.match_rate,
+                              candle_rate=args.candle_rate, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                              gap_rate=args.gap_rate, seed=args.seed).start()
+    try:
+        while True:
+            time.sleep(60)
+            log.info("%s websocket messages sent", server.messages_sent)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+from exchanges.kucoin.kucoin_scheduler import PRIORITY_ACCOUNT_READ
+
+
+class KucoinPaginator:
+    """
+    Reads every page of a currentPage/totalPage REST endpoint through the request scheduler.
+
+    The first page is requested on its own to learn totalPage; the remaining pages are then kept
+    `concurrency` at a time in the scheduler's queue, so they go out as fast as the shared rate
+    limit allows without crowding out other reads or outliving the read deadline. Pages are
+    handed to on_page as they arrive, in whatever order they complete, instead of being
+    collected first.
+
+    Endpoints list the newest records first, so records created during a fetch can shift older
+    ones onto the next page; those appear twice, never not at all, and the stores deduplicate
+    them by id.
+    """
+
+    def __init__(self, scheduler, priority=PRIORITY_ACCOUNT_READ, page_size=500, concurrency=4, max_pages=None):
+        self._scheduler = scheduler
+        self._priority = priority
+        self._page_size = page_size
+        self._concurrency = concurrency
+        self._max_pages = max_pages
+        self._lock = threading.Lock()
+        self._stats = collections.defaultdict(lambda: {"fetches": 0, "pages": 0, "items": 0, "last_seconds": None})
+
+    def fetch(self, fn, *args, on_page=None, **kwargs):
+        """
+        Requests every page of fn(*args, **kwargs).
+
+        Args:
+            fn (callable): An SDK method taking currentPage and pageSize.
+            on_page (callable): Optional; called as on_page(page, items) from the calling thread as
+                each page arrives. Without it, the items of all pages are returned.
+
+        Returns:
+            dict: totalNum, totalPage, the number of pages and items read, the seconds it took, and
+            "items" (None when on_page was given).
+        """
+        started = time.monotonic()
+        kwargs.setdefault("pageSize", self._page_size)
+
+        collected = [] if on_page is None else None
+        counts = {"pages": 0, "items": 0}
+
+        def handle(page, results):
+            items = (results or {}).get("items") or []
+            counts["pages"] += 1
+            counts["items"] += len(items)
+            if on_page is not None:
+                on_page(page, items)
+            else:
+                collected.extend(items)
+
+        first = self._scheduler.call(self._priority, fn, *args, currentPage=1, **kwargs)
+        total_pages = int((first or {}).get("totalPage") or 1)
+        if self._max_pages is not None:
+            total_pages = min(total_pages, self._max_pages)
+        handle(1, first)
+
+        pending = {}
+        next_page = 2
+        while next_page <= total_pages or pending:
+            while next_page <= total_pages and len(pending) < self._concurrency:
+                future = self._scheduler.submit(self._priority, fn, *args, currentPage=next_page, **kwargs)
+                pending[future] = next_page
+                next_page += 1
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                handle(pending.pop(future), future.result())
+
+        seconds = time.monotonic() - started
+        with self._lock:
+            stats = self._stats[getattr(fn, "__name__", repr(fn))]
+            stats["fetches"] += 1
+            stats["pages"] += counts["pages"]
+            stats["items"] += counts["items"]
+            stats["last_seconds"] = round(seconds, 3)
+        return {
+            "totalNum": (first or {}).get("totalNum"),
+            "totalPage": total_pages,
+            "pages": counts["pages"],
+            "count": counts["items"],
+            "seconds": seconds,
+            "items": collected,
+        }
+
+    def stats(self):
+        """
+        Returns fetches, pages, items and the duration of the last fetch per SDK method.
+        """
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
@@ -0,0 +1,140 @@
+import collections
+import logging
+import time
+
+from metrics import percentiles
+
+log = logging.getLogger("KucoinLastPrice")
+
+
+class KucoinLastPrice:
+    """
+    The last traded price, taken from whichever of /market/ticker and /market/match is newest.
+
+    Both topics carry the trade sequence number, so an update is only accepted when its sequence
+    is higher than the one already held; a ticker that arrives after the match it summarizes is
+    ignored. Staleness is measured from when the update was received, on the monotonic clock.
+    """
+
+    def __init__(self, on_change=None):
+        self._price = None
+        self._sequence = -1
+        self._source = None
+        self._exchange_time_ms = None
+        self._received = None
+        self._on_change = on_change
+        self._updates = {"ticker": 0, "match": 0, "stale": 0}
+        self._decision_latencies = collections.deque(maxlen=1000)
+
+    def set_on_change(self, callback):
+        """
+        Registers callback(price, previous_price), called when an accepted update changes the price.
+        """
+        self._on_change = callback
+
+    def update(self, data, source):
+        """
+        Applies a ticker or match message body.
+
+        Args:
+            data (dict): The "data" field of the websocket message.
+            source (str): "ticker" or "match".
+
+        Returns:
+            bool: True if the update was newer than the price held.
+        """
+        try:
+            sequence = int(data["sequence"])
+            price = float(data["price"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        if sequence <= self._sequence:
+            self._updates["stale"] += 1
+            return False
+
+        previous = self._price
+        self._price = price
+        self._sequence = sequence
+        self._source = source
+        self._exchange_time_ms = _to_ms(data.get("time"))
+        self._received = time.monotonic()
+        self._updates[source] += 1
+        if self._on_change is not None and price != previous:
+            try:
+                self._on_change(price, previous)
+            except Exception as ex:
+                log.error(f"Last price callback failed: {ex}")
+        return True
+
+    def restore(self, price, sequence, exchange_time_ms=None):
+        """
+        Sets the price from a checkpoint. Its staleness is unknown until the next live update,
+        which is only accepted if its sequence is higher.
+        """
+        self._price = price
+        self._sequence = sequence
+        self._source = "checkpoint"
+        self._exchange_time_ms = exchange_time_ms
+
+    def price(self):
+        return self._price
+
+    def sequence(self):
+        return self._sequence
+
+    def exchange_time_ms(self):
+        return self._exchange_time_ms
+
+    def staleness(self):
+        """
+        Seconds since the price was last updated, or None before the first update.
+        """
+        if self._received is None:
+            return None
+        return time.monotonic() - self._received
+
+    def decision(self):
+        """
+        Returns the price for a trading decision and records how old it was at that point.
+        """
+        staleness = self.staleness()
+        if staleness is not None:
+            self._decision_latencies.append(staleness)
+        return self._price
+
+    def stats(self):
+        """
+        Returns the current price, its source and age, update counts and the decision-to-price
+        latency in milliseconds.
+        """
+        decision = percentiles(self._decision_latencies)
+        staleness = self.staleness()
+        return {
+            "price": self._price,
+            "sequence": self._sequence,
+            "source": self._source,
+            "exchange_time_ms": self._exchange_time_ms,
+            "staleness_ms": round(staleness * 1000, 1) if staleness is not None else None,
+            "updates": dict(self._updates),
+            "decisions": decision["count"],
+            "p50_decision_ms": decision["p50"],
+            "p99_decision_ms": decision["p99"],
+            "max_decision_ms": decision["max"],
+        }
+
+    def report_lines(self):
+        stats = self.stats()
+        if stats["price"] is None:
+            return ["Last price: unavailable"]
+        return [f"Last price: {stats['price']}",
+                f"Last price age: {stats['staleness_ms']}ms, decision latency p50 {stats['p50_decision_ms']}ms, "
+                f"p99 {stats['p99_decision_ms']}ms"]
+
+
+def _to_ms(stamp):
+    # Tickers are stamped in milliseconds and matches in nanoseconds.
+    try:
+        stamp = int(stamp)
+    except (TypeError, ValueError):
+        return None
+    return stamp // 1000000 if stamp > 10 ** 17 else stamp
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+log = logging.getLogger("KucoinReference")
+
+
+class KucoinReferenceData:
+    """
+    Cache for slow-changing reference data (currencies, symbols, markets, fees, fiat prices).
+
+    Every entry has a time-to-live per endpoint. A fresh entry is served from memory, a stale
+    entry is still served while a background thread refreshes it, and only a missing entry blocks
+    on REST. Entries are persisted to disk so a restart does not refetch static data.
+    """
+
+    _DEFAULT_TTLS = {
+        "currencies": 24 * 60 * 60,
+        "currency_detail_v2": 24 * 60 * 60,
+        "markets": 24 * 60 * 60,
+        "symbols": 60 * 60,
+        "fees": 60 * 60,
+        "fiat_price": 60,
+    }
+
+    def __init__(self, path=None, ttls=None):
+        self._path = path
+        self._ttls = dict(self._DEFAULT_TTLS)
+        self._ttls.update(ttls or {})
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        # Held while writing the file, so saves from refresh threads do not interleave.
+        self._save_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self._path or not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, "r") as file:
+                self._entries = json.load(file)
+            log.info("Loaded %s reference entries from %s", len(self._entries), self._path)
+        except (OSError, ValueError) as ex:
+            log.warning(f"Ignoring unreadable reference cache {self._path}: {ex}")
+            self._entries = {}
+
+    def save(self):
+        if not self._path:
+            return
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._save_lock:
+            # Copied under the save lock, so a save never replaces the file with older entries.
+            with self._lock:
+                entries = dict(self._entries)
+            # Write to a temporary file of its own first so a crash never leaves a truncated cache behind.
+            with tempfile.NamedTemporaryFile("w", dir=directory or ".", prefix=os.path.basename(self._path),
+                                             suffix=".tmp", delete=False) as file:
+                tmp_path = file.name
+                try:
+                    json.dump(entries, file)
+                except Exception:
+                    file.close()
+                    os.unlink(tmp_path)
+                    raise
+            os.replace(tmp_path, self._path)
+
+    def _ttl(self, key):
+        return self._ttls.get(key.split(":", 1)[0], 60)
+
+    def get(self, key, fetch):
+        """
+        Returns the data cached under key, calling fetch() when it is missing.
+
+        Args:
+            key (str): Cache key; the part before the first ':' names the endpoint and its TTL.
+            fetch (callable): Performs the REST request and returns the data, or None on failure.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return self._refresh(key, fetch)
+
+        if time.time() - entry["fetched_at"] > self._ttl(key):
+            with self._lock:
+                start_refresh = key not in self._refreshing
+                self._refreshing.add(key)
+            if start_refresh:
+                threading.Thread(target=self._refresh, args=(key, fetch), daemon=True).start()
+        return entry["data"]
+
+    def _refresh(self, key, fetch):
+        try:
+            data = fetch()
+            if data is not None:
+                self.put(key, data)
+            return data
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def put(self, key, data):
+        with self._lock:
+            self._entries[key] = {"data": data, "fetched_at": time.time()}
+        try:
+            self.save()
+        except OSError as ex:
+            log.warning(f"Could not persist reference cache to {self._path}: {ex}")
+
+    def peek(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry["data"] if entry else None
+
+    def age(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return time.time() - entry["fetched_at"] if entry else None
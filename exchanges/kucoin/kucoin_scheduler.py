@@ -0,0 +1,197 @@
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import percentiles
+
+log = logging.getLogger("KucoinScheduler")
+
+PRIORITY_CANCEL = 0
+PRIORITY_PLACE = 1
+PRIORITY_ACCOUNT_READ = 2
+PRIORITY_MARKET_READ = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_CANCEL: "cancel",
+    PRIORITY_PLACE: "place",
+    PRIORITY_ACCOUNT_READ: "account_read",
+    PRIORITY_MARKET_READ: "market_read",
+}
+
+
+class StaleRequestError(Exception):
+    """Raised for a read that was still queued when its deadline passed."""
+
+
+class KucoinRequestScheduler:
+    """
+    Central queue for every REST request made by the KuCoin wrappers.
+
+    Requests are dispatched by a small pool of worker threads in priority order
+    (cancel > place > account read > market read) under a shared token bucket rate limit, so a
+    cancel never waits behind a burst of reads. Identical reads that are already queued or in
+    flight are coalesced onto the same future, and reads still queued past their deadline are
+    dropped instead of being sent.
+    """
+
+    def __init__(self, requests_per_second=20, workers=4, read_deadline=10.0):
+        self._rate = float(requests_per_second)
+        self._tokens = self._rate
+        self._last_refill = time.monotonic()
+        self._read_deadline = read_deadline
+        self._workers = workers
+        self._threads = []
+        self._queue = []
+        self._counter = itertools.count()
+        self._inflight = {}
+        self._cond = threading.Condition()
+        self._running = True
+        self._stats = {
+            priority: {
+                "submitted": 0, "dispatched": 0, "coalesced": 0, "dropped": 0,
+                "total_wait": 0.0, "max_wait": 0.0, "recent_waits": collections.deque(maxlen=1000),
+            } for priority in PRIORITY_NAMES
+        }
+
+    def _start_workers(self):
+        while len(self._threads) < self._workers:
+            thread = threading.Thread(target=self._work, name=f"kucoin-rest-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, priority, fn, *args, coalesce=False, deadline=None, **kwargs):
+        """
+        Queues fn(*args, **kwargs) and returns a Future for its result.
+
+        Args:
+            priority (int): One of the PRIORITY_* classes.
+            coalesce (bool): Share the result with an identical request already queued or in flight.
+            deadline (float): Seconds the request may wait in the queue. Reads default to
+                read_deadline; cancels and placements never expire.
+        """
+        key = None
+        if coalesce:
+            # Bound methods of different clients (e.g. other credentials) must not be merged.
+            key = (id(getattr(fn, "__self__", None)), getattr(fn, "__qualname__", repr(fn)), args,
+                   tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                key = None
+        if deadline is None and priority >= PRIORITY_ACCOUNT_READ:
+            deadline = self._read_deadline
+
+        with self._cond:
+            stats = self._stats[priority]
+            stats["submitted"] += 1
+            if key is not None and key in self._inflight:
+                stats["coalesced"] += 1
+                return self._inflight[key]
+
+            future = Future()
+            now = time.monotonic()
+            expires = now + deadline if deadline is not None else None
+            heapq.heappush(self._queue, (priority, next(self._counter), now, expires, key, future, fn, args, kwargs))
+            if key is not None:
+                self._inflight[key] = future
+            self._start_workers()
+            self._cond.notify()
+        return future
+
+    def call(self, priority, fn, *args, coalesce=False, deadline=None, **kwargs):
+        """
+        Submits a request and blocks until its result is available.
+        """
+        return self.submit(priority, fn, *args, coalesce=coalesce, deadline=deadline, **kwargs).result()
+
+    def _take_token(self):
+        # Returns 0 when a token was taken, or the seconds until the next one is available.
+        now = time.monotonic()
+        self._tokens = min(self._rate, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self._rate
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._running:
+                    return
+
+                # Wait for rate limit budget before choosing, so a late cancel still goes first.
+                wait = self._take_token()
+                if wait:
+                    self._cond.wait(wait)
+                    continue
+
+                priority, _, queued_at, expires, key, future, fn, args, kwargs = heapq.heappop(self._queue)
+                now = time.monotonic()
+                stats = self._stats[priority]
+                if expires is not None and now > expires:
+                    stats["dropped"] += 1
+                    log.warning("Dropping stale %s request %s", PRIORITY_NAMES[priority], getattr(fn, "__name__", fn))
+                    self._tokens += 1
+                    self._inflight.pop(key, None)
+                    future.set_exception(StaleRequestError(
+                        f"{PRIORITY_NAMES[priority]} request dropped after {now - queued_at:.3f}s in queue"))
+                    continue
+
+                waited = now - queued_at
+                stats["dispatched"] += 1
+                stats["total_wait"] += waited
+                stats["max_wait"] = max(stats["max_wait"], waited)
+                stats["recent_waits"].append(waited)
+
+            try:
+                results = fn(*args, **kwargs)
+            except Exception as ex:
+                self._finish(key)
+                future.set_exception(ex)
+            else:
+                self._finish(key)
+                future.set_result(results)
+
+    def _finish(self, key):
+        # Forget the request before its waiters wake, so a new identical read is sent again.
+        if key is not None:
+            with self._cond:
+                self._inflight.pop(key, None)
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self):
+        """
+        Returns queue wait statistics per priority class, in seconds.
+        """
+        result = {}
+        with self._cond:
+            for priority, stats in self._stats.items():
+                waits = percentiles(stats["recent_waits"], points=(99,), scale=1.0, digits=None)
+                result[PRIORITY_NAMES[priority]] = {
+                    "submitted": stats["submitted"],
+                    "dispatched": stats["dispatched"],
+                    "coalesced": stats["coalesced"],
+                    "dropped": stats["dropped"],
+                    "mean_wait": stats["total_wait"] / stats["dispatched"] if stats["dispatched"] else 0.0,
+                    "p99_wait": waits["p99"],
+                    "max_wait": stats["max_wait"],
+                }
+        return result
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            for item in self._queue:
+                item[5].cancel()
+            self._queue = []
+            self._cond.notify_all()
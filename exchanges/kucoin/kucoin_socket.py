@@ -0,0 +1,128 @@
+import asyncio
+import logging
+
+from kucoin.ws_client import KucoinWsClient
+
+log = logging.getLogger("KucoinSocket")
+
+
+async def _ignore_message(message):
+    pass
+
+
+class KucoinSocket:
+    """
+    One websocket connection of the SDK, with the lifecycle its KucoinWsClient does not offer.
+
+    KucoinWsClient has no close() and reconnects on its own inside ConnectWebsocket.run_forever(),
+    re-subscribing its topics without telling the caller. Every use of the SDK's internals (the
+    connection, its socket, its callback and the tasks it starts) is kept in this class, and
+    requirements.txt pins the SDK release they were written against.
+
+    Every new connection opens with a welcome message. Any welcome after the first one means the
+    SDK reconnected, so messages may have been missed while it was down; on_reconnect is then
+    called on the event loop.
+
+    Args:
+        token (WsToken): The client that hands out the bullet tokens.
+        callback (coroutine function): Called with every message that carries data.
+        private (bool): Whether the connection is opened with a private token.
+        on_reconnect (callable): Optional; called after the SDK reconnected.
+    """
+
+    # Seconds close() waits for the connection's tasks to end.
+    CLOSE_TIMEOUT = 10
+
+    def __init__(self, token, callback, private=False, on_reconnect=None):
+        self._token = token
+        self._callback = callback
+        self._private = private
+        self._on_reconnect = on_reconnect
+        self._client = None
+        self._welcomes = 0
+        self.reconnects = 0
+
+    async def open(self):
+        """
+        Creates the connection; the SDK connects in the background and subscribe() waits for it.
+        """
+        self._client = await KucoinWsClient.create(None, client=self._token, callback=self._callback,
+                                                   private=self._private)
+        connection = self._client._conn
+        receive = connection._callback
+
+        async def on_message(message):
+            if message.get("type") == "welcome":
+                self._welcomed()
+            await receive(message)
+
+        # The client's own callback drops messages without data, such as the welcome.
+        connection._callback = on_message
+        return self
+
+    def _welcomed(self):
+        self._welcomes += 1
+        if self._welcomes == 1:
+            return
+        self.reconnects += 1
+        log.warning("%s websocket reconnected (%s reconnects)", "Private" if self._private else "Public",
+                    self.reconnects)
+        if self._on_reconnect is not None:
+            self._on_reconnect()
+
+    def topics(self):
+        return list(self._client._conn.topics) if self._client is not None else []
+
+    async def subscribe(self, topic):
+        await self._client.subscribe(topic)
+
+    async def unsubscribe(self, topic):
+        await self._client.unsubscribe(topic)
+
+    async def close(self):
+        """
+        Stops the connection so it cannot deliver messages alongside a new one, and ends its tasks.
+
+        The callback is silenced and the topics are forgotten, so a reconnect in progress neither
+        delivers nor re-subscribes anything. The reconnect loop is cancelled and the socket is
+        closed, which ends the receive task (it ignores cancellation). Returns False if the tasks
+        did not end within CLOSE_TIMEOUT seconds.
+        """
+        if self._client is None:
+            return True
+        client, self._client = self._client, None
+        connection = client._conn
+        client._callback = _ignore_message
+        connection._callback = _ignore_message
+        connection.topics.clear()
+        tasks = self._connection_tasks(connection)
+        for task in tasks:
+            if task.get_coro().__name__ != "_run":
+                task.cancel()
+        if connection._socket is not None:
+            try:
+                await connection._socket.close()
+            except Exception as ex:
+                log.warning(f"Error closing websocket: {ex}")
+        if not tasks:
+            return True
+        # asyncio.wait() returns at the timeout even if a task ignores cancellation; wait_for() would not.
+        done, pending = await asyncio.wait(tasks, timeout=self.CLOSE_TIMEOUT)
+        for task in done:
+            # Collects the tasks' exceptions (the closed socket), so they are not reported as unhandled.
+            if not task.cancelled():
+                task.exception()
+        if pending:
+            log.warning("Websocket tasks did not end within %ss: %s", self.CLOSE_TIMEOUT, list(pending))
+            return False
+        return True
+
+    @staticmethod
+    def _connection_tasks(connection):
+        # The SDK keeps no handle on the tasks of a ConnectWebsocket; they are found by their `self`.
+        tasks = []
+        for task in asyncio.all_tasks():
+            frame = getattr(task.get_coro(), "cr_frame", None)
+            if frame is not None and frame.f_locals.get("self") is connection:
+                tasks.append(task)
+        return tasks
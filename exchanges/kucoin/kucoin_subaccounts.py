@@ -0,0 +1,197 @@
+import asyncio
+import collections
+import time
+
+from exchanges.kucoin.kucoin_trade import KucoinTrade
+from metrics import percentiles
+
+_ACCOUNT_LISTS = {"mainAccounts": "main", "tradeAccounts": "trade", "marginAccounts": "margin"}
+# What a KucoinTrade for a sub-account takes from the bot's configuration; the keys are its own.
+_TRADE_CONFIG_KEYS = ["base_currency", "quote_currency", "asset", "candle_length", "account_type", "sandbox",
+                      "rest_url"]
+
+
+def _balances_of(sub_account):
+    balances = {}
+    for key, account_type in _ACCOUNT_LISTS.items():
+        for item in sub_account.get(key) or []:
+            balances.setdefault(account_type, {})[item["currency"]] = {
+                "available": float(item.get("available", 0)),
+                "hold": float(item.get("holds", 0)),
+                "total": float(item.get("balance", 0)),
+            }
+    return balances
+
+
+class KucoinSubAccounts:
+    """
+    A merged view of the balances and open orders of every sub-account, with their exposure.
+
+    Sub-accounts are discovered with the master key (GET /api/v1/sub-accounts, which also returns
+    every balance) every `discover_every` refreshes. In between, each sub-account's balances are
+    fetched on their own, and the open orders of the trade symbol for every sub-account with an API
+    key in sub_account_keys; all of these requests are in flight at once, under the rate limit of
+    the shared scheduler. A sub-account's entry is replaced as soon as its own requests return, so
+    readers never wait for a whole cycle; if they fail, its last data is kept and marked stale.
+
+    Exposure is per sub-account and in total: the base and quote balances over all account types,
+    the funds and size held by open buy and sell orders, and the value in the quote currency at
+    the last price.
+    """
+
+    def __init__(self, config, account, scheduler, price_function=None, discover_every=10, samples=100):
+        self._config = config
+        self._account = account
+        self._scheduler = scheduler
+        self._price = price_function
+        self._base = config["base_currency"]
+        self._quote = config["quote_currency"]
+        self._discover_every = discover_every
+        self._names = {}
+        self._entries = {}
+        self._traders = {}
+        self._keys = config.get("sub_account_keys") or {}
+        self._refreshes = 0
+        self._refreshing = False
+        self._errors = collections.Counter()
+        self._durations = collections.deque(maxlen=samples)
+        self._last_duration = None
+
+    def _trader(self, name):
+        # Open orders can only be listed with the sub-account's own API key.
+        if name not in self._traders:
+            keys = self._keys[name]
+            incoming = []
+            config = {key: self._config.get(key) for key in _TRADE_CONFIG_KEYS}
+            config.update(api_key=keys["api_key"], api_secret=keys["api_secret"],
+                          api_passphrase=keys["api_passphrase"])
+            trader = KucoinTrade(config, lambda: None, lambda message: incoming.extend(message["data"]),
+                                 scheduler=self._scheduler)
+            self._traders[name] = (trader, incoming)
+        return self._traders[name]
+
+    async def refresh(self):
+        """
+        Runs one refresh cycle; a cycle still running is not overlapped.
+        """
+        if self._refreshing:
+            return
+        self._refreshing = True
+        started = time.monotonic()
+        try:
+            discovered = set()
+            if self._refreshes % self._discover_every == 0 or not self._names:
+                sub_accounts = await asyncio.to_thread(self._account.get_sub_accounts)
+                if sub_accounts is None:
+                    self._errors["discover"] += 1
+                else:
+                    self._names = {sub["subUserId"]: sub["subName"] for sub in sub_accounts}
+                    for sub in sub_accounts:
+                        self._entry(sub["subUserId"])["balances"] = _balances_of(sub)
+                        self._entry(sub["subUserId"])["balances_at"] = time.time()
+                        discovered.add(sub["subUserId"])
+                    for sub_user_id in set(self._entries) - set(self._names):
+                        del self._entries[sub_user_id]
+            await asyncio.gather(*(self._refresh_one(sub_user_id, sub_user_id not in discovered)
+                                   for sub_user_id in list(self._names)))
+        finally:
+            self._refreshing = False
+            self._refreshes += 1
+            self._last_duration = time.monotonic() - started
+            self._durations.append(self._last_duration)
+
+    def _entry(self, sub_user_id):
+        return self._entries.setdefault(sub_user_id, {
+            "balances": {}, "balances_at": None, "orders": {}, "orders_at": None, "stale": False, "fetch_ms": None,
+        })
+
+    async def _refresh_one(self, sub_user_id, fetch_balances):
+        started = time.monotonic()
+        name = self._names[sub_user_id]
+        requests = []
+        if fetch_balances:
+            requests.append(asyncio.to_thread(self._account.get_sub_account, sub_user_id))
+        if name in self._keys:
+            trader, incoming = self._trader(name)
+            incoming.clear()
+            requests.append(asyncio.to_thread(trader.get_order_history, status="active"))
+        if not requests:
+            return
+        results = await asyncio.gather(*requests)
+
+        entry = self._entry(sub_user_id)
+        entry["stale"] = any(result is None for result in results)
+        if fetch_balances:
+            if results[0] is None:
+                self._errors[name] += 1
+            else:
+                entry["balances"] = _balances_of(results[0])
+                entry["balances_at"] = time.time()
+        if name in self._keys:
+            if results[-1] is None:
+                self._errors[name] += 1
+            else:
+                entry["orders"] = {order["id"]: order for order in incoming if order.get("isActive", True)}
+                entry["orders_at"] = time.time()
+        entry["fetch_ms"] = round((time.monotonic() - started) * 1000, 2)
+
+    def _exposure(self, entry, price):
+        base = sum(currencies.get(self._base, {}).get("total", 0.0) for currencies in entry["balances"].values())
+        quote = sum(currencies.get(self._quote, {}).get("total", 0.0) for currencies in entry["balances"].values())
+        open_buy = 0.0
+        open_sell = 0.0
+        for order in entry["orders"].values():
+            remaining = float(order.get("size") or 0) - float(order.get("dealSize") or 0)
+            if order.get("side") == "buy":
+                open_buy += remaining * float(order.get("price") or 0)
+            else:
+                open_sell += remaining
+        return {
+            "base": base,
+            "quote": quote,
+            "open_buy_funds": open_buy,
+            "open_sell_size": open_sell,
+            "value": base * price + quote if price is not None else None,
+        }
+
+    def exposure(self):
+        """
+        Returns {"sub_accounts": {subName: exposure}, "total": exposure}, in the base and quote
+        currencies of the trade symbol.
+        """
+        price = self._price() if self._price is not None else None
+        per_account = {self._names.get(sub_user_id, sub_user_id): self._exposure(entry, price)
+                       for sub_user_id, entry in self._entries.items()}
+        total = collections.Counter()
+        for values in per_account.values():
+            for key, value in values.items():
+                if value is not None:
+                    total[key] += value
+        if price is None:
+            total["value"] = None
+        return {"sub_accounts": per_account, "total": dict(total)}
+
+    def view(self):
+        """
+        Returns the merged balances and open orders per sub-account name.
+        """
+        return {self._names.get(sub_user_id, sub_user_id): entry for sub_user_id, entry in self._entries.items()}
+
+    def stats(self):
+        """
+        Returns the number of sub-accounts, refresh cycles and their duration (last, p50, p99 in ms),
+        the fetch time of each sub-account, the stale ones and errors.
+        """
+        durations = percentiles(self._durations)
+        return {
+            "sub_accounts": len(self._names),
+            "refreshes": self._refreshes,
+            "last_ms": round(self._last_duration * 1000, 2) if self._last_duration is not None else None,
+            "p50_ms": durations["p50"],
+            "p99_ms": durations["p99"],
+            "fetch_ms": {self._names.get(sub_user_id, sub_user_id): entry["fetch_ms"]
+                         for sub_user_id, entry in self._entries.items()},
+            "stale": [self._names.get(sub_user_id, sub_user_id)
+                      for sub_user_id, entry in self._entries.items() if entry["stale"]],
+            "errors": dict(self._errors),
+        }
@@ -1,43 +1,125 @@
-from datetime import timezone
-
 from base_asset import BaseAsset
 import logging
-import pandas as pd
-import pandas_ta as ta
+
+from exchanges.kucoin.kucoin_export import load_numpy
+
+_pd = None
+
+
+def load_pandas():
+    """
+    Imports pandas and pandas_ta on first use and returns the pandas module.
+
+    pandas_ta is imported for its side effect of registering the DataFrame.ta accessor.
+    """
+    global _pd
+    if _pd is None:
+        import pandas as pd
+        import pandas_ta  # noqa: F401
+
+        pd.set_option('display.max_rows', None)
+        pd.set_option('display.max_columns', None)
+        pd.set_option('display.width', None)
+        pd.set_option('display.max_colwidth', None)
+        _pd = pd
+    return _pd
+
+
+def bollinger_bands(close, period, levels):
+    """
+    Returns an (n, n_levels, 2) array of [upper, lower] bands for a 1-d array of close prices.
+
+    The rolling mean and population std are computed once and broadcast against the levels; rows
+    before the first full period are NaN.
+    """
+    np = load_numpy()
+    bands = np.full((len(close), len(levels), 2), np.nan)
+    if len(close) >= period:
+        windows = np.lib.stride_tricks.sliding_window_view(close, period)
+        mean = windows.mean(axis=1)[:, None]
+        offsets = windows.std(axis=1)[:, None] * np.asarray(levels, dtype="f8")[None, :]
+        bands[period - 1:, :, 0] = mean + offsets
+        bands[period - 1:, :, 1] = mean - offsets
+    return bands
+
 
 class KCTa(BaseAsset):
-    def __init__(self, config=None, get_data_function=None):
+    def __init__(self, config=None, get_data_function=None, get_candles_function=None,
+                 get_candle_version_function=None):
         super().__init__(config)
 
         if config is None:
             SystemExit(1)
         self.log = logging.getLogger("KCTa")
-        self.log.setLevel(config["log_level"])
         self._candle_delta = config["candle_length"]
         self._sma_period = config["sma_period"]
         self._exchange = f"Kucoin {self.get_trade_symbol()} {self._sma_period} {self._candle_delta}"
         if callable(get_data_function):
             self._get_data = get_data_function
-
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
+        # Columnar candles (see KucoinExport.candles) spare a deep copy of the whole cache.
+        self._get_candles = get_candles_function if callable(get_candles_function) else None
+        self._get_candle_version = get_candle_version_function if callable(get_candle_version_function) else None
+        self._bands_key = None
+        self._bands = None
 
     def get_period(self):
         return self._sma_period
 
+    def set_period(self, sma_period):
+        self._sma_period = sma_period
+        self._exchange = f"Kucoin {self.get_trade_symbol()} {self._sma_period} {self._candle_delta}"
+
     def get_delta(self):
         return self._candle_delta
 
-    def get_ta(self) -> pd.DataFrame:
+    def get_ta(self):
+        pd = load_pandas()
         series_headers = ["open_time", "open", "close", "high", "low", "volume", "amount"]
-        df = pd.DataFrame(self._get_data()['klines'], columns=series_headers)
+        if self._get_candles is not None:
+            df = pd.DataFrame(self._get_candles(), columns=series_headers)
+        else:
+            df = pd.DataFrame(self._get_data()['klines'], columns=series_headers)
         df['open_time'] = pd.to_datetime(df['open_time'], unit='s')
         df['open_time'] = df['open_time'].dt.tz_localize('UTC').dt.tz_convert(
             'America/New_York')  # replace 'America/New_York' with your timezone
         return df[::-1]
 
     def get_bbands(self, leng=20, st_dev=2, oclh=None):
+        load_pandas()
         if oclh is None:
             return self.get_ta().ta.bbands(close='close', length=leng, std=st_dev, append=True)
         else:
             return oclh.ta.bbands(close="close", length=leng, std=st_dev, append=True)
+
+    def get_bands(self, levels):
+        """
+        Returns Bollinger bands for several standard deviation multipliers at once.
+
+        The rolling mean and standard deviation (ddof=0, as pandas_ta.bbands) are computed once over
+        the close prices and broadcast against every level. The result is cached until the candles
+        change, so repeated reads between candle updates cost nothing.
+
+        Args:
+            levels (list): Standard deviation multipliers, e.g. config["order_levels"].
+
+        Returns:
+            numpy.ndarray: (n_candles, n_levels, 2) array of [upper, lower] prices, oldest candle
+            first; rows before the first full SMA period are NaN.
+        """
+        levels = tuple(float(level) for level in levels)
+        version = self._get_candle_version() if self._get_candle_version is not None else None
+        key = (version, self._sma_period, levels)
+        if version is not None and key == self._bands_key:
+            return self._bands
+
+        np = load_numpy()
+        if self._get_candles is not None:
+            close = self._get_candles()["close"][::-1]
+        else:
+            close = np.array([candle[2] for candle in reversed(self._get_data()['klines'])], dtype="f8")
+        bands = bollinger_bands(close, int(self._sma_period), levels)
+        # The cached array is shared by every reader.
+        bands.flags.writeable = False
+        self._bands_key = key
+        self._bands = bands
+        return bands
@@ -1,19 +1,23 @@
 import logging
 import time
+import uuid
 
 from base_trade import BaseTrade
 from kucoin.client import Trade
 
 from bot_log import BotLog
 from exchanges.kucoin.kucoin_exception import KucoinAPIException
+from exchanges.kucoin.kucoin_paginator import KucoinPaginator
+from exchanges.kucoin.kucoin_scheduler import (KucoinRequestScheduler, PRIORITY_ACCOUNT_READ, PRIORITY_CANCEL,
+                                               PRIORITY_PLACE)
 
 
 class KucoinTrade(BaseTrade):
-    def __init__(self, config, get_data_function=None, rest_update_function=None):
+    def __init__(self, config, get_data_function=None, rest_update_function=None, balance_ledger=None,
+                 scheduler=None, order_latency=None, paginator=None):
         super().__init__(config)
         
         self.log = logging.getLogger("KucoinTrade")
-        self.log.setLevel(config["log_level"])
         
         if callable(get_data_function):
             self._get_data = get_data_function
@@ -23,93 +27,206 @@ class KucoinTrade(BaseTrade):
 
         self._exchange = "Kucoin"
         self._account_type = config["account_type"]
+        self._balances = balance_ledger
+        self._latency = order_latency
+        self._scheduler = scheduler or KucoinRequestScheduler()
+        self._paginator = paginator or KucoinPaginator(self._scheduler)
         self._trade = Trade(
             key=config["api_key"],
             secret=config["api_secret"],
             passphrase=config["api_passphrase"],
-            is_sandbox=(config["sandbox"] == "True")
+            is_sandbox=(config["sandbox"] == "True"),
+            url=config.get("rest_url", ""),
         )
 
+    def _reserve_funds(self, clientOid, symbol, side, size=None, price=None, funds=None):
+        """
+        Reserves the funds an order will hold in the balance ledger until the exchange reports it.
+        """
+        if self._balances is None:
+            return
+        base, quote = symbol.split("-")
+        if side == "buy":
+            if funds:
+                self._balances.reserve(clientOid, self._account_type, quote, float(funds))
+            elif size and price:
+                self._balances.reserve(clientOid, self._account_type, quote, float(size) * float(price))
+            elif size:
+                cost = self._market_buy_cost(symbol, float(size))
+                if cost is None:
+                    self.log.warning(f"No order book to estimate the cost of a {size} {symbol} market buy")
+                else:
+                    self._balances.reserve(clientOid, self._account_type, quote, cost)
+        elif size:
+            self._balances.reserve(clientOid, self._account_type, base, float(size))
+
+    def _market_buy_cost(self, symbol, size):
+        # What taking size from the cached asks costs; the rest of it is priced at the last level.
+        get_data = getattr(self, "_get_data", None)
+        book = get_data().get('/market/level2:' + symbol) if get_data else None
+        if not book or not book.get("asks"):
+            return None
+        # The book is updated on the event loop; copy() does not let it change mid-iteration.
+        cost, remaining = 0.0, size
+        for price, available in sorted(book["asks"].copy().items()):
+            taken = min(remaining, available)
+            cost += taken * price
+            remaining -= taken
+            if remaining <= 0:
+                break
+        return cost + remaining * price
+
+    def _order_submitted(self, clientOid, order_type, side):
+        if self._latency is not None:
+            self._latency.submitted(clientOid, order_type, side)
+
+    def _order_placed(self, clientOid, results):
+        accepted = bool(results and "orderId" in results)
+        if self._latency is not None:
+            self._latency.acknowledged(clientOid, accepted)
+        if self._balances is None:
+            return
+        if accepted:
+            self._balances.set_order_id(clientOid, results["orderId"])
+        else:
+            self._balances.release(clientOid)
+
     def create_limit_margin_order(self, symbol, side, size, price, clientOid='', **kwargs):
+        clientOid = clientOid or uuid.uuid4().hex
+        self._reserve_funds(clientOid, symbol, side, size, price)
+        self._order_submitted(clientOid, "limit", side)
+        results = None
         try:
-            results = self._trade.create_limit_margin_order(symbol, side, size, price, clientOid, **kwargs)
+            results = self._scheduler.call(PRIORITY_PLACE, self._trade.create_limit_margin_order,
+                                           symbol, side, size, price, clientOid, **kwargs)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error creating limit margin order: {ex}")
         except Exception as ex:
             self.log.error(f"Unexpected error creating limit margin order: {ex}")
+        finally:
+            self._order_placed(clientOid, results)
         return None
 
     def create_market_margin_order(self, symbol, side, clientOid='', **kwargs):
+        clientOid = clientOid or uuid.uuid4().hex
+        self._reserve_funds(clientOid, symbol, side, kwargs.get("size"), funds=kwargs.get("funds"))
+        self._order_submitted(clientOid, "market", side)
+        results = None
         try:
-            results = self._trade.create_market_margin_order(symbol, side, clientOid, **kwargs)
+            results = self._scheduler.call(PRIORITY_PLACE, self._trade.create_market_margin_order,
+                                           symbol, side, clientOid, **kwargs)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error creating market margin order: {ex}")
         except Exception as ex:
             self.log.error(f"Unexpected error creating market margin order: {ex}")
+        finally:
+            self._order_placed(clientOid, results)
         return None
 
     def create_limit_order(self, symbol, side, size, price, clientOid='', **kwargs):
+        clientOid = clientOid or uuid.uuid4().hex
+        self._reserve_funds(clientOid, symbol, side, size, price)
+        self._order_submitted(clientOid, "limit", side)
+        results = None
         try:
-            results = self._trade.create_limit_order(symbol, side, size, price, clientOid, **kwargs)
+            results = self._scheduler.call(PRIORITY_PLACE, self._trade.create_limit_order,
+                                           symbol, side, size, price, clientOid, **kwargs)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error creating limit order: {ex}")
         except Exception as ex:
             self.log.error(f"Unexpected error creating limit order: {ex}")
+        finally:
+            self._order_placed(clientOid, results)
         return None
 
     def create_limit_stop_order(self, symbol, side, size, price, stopPrice,  clientOid="", **kwargs):
+        clientOid = clientOid or uuid.uuid4().hex
+        self._reserve_funds(clientOid, symbol, side, size, price)
+        results = None
         try:
-            results = self._trade.create_limit_stop_order(symbol, side, size, price, stopPrice,  clientOid, **kwargs)
+            results = self._scheduler.call(PRIORITY_PLACE, self._trade.create_limit_stop_order,
+                                           symbol, side, size, price, stopPrice,  clientOid, **kwargs)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error creating limit stop order: {ex}")
         except Exception as ex:
             self.log.error(f"Unexpected error creating limit stop order: {ex}")
+        finally:
+            self._order_placed(clientOid, results)
         return None
 
     def create_market_stop_order(self, symbol, side, stopPrice, size="", funds="", clientOid="", **kwargs):
+        clientOid = clientOid or uuid.uuid4().hex
+        self._reserve_funds(clientOid, symbol, side, size, funds=funds)
+        results = None
         try:
-            results = self._trade.create_market_stop_order(symbol, side, stopPrice, size, funds, clientOid, **kwargs)
+            results = self._scheduler.call(PRIORITY_PLACE, self._trade.create_market_stop_order,
+                                           symbol, side, stopPrice, size, funds, clientOid, **kwargs)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error creating market stop order: {ex}")
         except Exception as ex:
             self.log.error(f"Unexpected error creating market stop order: {ex}")
+        finally:
+            self._order_placed(clientOid, results)
         return None
 
     def create_market_order(self, symbol, side, clientOid='', **kwargs):
+        clientOid = clientOid or uuid.uuid4().hex
+        self._reserve_funds(clientOid, symbol, side, kwargs.get("size"), funds=kwargs.get("funds"))
+        self._order_submitted(clientOid, "market", side)
+        results = None
         try:
-            results = self._trade.create_market_order(symbol, side, clientOid, **kwargs)
+            results = self._scheduler.call(PRIORITY_PLACE, self._trade.create_market_order,
+                                           symbol, side, clientOid, **kwargs)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error creating market order: {ex}")
         except Exception as ex:
             self.log.error(f"Unexpected error creating market order: {ex}")
+        finally:
+            self._order_placed(clientOid, results)
         return None
 
     def create_bulk_orders(self, symbol, orderList):
+        # Every order gets a clientOid, so its reservation can be matched to its result.
+        orderList = [dict(order, clientOid=order.get("clientOid") or uuid.uuid4().hex) for order in orderList]
+        for order in orderList:
+            self._reserve_funds(order["clientOid"], symbol, order["side"], order.get("size"), order.get("price"),
+                                order.get("funds"))
+        results = None
         try:
-            results = self._trade.create_bulk_orders(symbol, orderList)
+            results = self._scheduler.call(PRIORITY_PLACE, self._trade.create_bulk_orders, symbol, orderList)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error creating bulk orders: {ex}")
         except Exception as ex:
             self.log.error(f"Unexpected error creating bulk orders: {ex}")
+        finally:
+            self._bulk_orders_placed(orderList, results)
         return None
 
+    def _bulk_orders_placed(self, orderList, results):
+        # Each order of the batch succeeds or fails on its own; one without a result was not placed.
+        placed = {item.get("clientOid"): item for item in (results or {}).get("data") or []}
+        for order in orderList:
+            item = placed.get(order["clientOid"]) or {}
+            accepted = item.get("status") == "success" and item.get("id")
+            self._order_placed(order["clientOid"], {"orderId": item["id"]} if accepted else None)
+
     def cancel_client_order(self, clientId):
         try:
-            results = self._trade.cancel_client_order(clientId)
+            results = self._scheduler.call(PRIORITY_CANCEL, self._trade.cancel_client_order, clientId)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -120,7 +237,7 @@ class KucoinTrade(BaseTrade):
 
     def cancel_stop_order(self, orderId):
         try:
-            results = self._trade.cancel_stop_order(orderId)
+            results = self._scheduler.call(PRIORITY_CANCEL, self._trade.cancel_stop_order, orderId)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -131,7 +248,7 @@ class KucoinTrade(BaseTrade):
 
     def cancel_client_stop_order(self, orderId, symbol=""):
         try:
-            results = self._trade.cancel_client_stop_order(orderId, symbol)
+            results = self._scheduler.call(PRIORITY_CANCEL, self._trade.cancel_client_stop_order, orderId, symbol)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -142,7 +259,8 @@ class KucoinTrade(BaseTrade):
 
     def cancel_stop_condition_order(self, symbol="", tradeType="", orderIds=""):
         try:
-            results = self._trade.cancel_stop_condition_order(symbol, tradeType, orderIds)
+            results = self._scheduler.call(PRIORITY_CANCEL, self._trade.cancel_stop_condition_order,
+                                           symbol, tradeType, orderIds)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -153,7 +271,7 @@ class KucoinTrade(BaseTrade):
 
     def cancel_order(self, **kwargs):
         try:
-            results = self._trade.cancel_order(**kwargs)
+            results = self._scheduler.call(PRIORITY_CANCEL, self._trade.cancel_order, **kwargs)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -164,7 +282,7 @@ class KucoinTrade(BaseTrade):
 
     def cancel_all_orders(self, **kwargs):
         try:
-            results = self._trade.cancel_all_orders(**kwargs)
+            results = self._scheduler.call(PRIORITY_CANCEL, self._trade.cancel_all_orders, **kwargs)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -173,16 +291,23 @@ class KucoinTrade(BaseTrade):
             self.log.error(f"Unexpected error canceling all orders: {ex}")
         return None
 
+    def _order_list_params(self, **kwargs):
+        acc_type = str(self._account_type).upper()
+        if acc_type in ("MARGIN", "MARGIN_ISOLATED"):
+            acc_type = acc_type + "_TRADE"
+        else:
+            acc_type = "TRADE"
+        params = {
+            "symbol": self.get_trade_symbol(),
+            "tradeType": acc_type
+        }
+        params.update(kwargs)
+        return params
+
     def get_order_list(self, **kwargs):
         try:
-            acc_type = str(self._account_type).upper()
-            if acc_type == "MARGIN" or "MARGIN_ISOLATED":
-                acc_type = acc_type + "_TRADE"
-            kwargs = {
-                "symbol": self.get_trade_symbol(),
-                "tradeType": acc_type
-            }
-            results = self._trade.get_order_list(**kwargs)
+            params = self._order_list_params(**kwargs)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._trade.get_order_list, **params, coalesce=True)
             if "items" in results and len(results["items"]) > 0:
                 # update the data store with the order history
                 cache_object = {
@@ -197,9 +322,35 @@ class KucoinTrade(BaseTrade):
             self.log.error(f"Unexpected error getting order list: {ex}")
         return None
 
+    def get_order_history(self, on_page=None, **kwargs):
+        """
+        Reads every page of the order list, pushing each page to the cache as it arrives.
+
+        Args:
+            on_page (callable): Optional; also called as on_page(page, items) for every page.
+            kwargs: Filters of get_order_list, e.g. status or startAt.
+
+        Returns:
+            dict: The page and item counts (see KucoinPaginator.fetch), or None on failure.
+        """
+        def push(page, items):
+            if items:
+                self._rest_update({"topic": "tradeOrders", "data": items})
+            if on_page is not None:
+                on_page(page, items)
+
+        try:
+            return self._paginator.fetch(self._trade.get_order_list, on_page=push,
+                                         **self._order_list_params(**kwargs))
+        except KucoinAPIException as ex:
+            self.log.error(f"API error getting order history: {ex}")
+        except Exception as ex:
+            self.log.error(f"Unexpected error getting order history: {ex}")
+        return None
+
     def get_recent_orders(self):
         try:
-            results = self._trade.get_recent_orders()
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._trade.get_recent_orders, coalesce=True)
             if isinstance(list) and len(results) > 0:
                 cache_object = {
                     "topic": "tradeOrders",
@@ -215,8 +366,9 @@ class KucoinTrade(BaseTrade):
 
     def get_order_details(self, orderId):
         try:
-            results = self._trade.get_order_details(orderId)
-            self._rest_update(results)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._trade.get_order_details, orderId, coalesce=True)
+            if results and "id" in results:
+                self._rest_update({"topic": "tradeOrders", "data": [results]})
             return results
         except KucoinAPIException as ex:
             self.log.error(f"API error getting order details: {ex}")
@@ -226,7 +378,8 @@ class KucoinTrade(BaseTrade):
 
     def get_all_stop_order_details(self, **kwargs):
         try:
-            results = self._trade.get_all_stop_order_details(**kwargs)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._trade.get_all_stop_order_details,
+                                           **kwargs, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -237,7 +390,8 @@ class KucoinTrade(BaseTrade):
 
     def get_stop_order_details(self, **kwargs):
         try:
-            results = self._trade.get_stop_order_details(**kwargs)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._trade.get_stop_order_details,
+                                           **kwargs, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -248,7 +402,8 @@ class KucoinTrade(BaseTrade):
 
     def get_client_stop_order_details(self, clientOid, symbol=''):
         try:
-            results = self._trade.get_client_stop_order_details(clientOid, symbol)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._trade.get_client_stop_order_details,
+                                           clientOid, symbol, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -257,17 +412,22 @@ class KucoinTrade(BaseTrade):
             self.log.error(f"Unexpected error getting client stop order details: {ex}")
         return None
 
-    def get_fill_list(self, tradeType, **kwargs):
+    def _fill_trade_type(self, tradeType):
         if tradeType == "spot":
-            tradeType = "TRADE"
-        elif tradeType == "margin":
-            tradeType = "MARGIN_TRADE"
-        else:
-            logging.getLogger().error("invalid trade type in get_fills_list")
+            return "TRADE"
+        if tradeType == "margin":
+            return "MARGIN_TRADE"
+        self.log.error("invalid trade type in get_fills_list")
+        return None
+
+    def get_fill_list(self, tradeType, **kwargs):
+        tradeType = self._fill_trade_type(tradeType)
+        if tradeType is None:
             return None
 
         try:
-            results = self._trade.get_fill_list(tradeType, **kwargs)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._trade.get_fill_list,
+                                           tradeType, **kwargs, coalesce=True)
             if "items" in results and len(results["items"]) > 0:
                 cache_object = {
                     "topic": "fills",
@@ -281,9 +441,36 @@ class KucoinTrade(BaseTrade):
             self.log.error(f"Unexpected error getting fill list: {ex}")
         return None
 
+    def get_fill_history(self, tradeType, **kwargs):
+        """
+        Reads every page of the fill list concurrently and pushes the fills to the cache in one
+        update once all pages are in, since the fills ledger applies them in trade order.
+
+        Args:
+            tradeType (str): "spot" or "margin".
+            kwargs: Filters of get_fill_list, e.g. orderId or startAt.
+
+        Returns:
+            dict: The page counts and the items of all pages (see KucoinPaginator.fetch).
+        """
+        tradeType = self._fill_trade_type(tradeType)
+        if tradeType is None:
+            return None
+
+        try:
+            results = self._paginator.fetch(self._trade.get_fill_list, tradeType, **kwargs)
+            if results["items"]:
+                self._rest_update({"topic": "fills", "data": results["items"]})
+            return results
+        except KucoinAPIException as ex:
+            self.log.error(f"API error getting fill history: {ex}")
+        except Exception as ex:
+            self.log.error(f"Unexpected error getting fill history: {ex}")
+        return None
+
     def get_recent_fills(self):
         try:
-            results = self._trade.get_recent_fills()
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._trade.get_recent_fills, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -294,7 +481,8 @@ class KucoinTrade(BaseTrade):
 
     def get_client_order_details(self, clientOid):
         try:
-            results = self._trade.get_client_order_details(clientOid)
+            results = self._scheduler.call(PRIORITY_ACCOUNT_READ, self._trade.get_client_order_details,
+                                           clientOid, coalesce=True)
             self._rest_update(results)
             return results
         except KucoinAPIException as ex:
@@ -305,5 +493,5 @@ class KucoinTrade(BaseTrade):
 
     def initialize(self):
         self.get_order_list()
-        self.get_fill_list(self._account_type)
+        self.get_fill_history(self._account_type)
         time.sleep(1)
\ No newline at end of file
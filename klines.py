@@ -2,26 +2,15 @@ import asyncio
 import datetime
 import os
 
-import yaml
+from bot_config import BotConfig
 from kucoin.client import Market, WsToken
 from kucoin.ws_client import KucoinWsClient
-from tabulate import tabulate
 
 ob_depth = 13
-# Fetch Initial Orderbook Data
-with open("configuration.yaml", "r") as file:
-    config = yaml.safe_load(file)
-
-# Get WebSocket token
-ws_token = WsToken(
-    key=config["api_key"],
-    secret=config["api_secret"],
-    passphrase=config["api_passphrase"]
-)
 
 
 class OrderBook:
-    def __init__(self):
+    def __init__(self, config):
         self.orderbook = None
         self.market = Market(
             key=config["api_key"],
@@ -61,6 +50,8 @@ class OrderBook:
         self.orderbook = {"asks": asks, "bids": bids}
 
     def print_orderbook(self, depth=10):
+        from tabulate import tabulate
+
         os.system('cls' if os.name == 'nt' else 'clear')
 
         # Get the asks
@@ -81,9 +72,6 @@ class OrderBook:
         print(tabulate(bids_table, headers='firstrow', tablefmt='pipe'))
 
 
-orderbook = OrderBook()
-
-
 def create_handle_msg(update_ob):
     async def handle_msg(msg):
         # Process the WebSocket message
@@ -106,6 +94,15 @@ def create_handle_msg(update_ob):
 
 async def main():
     symbol = 'BTC-USDT'
+    config = BotConfig.load()
+
+    # Get WebSocket token
+    ws_token = WsToken(
+        key=config["api_key"],
+        secret=config["api_secret"],
+        passphrase=config["api_passphrase"]
+    )
+    orderbook = OrderBook(config)
 
     # Create the handle_msg function with access to orderbook
     handle_msg = create_handle_msg(orderbook)
@@ -1,16 +1,152 @@
+import asyncio
+import datetime
+import logging
+import time
+from email.message import EmailMessage
+
+from metrics import ReportSections
+
+log = logging.getLogger("Mailer")
+
+
 class Mailer:
-    def __init__(self, config):
+    """
+    Sends alerts and reports by email without blocking the event loop.
+
+    Alerts are put on an asyncio queue and return immediately. A background worker collects the
+    alerts of one time window, folds repeats of the same alert into a count, and sends the batch as
+    a single email over async SMTP.
+    """
+
+    def __init__(self, config, window=60.0):
         self.receiver_email = config["receiver_email"]
         self.sender_email = config["sender_email"]
         self.password = config["password"]
         self.server = config["server"]
         self.port = config["port"]
+        self.start_tls = config.get("smtp_starttls", int(config["port"]) == 587)
+        self._window = window
+        self._queue = None
+        self._worker = None
+        self._flushing = False
+        self.sent = 0
+        self.deduplicated = 0
+        self._report = ReportSections()
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self, timeout=30.0):
+        # Send whatever is queued now instead of at the end of the window, then stop the worker.
+        if self._worker is None:
+            return
+        self._flushing = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("Gave up sending %s queued alert(s)", self._queue.qsize())
+        self._worker.cancel()
+        self._worker = None
+        self._flushing = False
+
+    def alert(self, subject, body, key=None):
+        """
+        Queues an alert. Alerts with the same key in one window are sent once, with a count.
+        """
+        if self._worker is None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                log.warning("No event loop running, alert not sent: %s", subject)
+                return
+            self.start()
+        self._queue.put_nowait((key or f"{subject}\n{body}", subject, body, time.time()))
+
+    async def _run(self):
+        while True:
+            batch = {}
+            first = await self._queue.get()
+            self._add(batch, first)
+            deadline = time.monotonic() + self._window
+            while not self._flushing:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    self._add(batch, await asyncio.wait_for(self._queue.get(), min(timeout, 0.5)))
+                except asyncio.TimeoutError:
+                    continue
+            # When flushing, the window ends early; whatever is already queued still joins this batch.
+            while not self._queue.empty():
+                self._add(batch, self._queue.get_nowait())
+
+            try:
+                await self._send(*self._format_batch(batch))
+                self.sent += 1
+            except Exception as ex:
+                log.error("Could not send %s alert(s): %s", len(batch), ex)
+            finally:
+                for alert in batch.values():
+                    for _ in range(alert["count"]):
+                        self._queue.task_done()
+
+    def _add(self, batch, alert):
+        key, subject, body, sent_at = alert
+        if key in batch:
+            batch[key]["count"] += 1
+            batch[key]["last"] = sent_at
+            self.deduplicated += 1
+        else:
+            batch[key] = {"subject": subject, "body": body, "count": 1, "first": sent_at, "last": sent_at}
+
+    @staticmethod
+    def _format_batch(batch):
+        alerts = list(batch.values())
+        if len(alerts) == 1:
+            subject = alerts[0]["subject"]
+        else:
+            subject = f"{alerts[0]['subject']} (+{len(alerts) - 1} more)"
+        parts = []
+        for alert in alerts:
+            header = f"{alert['subject']}"
+            if alert["count"] > 1:
+                first = datetime.datetime.fromtimestamp(alert["first"]).strftime("%H:%M:%S")
+                last = datetime.datetime.fromtimestamp(alert["last"]).strftime("%H:%M:%S")
+                header += f" (repeated {alert['count']} times between {first} and {last})"
+            parts.append(f"{header}\n{alert['body']}")
+        return subject, "\n\n".join(parts)
 
-    def send_daily_report(self, account):
+    async def _send(self, subject, body):
+        import aiosmtplib
 
-        pass
+        message = EmailMessage()
+        message["From"] = self.sender_email
+        message["To"] = self.receiver_email
+        message["Subject"] = subject
+        message.set_content(body)
+        await aiosmtplib.send(
+            message,
+            hostname=self.server,
+            port=int(self.port),
+            username=self.sender_email if self.password else None,
+            password=self.password or None,
+            start_tls=self.start_tls,
+        )
 
-    def send_error_message(self, param):
+    def report(self):
+        """
+        Returns the sections of the daily report; components register their builders with it.
+        """
+        return self._report
 
-        pass
+    def send_daily_report(self):
+        """
+        Queues a report built from the registered sections; they read in-memory state and make no REST calls.
+        """
+        lines = [f"Daily report {datetime.date.today()}"] + self._report.build()
+        self.alert(f"KuCoin bot daily report {datetime.date.today()}", "\n".join(lines), key="daily_report")
 
+    def send_error_message(self, param, key=None):
+        self.alert("KuCoin bot error", param, key=key)
@@ -1,46 +1,47 @@
 import asyncio
 import datetime
-import math
-import time
-import yaml
-from check_config import Check as check
+import sys
+from bot_config import BotConfig
+from bot_log import report_lines as log_report_lines, set_level, setup_logging
 from exchanges.kucoin.kucoin_exchange import KucoinExchange
 from mailer import Mailer
+from timer_wheel import TimerWheel
 from trading_strategy import TradingStrategy
 import logging
 
 
-def _check_config_file(config):
-    check().config_file(
-        {
-            "api_key": "No 'api_key' variable in the configuration file.",
-            "api_secret": "No 'api_secret' variable in the configuration file.",
-            "receiver_email": "No receiver_email variable in the configuration file.",
-            "sender_email": "No 'sender_email' variable in the configuration file.",
-            "server": "No 'server' variable in the configuration file.",
-            "port": "No 'port' variable in the configuration file.",
-        }, config)
-
-
 class KucoinBot:
     _MAX_ERR = 60
+    # Seconds between runs and their random spread; overridden per task by periodic_tasks in the config.
+    _PERIODIC_TASKS = {
+        "book_resync": {"interval": 60, "jitter": 5},
+        "balance_reconcile": {"interval": 300, "jitter": 30},
+        "daily_report": {"interval": 24 * 60 * 60, "jitter": 0},
+        "clock_sync": {"interval": 60, "jitter": 5},
+        "checkpoint": {"interval": 5, "jitter": 1},
+        "sub_accounts": {"interval": 30, "jitter": 3},
+    }
 
     def __init__(self):
+        self.log = logging.getLogger("KucoinBot")
         self._init_bot()
 
     def _init_bot(self):
         try:
-            with open("configuration.yaml", "r") as file:
-                config = yaml.safe_load(file)
-                _check_config_file(config)
-
-                self.log = logging.getLogger("KucoinBot")
-                self.log.setLevel(config["log_level"])
-
-                self._exchange = KucoinExchange(config)
-                self._strategy = TradingStrategy(config, self._exchange)
-                self._mailer = Mailer(config)
-                self.run_application = True
+            # The configuration is parsed once and shared; later changes are hot-swapped by watch().
+            self._config = BotConfig.load()
+            setup_logging(self._config)
+            self._config.subscribe(self._on_config_change)
+
+            self._exchange = KucoinExchange(self._config)
+            self._strategy = TradingStrategy(self._config, self._exchange)
+            self._mailer = Mailer(self._config)
+            self._timers = TimerWheel()
+            report = self._mailer.report()
+            self._exchange.register_report_sections(report)
+            report.register("log_output", log_report_lines)
+            report.register("periodic_tasks", self._timers.report_lines)
+            self.run_application = True
 
         except FileNotFoundError as fnf:
             self.log.error(
@@ -49,93 +50,137 @@ class KucoinBot:
                 fnf)
             SystemExit(1)
 
+    def _on_config_change(self, changes):
+        if "log_level" in changes:
+            set_level(self._config["log_level"])
+
+    async def _connect_ws_client(self):
+        conn_err = 0
+        while not self._exchange.ws_is_connected():
+            try:
+                ws_client = await self._exchange.connect_websocket_client()
+                self.log.info("Client connected... ")
+                print("Client connected...")
+                return ws_client
+            except Exception as ex:
+                self.log.error(f"Could not connect.\n{ex}\nSleeping for 5 seconds...")
+                print(f"Could not connect.\n{ex}\nSleeping for 5 seconds...")
+                conn_err += 1
+                await asyncio.sleep(5)
+                if conn_err > self._MAX_ERR:
+                    await self._exit_error()
+                self.log.info("Trying to connect...")
+
     async def connect_websocket(self):
         self.log.info("Connecting web socket client...")
-        self._init_bot()
-        async def con_ws():
-            conn_err = 0
-            while not self._exchange.ws_is_connected():
-                try:
-                    ws_client = await self._exchange.connect_websocket_client()
-                    self.log.info("Client connected... ")
-                    print("Client connected...")
-                    return ws_client
-                except Exception as ex:
-                    self.log.error(f"Could not connect.\n{ex}\nSleeping for 5 seconds...")
-                    print(f"Could not connect.\n{ex}\nSleeping for 5 seconds...")
-                    conn_err += 1
-                    await asyncio.sleep(5)
-                    if conn_err > self._MAX_ERR:
-                        self._exit_error()
-                    self.log.info("Trying to connect...")
 
         async def init_data():
             error_count = 0
             data_initialized = False
             while not data_initialized:
                 try:
-                    self._strategy.initialize()
+                    await self._strategy.initialize_async()
                     data_initialized = True
                 except Exception as ex:
                     self.log.error(ex)
                     error_count += 1
                     if error_count > self._MAX_ERR:
-                        self._exit_error()
+                        await self._exit_error(ex)
                     # Try to initialize again.
                     await asyncio.sleep(60 - datetime.datetime.now().second)
 
         await asyncio.gather(
-            con_ws(),
+            self._connect_ws_client(),
             init_data()
         )
+        # Release the strategy only once every required piece of data is loaded.
+        await self._exchange.readiness().wait()
 
-    def _exit_error(self, ex=Exception):
+    async def _exit_error(self, ex=None):
         dt = datetime.datetime.now()
         message = f"{dt} ERROR\nThe application has encountered an error, and could not initialize.\n" \
                   f"The service has terminated for the remainder of this day..\n"
-        logging.error(message, ex)
+        self.log.error("%s%s", message, ex or "")
+        # Queued, deduplicated and sent in the background; the event loop keeps running.
         self._mailer.send_error_message(
-            message + "Please review the logs\n"
-        )
-        time.sleep(60 - datetime.datetime.now().second)
-        time.sleep((60 - datetime.datetime.now().minute) * 60)
-        self._mailer.send_error_message(
-            message + "Please review the logs\n"
+            message + "Please review the logs\n",
+            key="initialization_failed"
         )
         # Sleep till the end of the day
-        time.sleep(24 - datetime.datetime.now().hour * math.pow(60, 2))
-        SystemExit(1)
+        now = datetime.datetime.now()
+        tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+        await asyncio.sleep((tomorrow - now).total_seconds())
+
+    def _strategy_step(self):
+        self._strategy.update_market_data()
+        self._strategy.print_market_data()
+
+    def _on_candle_close(self, candle):
+        # Called from the websocket handler; the step runs once the message has been processed.
+        asyncio.get_running_loop().call_soon(self._strategy_step)
+
+    def _schedule_periodic_tasks(self):
+        tasks = {
+            "book_resync": lambda: self._rest_task(self._exchange.market().get_aggregated_orderv3),
+            "balance_reconcile": lambda: self._rest_task(self._exchange.update_balances),
+            "daily_report": self._mailer.send_daily_report,
+            "clock_sync": lambda: self._rest_task(self._exchange.clock().sync),
+            "checkpoint": self._exchange.checkpoint_async,
+        }
+        if self._exchange.sub_accounts() is not None:
+            tasks["sub_accounts"] = self._exchange.sub_accounts().refresh
+        overrides = self._config.get("periodic_tasks") or {}
+        now = datetime.datetime.fromtimestamp(self._exchange.clock().now_ms() / 1000)
+        midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+        for name, callback in tasks.items():
+            task = dict(self._PERIODIC_TASKS[name], **overrides.get(name, {}))
+            # The daily report goes out at midnight rather than a day after start-up.
+            first_delay = (midnight - now).total_seconds() if name == "daily_report" else None
+            self._timers.schedule(name, task["interval"], callback, task["jitter"], first_delay)
+
+    async def _rest_task(self, request):
+        # The REST wrappers log and swallow their errors. A dropped websocket is reconnected by the
+        # SDK, and the exchange resyncs when the new connection is welcomed (see KucoinSocket).
+        await asyncio.to_thread(request)
 
     async def run(self):
         try:
+            self._mailer.start()
             await self.connect_websocket()
-            # Main loop for the bot, handling data updates and order management
-            # enter the application loop
-            while self.run_application:
-                try:
-                    self._strategy.update_market_data()
-                    self._strategy.print_market_data()
-                    # Sleep until the start of the next minute
-                    now = datetime.datetime.now()
-                    sleep_seconds = 60 - now.second - now.microsecond / 1000000
-                    await asyncio.sleep(sleep_seconds)
-
-                    self._exchange.market().get_aggregated_orderv3()
+            config_watch = asyncio.ensure_future(self._config.watch())
+            # Strategy steps follow candle closes from the feed, whatever the candle length or the
+            # local clock; everything else runs as periodic tasks on the timer wheel.
+            self._exchange.on_candle_close(self._on_candle_close)
+            self._strategy_step()
+            self._schedule_periodic_tasks()
+            await self._timers.run()
 
-                except ConnectionError:
-                    print("There was a connection error, resetting...")
-                    self._exchange.uninitialize_ws()
-                    # Re-connect to the WebSocket
-                    await self.connect_websocket()
+            config_watch.cancel()
 
         except Exception as ex:
             print(ex)
 
     async def close_websocket(self):
+        self._timers.stop()
+        self.log.info("Order latency this session:\n%s", self._exchange.order_latency().summary())
         await self._exchange.unsubscribe()
+        await self._exchange.uninitialize_ws()
+        # A final checkpoint, so a restart right after a deploy has almost nothing to catch up on.
+        await self._exchange.checkpoint_async()
+        self._exchange.close_shared_memory()
+        await self._mailer.stop()
+
+
+def check_config_only():
+    BotConfig.load()
+    print("configuration.yaml is valid.")
 
 
 if __name__ == "__main__":
+    if "--check-config" in sys.argv[1:]:
+        check_config_only()
+        exit(0)
+
     bot = KucoinBot()
     loop = asyncio.get_event_loop()
     try:
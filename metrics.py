@@ -0,0 +1,58 @@
+import logging
+
+log = logging.getLogger("Metrics")
+
+
+def percentiles(samples, points=(50, 99), scale=1000.0, digits=2):
+    """
+    Summarizes recent samples (e.g. a bounded deque of durations in seconds).
+
+    Returns {"count": n, "p50": ..., "p99": ..., "max": ...} with one "p<point>" entry per point.
+    Values are multiplied by scale (seconds to ms by default) and rounded to digits unless digits
+    is None; without samples every value is 0.0.
+    """
+    values = sorted(samples)
+    result = {"count": len(values)}
+    for point in points:
+        result[f"p{point}"] = values[int(len(values) * point / 100)] if values else 0.0
+    result["max"] = values[-1] if values else 0.0
+    for key in result:
+        if key != "count":
+            result[key] *= scale
+            if digits is not None:
+                result[key] = round(result[key], digits)
+    return result
+
+
+class ReportSections:
+    """
+    The sections of the daily report, built in registration order from in-memory state.
+
+    Each component registers a builder that returns its lines; a builder that fails is logged and
+    reported as unavailable, so one broken section does not cost the whole report.
+    """
+
+    def __init__(self):
+        self._builders = {}
+
+    def register(self, name, builder):
+        """
+        Registers builder() -> list of lines under name, replacing an earlier builder of that name.
+        """
+        self._builders[name] = builder
+
+    def unregister(self, name):
+        self._builders.pop(name, None)
+
+    def names(self):
+        return list(self._builders)
+
+    def build(self):
+        lines = []
+        for name, builder in self._builders.items():
+            try:
+                lines.extend(builder())
+            except Exception as ex:
+                log.warning("Report section %s failed: %s", name, ex)
+                lines.append(f"{name}: unavailable")
+        return lines
@@ -1,23 +1,12 @@
 import asyncio
 import datetime
-import pandas as pd
-import yaml
+from bot_config import BotConfig
 from kucoin.client import Market, WsToken
 from kucoin.ws_client import KucoinWsClient
 
-# Fetch Initial Orderbook Data
-with open("configuration.yaml", "r") as file:
-    config = yaml.safe_load(file)
-
-# Get WebSocket token
-ws_token = WsToken(
-    key=config["api_key"],
-    secret=config["api_secret"],
-    passphrase=config["api_passphrase"]
-)
 
 class KLines:
-    def __init__(self):
+    def __init__(self, config):
         self.orderbook = None
         self.market = Market(
             key=config["api_key"],
@@ -48,15 +37,14 @@ class KLines:
             self.klines[0] = update_candle
 
     def print_klines(self, n_records):
+        import pandas as pd
+
         series_headers = ["open_time", "open", "close", "high", "low", "volume", "amount"]
         df = pd.DataFrame(self.klines, columns=series_headers).head(n_records)
         df['open_time'] = pd.to_datetime(df['open_time'], unit='s')
         print(df.to_markdown())
 
 
-klines = KLines()
-
-
 def create_handle_msg(update_ob):
     async def handle_msg(msg):
         # Process the WebSocket message
@@ -70,6 +58,15 @@ def create_handle_msg(update_ob):
 
 async def main():
     symbol = 'BTC-USDT'
+    config = BotConfig.load()
+
+    # Get WebSocket token
+    ws_token = WsToken(
+        key=config["api_key"],
+        secret=config["api_secret"],
+        passphrase=config["api_passphrase"]
+    )
+    klines = KLines(config)
 
     # Create the handle_msg function with access to orderbook
     handle_msg = create_handle_msg(klines)
@@ -0,0 +1,170 @@
+import logging
+import time
+
+log = logging.getLogger("Overload")
+
+NORMAL = 0
+SKIP_RENDER = 1
+COALESCE_BOOK = 2
+DEFER_TA = 3
+
+MODE_NAMES = {
+    NORMAL: "normal",
+    SKIP_RENDER: "skip_render",
+    COALESCE_BOOK: "coalesce_book",
+    DEFER_TA: "defer_ta",
+}
+
+
+def message_time_ms(data):
+    """
+    Returns the exchange time stamp of a websocket message body in milliseconds, or None.
+
+    KuCoin stamps topics in different units (ms for level2 and balances, ns for trades, candles
+    and order events), so the unit is inferred from the magnitude.
+    """
+    if not isinstance(data, dict):
+        return None
+    stamp = data.get("time", data.get("ts"))
+    try:
+        stamp = int(stamp)
+    except (TypeError, ValueError):
+        return None
+    if stamp > 10 ** 17:
+        return stamp / 1e6
+    if stamp > 10 ** 14:
+        return stamp / 1e3
+    if stamp > 10 ** 11:
+        return stamp
+    return None
+
+
+class OverloadController:
+    """
+    Sheds work in steps when websocket messages are processed later than they were sent.
+
+    Lag is the wall clock at processing time minus the exchange time stamp of the message,
+    smoothed with an EWMA. Each level has an entry threshold; the controller moves up one level
+    at a time when the lag exceeds the next threshold, and back down one level once the lag has
+    stayed below half the current level's threshold for recover_seconds:
+
+        skip_render:   the terminal tables are not redrawn.
+        coalesce_book: level2 deltas are applied in one batch per event loop tick.
+        defer_ta:      indicators are only recomputed when a candle closes.
+    """
+
+    def __init__(self, thresholds_ms=(250, 1000, 3000), recover_seconds=5.0, min_dwell_seconds=1.0, alpha=0.2,
+                 history=100, now_ms=None):
+        # Exchange time in ms; the local wall clock unless a clock estimator is given.
+        self._now_ms = now_ms or (lambda: time.time() * 1000)
+        self._thresholds = list(thresholds_ms)
+        self._recover_seconds = recover_seconds
+        self._min_dwell = min_dwell_seconds
+        self._alpha = alpha
+        self._history_length = history
+        self._level = NORMAL
+        self._lag_ms = 0.0
+        self._max_lag_ms = 0.0
+        self._changed_at = time.monotonic()
+        self._calm_since = None
+        self._time_in_mode = {level: 0.0 for level in MODE_NAMES}
+        self._history = []
+        # history() keeps only the latest transitions; the count covers the whole session.
+        self._transitions = 0
+        self._listeners = []
+
+    @property
+    def level(self):
+        return self._level
+
+    @property
+    def mode(self):
+        return MODE_NAMES[self._level]
+
+    @property
+    def skip_render(self):
+        return self._level >= SKIP_RENDER
+
+    @property
+    def coalesce_book(self):
+        return self._level >= COALESCE_BOOK
+
+    @property
+    def defer_ta(self):
+        return self._level >= DEFER_TA
+
+    def lag_ms(self):
+        return self._lag_ms
+
+    def on_transition(self, callback):
+        """
+        Registers callback(transition) to be called with each transition dict (see history()).
+        """
+        self._listeners.append(callback)
+
+    def observe_message(self, data):
+        sent_ms = message_time_ms(data)
+        if sent_ms is not None:
+            self.observe(self._now_ms() - sent_ms)
+
+    def observe(self, lag_ms):
+        # A local clock running behind the exchange shows up as negative lag.
+        lag_ms = max(0.0, lag_ms)
+        self._lag_ms += self._alpha * (lag_ms - self._lag_ms)
+        self._max_lag_ms = max(self._max_lag_ms, lag_ms)
+
+        now = time.monotonic()
+        if now - self._changed_at < self._min_dwell:
+            return
+        if self._level < DEFER_TA and self._lag_ms > self._thresholds[self._level]:
+            self._set_level(self._level + 1, now)
+            return
+        if self._level > NORMAL and self._lag_ms < self._thresholds[self._level - 1] / 2:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self._recover_seconds:
+                self._set_level(self._level - 1, now)
+        else:
+            self._calm_since = None
+
+    def _set_level(self, level, now):
+        previous = self._level
+        self._time_in_mode[previous] += now - self._changed_at
+        self._level = level
+        self._changed_at = now
+        self._calm_since = None
+        transition = {
+            "time": time.time(),
+            "from": MODE_NAMES[previous],
+            "to": MODE_NAMES[level],
+            "lag_ms": round(self._lag_ms, 1),
+        }
+        self._transitions += 1
+        self._history.append(transition)
+        del self._history[:-self._history_length]
+        if level > previous:
+            log.warning("Processing lag %.0fms, shedding load: %s -> %s", self._lag_ms, transition["from"],
+                        transition["to"])
+        else:
+            log.info("Processing lag %.0fms, recovering: %s -> %s", self._lag_ms, transition["from"], transition["to"])
+        for callback in self._listeners:
+            callback(transition)
+
+    def history(self):
+        return list(self._history)
+
+    def stats(self):
+        time_in_mode = dict(self._time_in_mode)
+        time_in_mode[self._level] += time.monotonic() - self._changed_at
+        return {
+            "mode": self.mode,
+            "lag_ms": round(self._lag_ms, 1),
+            "max_lag_ms": round(self._max_lag_ms, 1),
+            "transitions": self._transitions,
+            "seconds_in_mode": {MODE_NAMES[level]: round(seconds, 1) for level, seconds in time_in_mode.items()},
+        }
+
+    def report_lines(self):
+        stats = self.stats()
+        return [f"Load shedding: {stats['mode']} (lag {stats['lag_ms']}ms, max {stats['max_lag_ms']}ms, "
+                f"{stats['transitions']} mode changes)"]
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+
+log = logging.getLogger("Readiness")
+
+
+class ReadinessBarrier:
+    """
+    Tracks the pieces of state that must be loaded before the strategy may act.
+
+    Every required piece is marked ready exactly once. Waiters on the barrier are released when
+    the last piece arrives, and the time each piece took (relative to the barrier start) is kept
+    so start-up can be measured.
+    """
+
+    def __init__(self, required):
+        self._required = list(required)
+        self._events = {name: asyncio.Event() for name in self._required}
+        self._ready_at = {}
+        self._released = asyncio.Event()
+        self._started_at = time.monotonic()
+        self._released_at = None
+        self._first_decision_at = None
+        if not self._required:
+            self._release()
+
+    def mark_ready(self, name):
+        if name not in self._events:
+            raise KeyError(f"{name} is not a required piece of this barrier.")
+        if name in self._ready_at:
+            return
+        self._ready_at[name] = time.monotonic()
+        self._events[name].set()
+        log.info("%s ready after %.3fs", name, self._ready_at[name] - self._started_at)
+        if len(self._ready_at) == len(self._required):
+            self._release()
+
+    def _release(self):
+        self._released_at = time.monotonic()
+        self._released.set()
+        log.info("All required data loaded after %.3fs", self.time_to_ready())
+
+    def is_ready(self, name=None):
+        if name is None:
+            return self._released.is_set()
+        return name in self._ready_at
+
+    def pending(self):
+        return [name for name in self._required if name not in self._ready_at]
+
+    async def wait(self, name=None):
+        if name is None:
+            await self._released.wait()
+        else:
+            await self._events[name].wait()
+
+    def mark_first_decision(self):
+        if self._first_decision_at is None and self._released_at is not None:
+            self._first_decision_at = time.monotonic()
+            log.info("Time to first decision: %.3fs", self.time_to_first_decision())
+
+    def time_to_ready(self):
+        if self._released_at is None:
+            return None
+        return self._released_at - self._started_at
+
+    def time_to_first_decision(self):
+        if self._first_decision_at is None:
+            return None
+        return self._first_decision_at - self._started_at
+
+    def timings(self):
+        return {name: at - self._started_at for name, at in self._ready_at.items()}
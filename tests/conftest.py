@@ -0,0 +1,40 @@
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exchanges.kucoin.kucoin_mock_server import KucoinMockServer  # noqa: E402
+
+CONFIG = {
+    "api_key": "key", "api_secret": "secret", "api_passphrase": "passphrase",
+    "base_currency": "BTC", "quote_currency": "USDT", "asset": "BTC-USDT", "account_type": "spot",
+    "sandbox": "False", "candle_length": "1min", "log_level": "WARNING",
+    "sma_period": 20, "standard_deviations": 2, "order_levels": [1, 2, 3], "order_volumes": [10, 15, 25],
+    "stop_loss": 0.01, "total_loss": 0.007,
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def mock_server():
+    """
+    A mock exchange with a slow, gap-free feed; tests that need more traffic start their own.
+    """
+    server = KucoinMockServer(port=_free_port(), ws_port=_free_port(), level2_rate=20, match_rate=2,
+                              candle_rate=1, seed=1).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def exchange_config(mock_server, tmp_path):
+    return dict(CONFIG, rest_url=f"http://{mock_server.host}:{mock_server.port}", checkpoint_path="",
+                reference_cache_path=str(tmp_path / "reference.json"))
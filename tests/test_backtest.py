@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import backtest
+from exchanges.kucoin.kucoin_export import CANDLE_FIELDS
+
+
+def _candles(closes, seconds=60):
+    candles = np.zeros(len(closes), dtype=CANDLE_FIELDS)
+    candles["open_time"] = np.arange(len(closes)) * seconds
+    candles["open"] = closes
+    candles["close"] = closes
+    candles["high"] = np.asarray(closes) + 1
+    candles["low"] = np.asarray(closes) - 1
+    candles["volume"] = 1
+    candles["amount"] = closes
+    return candles
+
+
+def test_resample_aggregates_buckets():
+    candles = backtest.resample(_candles([1.0, 2.0, 3.0, 4.0, 5.0, 6.0]), "3min")
+    assert candles["open_time"].tolist() == [0, 180]
+    assert candles["open"].tolist() == [1.0, 4.0]
+    assert candles["close"].tolist() == [3.0, 6.0]
+    assert candles["high"].tolist() == [4.0, 7.0]
+    assert candles["low"].tolist() == [0.0, 3.0]
+    assert candles["volume"].tolist() == [3, 3]
+
+
+def test_grid_pairs_levels_and_volumes_of_the_same_length():
+    groups = backtest.build_grid({"candle_length": ["1min"], "sma_period": ["10:30:10"],
+                                  "order_levels": [[1, 2], [1, 2, 3]], "order_volumes": [[10, 20]]})
+    assert list(groups) == [("1min", 10), ("1min", 20)]
+    assert [parameters["order_levels"] for parameters in groups[("1min", 10)]] == [[1, 2]]
+
+
+def test_grid_rejects_unknown_candle_lengths():
+    with pytest.raises(ValueError):
+        backtest.build_grid({"candle_length": ["2min"]})
+
+
+def test_parameter_sets_are_volume_weighted_sums_of_levels(monkeypatch):
+    closes = 100 + 10 * np.sin(np.arange(400) / 7.0)
+    monkeypatch.setattr(backtest, "_candles", _candles(closes))
+    monkeypatch.setattr(backtest, "_resampled", {})
+    single = backtest.evaluate_group("1min", 20, [
+        {"order_levels": [1], "order_volumes": [1]}, {"order_levels": [2], "order_volumes": [1]}], 0.001)
+    combined = backtest.evaluate_group("1min", 20, [{"order_levels": [1, 2], "order_volumes": [10, 20]}], 0.001)
+    assert single[0]["fills"] > 0
+    assert combined[0]["pnl"] == pytest.approx(10 * single[0]["pnl"] + 20 * single[1]["pnl"])
+    assert combined[0]["fills"] == single[0]["fills"] + single[1]["fills"]
+
+
+def test_run_reads_an_export(tmp_path):
+    path = str(tmp_path / "candles.npz")
+    np.savez(path, candles=_candles(100 + 10 * np.sin(np.arange(300) / 5.0)))
+    results = backtest.run(path, {"sma_period": [10, 20], "order_levels": [[1]], "order_volumes": [[10]]},
+                           workers=1)
+    assert [result["sma_period"] for result in results] in ([10, 20], [20, 10])
+    assert results[0]["pnl"] >= results[1]["pnl"]
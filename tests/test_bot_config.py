@@ -0,0 +1,93 @@
+import os
+import re
+
+import pytest
+import yaml
+
+from bot_config import BotConfig
+from conftest import CONFIG
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Keys that a running bot picks up: each one is handled by a config subscriber.
+HOT_KEYS = ["log_level", "sma_period", "order_levels", "order_volumes", "ta_min_interval"]
+VALUES = dict(CONFIG, receiver_email="to@example.com", sender_email="from@example.com", password="",
+              server="smtp", port=25)
+
+
+def _sources():
+    for directory, _, names in os.walk(ROOT):
+        if "tests" in directory.split(os.sep):
+            continue
+        for name in names:
+            # The mock server takes command-line options, not the bot configuration.
+            if name.endswith(".py") and name != "kucoin_mock_server.py":
+                with open(os.path.join(directory, name)) as file:
+                    yield file.read()
+
+
+def test_every_key_read_is_hot_applied_or_rejected_on_reload():
+    read = set()
+    handled = set()
+    for source in _sources():
+        read.update(re.findall(r"config(?:\.get\(|\[)\s*[\"']([a-z_0-9]+)[\"']", source))
+        handled.update(re.findall(r"[\"']([a-z_0-9]+)[\"'] in changes", source))
+    assert "sma_period" in read and "book_mode" in read
+    assert sorted(read - set(HOT_KEYS) - set(BotConfig.CONNECTION_KEYS)) == []
+    assert sorted(set(HOT_KEYS) - handled) == []
+    assert not set(HOT_KEYS) & set(BotConfig.CONNECTION_KEYS)
+
+
+@pytest.mark.parametrize("change, message", [
+    ({"sma_period": 0}, "sma_period error"),
+    ({"order_levels": [1, 2]}, "same length"),
+    ({"order_volumes": [10, -1, 25]}, "positive numbers"),
+    ({"candle_length": "2min"}, "candle_length error"),
+    ({"log_level": "LOUD"}, "log_level error"),
+])
+def test_invalid_values_are_rejected(change, message):
+    with pytest.raises(ValueError, match=message):
+        BotConfig(dict(VALUES, **change))
+
+
+def test_missing_required_key():
+    values = dict(VALUES)
+    del values["api_key"]
+    with pytest.raises(ValueError, match="api_key error"):
+        BotConfig(values)
+
+
+def test_strategy_changes_reach_subscribers():
+    config = BotConfig(VALUES)
+    seen = []
+    config.subscribe(seen.append)
+    changes = config.update(dict(VALUES, sma_period=30, order_levels=[1, 2, 4]))
+    assert changes == {"sma_period": 30, "order_levels": [1, 2, 4]}
+    assert seen == [changes]
+    assert config.sma_period == 30
+    assert config.update(dict(config.as_dict())) == {}
+    assert len(seen) == 1
+
+
+@pytest.mark.parametrize("change", [{"api_key": "other"}, {"book_mode": "topk"}, {"checkpoint_path": "x"}])
+def test_start_up_keys_are_rejected(change):
+    config = BotConfig(VALUES)
+    with pytest.raises(ValueError, match="cannot be changed while the bot is running"):
+        config.update(dict(VALUES, sma_period=30, **change))
+    assert config.sma_period == 20
+
+
+def test_reload_follows_the_file(tmp_path):
+    path = tmp_path / "configuration.yaml"
+    path.write_text(yaml.safe_dump(VALUES))
+    config = BotConfig.load(str(path))
+    assert config.reload() == {}
+
+    path.write_text(yaml.safe_dump(dict(VALUES, order_volumes=[5, 5, 5])))
+    os.utime(path, (1, 1))
+    assert config.reload() == {"order_volumes": [5, 5, 5]}
+
+    # A rejected change is logged and the running values are kept.
+    path.write_text(yaml.safe_dump(dict(VALUES, asset="ETH-USDT")))
+    os.utime(path, (2, 2))
+    assert config.reload() == {}
+    assert config["asset"] == "BTC-USDT" and config.order_volumes == [5, 5, 5]
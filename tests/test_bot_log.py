@@ -0,0 +1,81 @@
+import logging
+import queue
+import sys
+
+import pytest
+
+import bot_log
+from bot_log import LogSampler, log_bytes_per_second, setup_logging, shutdown_logging
+
+
+class MutableArgument:
+    def __init__(self):
+        self.value = "before"
+
+    def __str__(self):
+        return self.value
+
+
+@pytest.fixture
+def queued_logging(tmp_path):
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    path = tmp_path / "bot.log"
+    setup_logging({"log_level": "INFO", "log_file": str(path)})
+    yield path
+    shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+    bot_log.BotLog._counter = None
+
+
+def test_message_is_interpolated_on_the_caller(queued_logging):
+    argument = MutableArgument()
+    logging.getLogger("Hot").info("value %s", argument)
+    argument.value = "after"
+    shutdown_logging()
+    assert "Hot INFO value before" in queued_logging.read_text()
+
+
+def test_queued_record_keeps_the_traceback_but_not_the_exception():
+    handler = bot_log._RecordQueueHandler(queue.SimpleQueue())
+    try:
+        raise ValueError("broken")
+    except ValueError:
+        record = logging.getLogger("Hot").makeRecord("Hot", logging.ERROR, __file__, 1, "failed %s", ("here",),
+                                                      sys.exc_info())
+    prepared = handler.prepare(record)
+    assert prepared.msg == "failed here" and prepared.args is None and prepared.exc_info is None
+    assert "ValueError: broken" in logging.Formatter(bot_log.LOG_FORMAT).format(prepared)
+
+
+def test_traceback_is_written_once(queued_logging):
+    try:
+        raise ValueError("broken")
+    except ValueError:
+        logging.getLogger("Hot").exception("failed")
+    shutdown_logging()
+    text = queued_logging.read_text()
+    assert "Hot ERROR failed\nTraceback" in text
+    assert text.count("ValueError: broken") == 1
+
+
+def test_bytes_are_counted_per_logger(queued_logging):
+    logging.getLogger("Chatty").info("x" * 100)
+    logging.getLogger("Quiet").debug("dropped below the level")
+    shutdown_logging()
+    # The formatted line as written to the file, and its newline.
+    assert bot_log.BotLog._counter._bytes == {"Chatty": len(queued_logging.read_text())}
+    rates = log_bytes_per_second()
+    assert set(rates) == {"Chatty"}
+    assert rates["Chatty"] > 0
+    assert log_bytes_per_second() == {}
+
+
+def test_sampler_lets_a_burst_through_and_counts_drops():
+    sampler = LogSampler(per_second=0.001, burst=2)
+    assert [sampler.sample("topic") for _ in range(5)] == [0, 0, None, None, None]
+    assert sampler.sample("other") == 0
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+
+from exchanges.kucoin.kucoin_balances import KucoinBalanceLedger
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+
+
+def _balance_message(available, hold, order_id=None, time_ms=1):
+    data = {"currency": "USDT", "available": str(available), "hold": str(hold), "total": str(available + hold),
+            "relationEvent": "trade.hold", "relationEventId": "event-id", "time": str(time_ms)}
+    if order_id is not None:
+        data["relationContext"] = {"symbol": "BTC-USDT", "orderId": order_id}
+    return data
+
+
+def _seeded_ledger():
+    ledger = KucoinBalanceLedger()
+    ledger.seed("trade", "USDT", {"available": "1000", "holds": "0", "balance": "1000"})
+    return ledger
+
+
+def test_reservation_reduces_spendable():
+    ledger = _seeded_ledger()
+    ledger.reserve("client-1", "spot", "USDT", 300)
+    assert ledger.pending("trade", "USDT") == 300
+    assert ledger.spendable("trade", "USDT") == 700
+
+
+def test_reported_hold_releases_reservation():
+    ledger = _seeded_ledger()
+    ledger.reserve("client-1", "trade", "USDT", 300)
+    ledger.set_order_id("client-1", "order-1")
+    ledger.apply_ws_update(_balance_message(700, 300, order_id="order-1"))
+    assert ledger.pending("trade", "USDT") == 0
+    assert ledger.spendable("trade", "USDT") == 700
+
+
+def test_relation_event_id_is_not_the_order_id():
+    ledger = _seeded_ledger()
+    ledger.reserve("client-1", "trade", "USDT", 300)
+    ledger.set_order_id("client-1", "order-1")
+    message = _balance_message(700, 300)
+    message["relationEventId"] = "order-1"
+    ledger.apply_ws_update(message)
+    assert ledger.pending("trade", "USDT") == 300
+
+
+def test_hold_reported_before_order_id_is_known():
+    ledger = _seeded_ledger()
+    ledger.reserve("client-1", "trade", "USDT", 300)
+    ledger.apply_ws_update(_balance_message(700, 300, order_id="order-1"))
+    assert ledger.pending("trade", "USDT") == 300
+    ledger.set_order_id("client-1", "order-1")
+    assert ledger.pending("trade", "USDT") == 0
+    assert ledger.spendable("trade", "USDT") == 700
+
+
+def test_failed_placement_releases_reservation():
+    ledger = _seeded_ledger()
+    ledger.reserve("client-1", "trade", "USDT", 300)
+    ledger.release("client-1")
+    ledger.release("client-1")
+    assert ledger.pending("trade", "USDT") == 0
+    assert ledger.spendable("trade", "USDT") == 1000
+
+
+def test_late_message_is_ignored():
+    ledger = _seeded_ledger()
+    ledger.apply_ws_update(_balance_message(600, 400, time_ms=20))
+    ledger.apply_ws_update(_balance_message(900, 100, time_ms=10))
+    assert ledger.get("trade", "USDT")["available"] == 600
+
+
+async def _place_and_wait(config, price_offset, until):
+    exchange = KucoinExchange(config)
+    await exchange.initialize_async()
+    await exchange.connect_websocket_client()
+    try:
+        book = exchange.cache()["/market/level2:BTC-USDT"]
+        price = min(book["asks"]) + price_offset
+        results = await asyncio.to_thread(exchange.trade().create_limit_order, "BTC-USDT", "buy", "0.01", str(price))
+        for _ in range(200):
+            await asyncio.sleep(0.05)
+            order = (exchange.cache().get("orders") or {}).get(results["orderId"])
+            if order is not None and until(order):
+                break
+        return exchange.balances(), order
+    finally:
+        await exchange.unsubscribe()
+        await exchange.uninitialize_ws()
+
+
+def test_resting_order_hold_is_not_counted_twice(exchange_config):
+    # Far below the market: the order rests and the exchange reports its hold.
+    ledger, order = asyncio.run(_place_and_wait(exchange_config, -1000, lambda order: order["status"] == "open"))
+    entry = ledger.get("trade", "USDT")
+    assert entry["hold"] > 0
+    assert ledger.pending("trade", "USDT") == 0
+    assert ledger.spendable("trade", "USDT") == entry["available"]
+
+
+def test_filled_order_leaves_nothing_pending(exchange_config):
+    # Through the best ask: the order fills on the next trade.
+    ledger, order = asyncio.run(_place_and_wait(exchange_config, 1, lambda order: order["status"] == "done"))
+    assert order["status"] == "done"
+    assert ledger.pending("trade", "USDT") == 0
+    assert ledger.get("trade", "USDT")["hold"] == 0
+
+
+def test_done_order_event_releases_reservation(exchange_config):
+    exchange = KucoinExchange(exchange_config)
+    exchange.balances().reserve("client-1", "trade", "USDT", 300)
+    exchange.balances().set_order_id("client-1", "order-1")
+    exchange._update_websocket_data_store({"topic": "/spotMarket/tradeOrders", "data": {
+        "symbol": "BTC-USDT", "orderId": "order-1", "clientOid": "client-1", "side": "buy", "orderType": "limit",
+        "type": "canceled", "status": "done", "ts": 1,
+    }})
+    assert exchange.balances().pending("trade", "USDT") == 0
+
+
+def test_concurrent_reservations_keep_totals_consistent():
+    ledger = _seeded_ledger()
+
+    def place(worker):
+        for i in range(2000):
+            ledger.reserve(f"client-{worker}-{i}", "trade", "USDT", 1)
+            ledger.set_order_id(f"client-{worker}-{i}", f"order-{worker}-{i}")
+            ledger.release_order(f"order-{worker}-{i}")
+
+    threads = [threading.Thread(target=place, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(2000):
+        ledger.apply_ws_update(_balance_message(1000, 0, order_id=f"order-0-{i}", time_ms=i))
+    for thread in threads:
+        thread.join()
+    assert ledger.pending("trade", "USDT") == 0
+
+
+def _trade_with_book(config):
+    exchange = KucoinExchange(config)
+    exchange.cache()["/market/level2:BTC-USDT"] = {"sequence": 1, "bids": {99.0: 1.0}, "asks": {100.0: 1.0, 102.0: 2.0}}
+    return exchange, exchange.trade()
+
+
+def test_market_buy_by_size_reserves_its_cost_from_the_book(exchange_config):
+    exchange, trade = _trade_with_book(exchange_config)
+    trade._trade.create_market_order = lambda *args, **kwargs: {"orderId": "order-1"}
+    trade.create_market_order("BTC-USDT", "buy", clientOid="client-1", size="2")
+    # One at 100 and one at 102.
+    assert exchange.balances().pending("trade", "USDT") == 202.0
+
+
+def test_stop_orders_reserve_funds(exchange_config):
+    exchange, trade = _trade_with_book(exchange_config)
+    trade._trade.create_limit_stop_order = lambda *args, **kwargs: {"orderId": "order-1"}
+    trade._trade.create_market_stop_order = lambda *args, **kwargs: {"orderId": "order-2"}
+    trade.create_limit_stop_order("BTC-USDT", "buy", "0.5", "90", "95")
+    trade.create_market_stop_order("BTC-USDT", "sell", "95", size="0.25")
+    assert exchange.balances().pending("trade", "USDT") == 45.0
+    assert exchange.balances().pending("trade", "BTC") == 0.25
+
+
+def test_bulk_orders_keep_only_placed_reservations(exchange_config):
+    exchange, trade = _trade_with_book(exchange_config)
+
+    def create_bulk_orders(symbol, orders):
+        return {"data": [dict(orders[0], id="order-1", status="success"),
+                         dict(orders[1], id="", status="fail", failMsg="insufficient balance")]}
+
+    trade._trade.create_bulk_orders = create_bulk_orders
+    trade.create_bulk_orders("BTC-USDT", [{"side": "buy", "type": "limit", "size": "1", "price": "90"},
+                                          {"side": "buy", "type": "limit", "size": "1", "price": "80"},
+                                          {"side": "sell", "type": "limit", "size": "0.5", "price": "110"}])
+    assert exchange.balances().pending("trade", "USDT") == 90.0
+    assert exchange.balances().pending("trade", "BTC") == 0
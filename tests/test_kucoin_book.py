@@ -0,0 +1,119 @@
+import asyncio
+
+from exchanges.kucoin.kucoin_book import BookLoadMonitor, KucoinBookDepth, apply_changes, apply_depth_snapshot
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+
+TOPIC = "/market/level2:BTC-USDT"
+
+
+def _book(bids, asks, sequence=10):
+    return {"sequence": sequence, "bids": {float(price): 1.0 for price in bids},
+            "asks": {float(price): 1.0 for price in asks}}
+
+
+def _delta(end, bids=(), asks=()):
+    return {"sequenceStart": end, "sequenceEnd": end,
+            "changes": {"bids": [[str(price), str(size), str(end)] for price, size in bids],
+                        "asks": [[str(price), str(size), str(end)] for price, size in asks]}}
+
+
+def test_changes_skip_levels_already_in_the_snapshot():
+    book = _book([100], [101])
+    apply_changes(book, {"sequenceEnd": 12, "changes": {"bids": [["100", "0", "9"], ["99", "2", "11"]],
+                                                        "asks": [["101", "0", "12"]]}})
+    assert book == {"sequence": 12, "bids": {100.0: 1.0, 99.0: 2.0}, "asks": {}}
+
+
+def test_depth_snapshot_replaces_both_sides():
+    book = _book([100, 99], [101])
+    apply_depth_snapshot(book, {"bids": [["98", "1"]], "asks": [["102", "3"]], "timestamp": 5})
+    assert book["bids"] == {98.0: 1.0} and book["asks"] == {102.0: 3.0} and book["time"] == 5
+
+
+def test_reset_keeps_twice_the_depth_and_discards_worse_deltas():
+    depth = KucoinBookDepth(3)
+    book = _book(range(90, 100), range(101, 111))
+    depth.reset(book)
+    assert sorted(book["bids"]) == [94.0, 95.0, 96.0, 97.0, 98.0, 99.0]
+    assert sorted(book["asks"]) == [101.0, 102.0, 103.0, 104.0, 105.0, 106.0]
+
+    apply_changes(book, _delta(11, bids=[(50, 1), (98.5, 1)], asks=[(200, 1)]), depth)
+    assert 50.0 not in book["bids"] and 98.5 in book["bids"] and 200.0 not in book["asks"]
+
+
+def test_trim_is_amortized_over_four_times_the_depth():
+    depth = KucoinBookDepth(3)
+    book = _book(range(90, 100), range(101, 111))
+    depth.reset(book)
+    for sequence, price in enumerate([99.1, 99.2, 99.3, 99.4, 99.5, 99.6], start=11):
+        apply_changes(book, _delta(sequence, bids=[(price, 1)]), depth)
+    assert not depth.trim(book)
+    assert len(book["bids"]) == 12
+    apply_changes(book, _delta(17, bids=[(99.7, 1)]), depth)
+    assert not depth.trim(book)
+    assert sorted(book["bids"]) == [99.2, 99.3, 99.4, 99.5, 99.6, 99.7]
+
+
+def test_side_below_the_depth_asks_for_a_snapshot():
+    depth = KucoinBookDepth(8)
+    book = _book(range(70, 100), range(101, 131))
+    depth.reset(book)
+    # Eight of the sixteen kept bids are removed: the best eight are still known.
+    apply_changes(book, _delta(11, bids=[(price, 0) for price in range(92, 100)]), depth)
+    assert not depth.trim(book)
+    apply_changes(book, _delta(12, bids=[(91, 0)]), depth)
+    assert depth.trim(book)
+
+
+def test_untrimmed_side_never_asks_for_a_snapshot():
+    depth = KucoinBookDepth(8)
+    book = _book([98, 99], range(101, 131))
+    depth.reset(book)
+    assert not depth.trim(book)
+
+
+def test_load_monitor_compares_cpu_time_to_the_window():
+    monitor = BookLoadMonitor(budget=0.5, window_seconds=0.0)
+    monitor.start()
+    sum(range(200000))
+    monitor.stop()
+    assert monitor.over_budget()
+    assert monitor.last_share > 0.5
+
+
+async def _stream(config, seconds=1.5, setup=None):
+    exchange = KucoinExchange(config)
+    if setup is not None:
+        setup(exchange)
+    await exchange.initialize_async()
+    await exchange.connect_websocket_client()
+    try:
+        await asyncio.wait_for(exchange.readiness().wait(), 10)
+        await asyncio.sleep(seconds)
+        return exchange
+    finally:
+        await exchange.unsubscribe()
+        await exchange.uninitialize_ws()
+
+
+def test_topk_book_stays_bounded(exchange_config):
+    exchange = asyncio.run(_stream(dict(exchange_config, book_mode="topk", book_depth=5)))
+    book = exchange.cache()[TOPIC]
+    assert 0 < len(book["bids"]) <= 20 and 0 < len(book["asks"]) <= 20
+    assert max(book["bids"]) < min(book["asks"])
+
+
+def test_depth5_book_follows_snapshots(exchange_config):
+    exchange = asyncio.run(_stream(dict(exchange_config, book_mode="depth5")))
+    book = exchange.cache()[TOPIC]
+    assert len(book["bids"]) == 5 and len(book["asks"]) == 5
+    assert book.get("time")
+
+
+def test_auto_mode_switches_to_depth50_over_budget(exchange_config):
+    def tight_budget(exchange):
+        exchange._book_monitor = BookLoadMonitor(budget=0.0, window_seconds=0.0)
+
+    exchange = asyncio.run(_stream(dict(exchange_config, book_mode="auto"), setup=tight_budget))
+    assert exchange.book_mode() == "depth50"
+    assert "/spotMarket/level2Depth50:BTC-USDT" in exchange._websocket_topics
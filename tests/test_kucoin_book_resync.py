@@ -0,0 +1,94 @@
+import asyncio
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+
+TOPIC = "/market/level2:BTC-USDT"
+
+
+def _delta(start, end, bids=(), asks=()):
+    return {"topic": TOPIC, "data": {"sequenceStart": start, "sequenceEnd": end, "symbol": "BTC-USDT",
+                                     "changes": {"bids": [list(bid) for bid in bids],
+                                                 "asks": [list(ask) for ask in asks]}}}
+
+
+async def _resync_with_failures(config, failures):
+    exchange = KucoinExchange(config)
+    exchange._loop = asyncio.get_running_loop()
+    exchange._BOOK_RESYNC_RETRY_SECONDS = 0.01
+    exchange._initialize_order_book({"results": {"sequence": 10, "bids": {100.0: 1.0}, "asks": {101.0: 1.0}}})
+    attempts = []
+
+    def snapshot():
+        attempts.append(exchange.cache()[TOPIC]["sequence"])
+        if len(attempts) <= failures:
+            return None
+        results = {"sequence": 15, "bids": {100.0: 1.0, 99.0: 4.0}, "asks": {101.0: 1.0}}
+        exchange._initialize_order_book({"results": results})
+        return results
+
+    exchange.market().get_aggregated_orderv3 = snapshot
+    exchange.update_order_book(_delta(11, 11, bids=[("100", "2", "11")]))
+    # 12 and 13 are missed.
+    exchange.update_order_book(_delta(14, 14, bids=[("99", "4", "14")]))
+    exchange.update_order_book(_delta(15, 16, bids=[("98", "3", "16")], asks=[("101", "0", "15")]))
+    for _ in range(200):
+        if not exchange._book_resyncing:
+            break
+        await asyncio.sleep(0.01)
+    return exchange, attempts
+
+
+def test_gap_triggers_snapshot_and_replays_buffer(exchange_config):
+    exchange, attempts = asyncio.run(_resync_with_failures(exchange_config, failures=0))
+    book = exchange.cache()[TOPIC]
+    assert attempts == [11]
+    assert book["sequence"] == 16
+    assert book["bids"] == {100.0: 1.0, 99.0: 4.0, 98.0: 3.0}
+    # The ask removal at 15 is already part of the snapshot and is not applied again.
+    assert book["asks"] == {101.0: 1.0}
+    assert exchange.readiness().is_ready("book")
+
+
+def test_failed_snapshot_keeps_buffering_and_retries(exchange_config):
+    exchange, attempts = asyncio.run(_resync_with_failures(exchange_config, failures=3))
+    book = exchange.cache()[TOPIC]
+    # The stale book is never moved past the gap while snapshots fail.
+    assert attempts == [11, 11, 11, 11]
+    assert book["sequence"] == 16
+    assert book["bids"] == {100.0: 1.0, 99.0: 4.0, 98.0: 3.0}
+
+
+def test_continuing_delta_does_not_resync(exchange_config):
+    async def run():
+        exchange = KucoinExchange(exchange_config)
+        exchange._loop = asyncio.get_running_loop()
+        exchange._initialize_order_book({"results": {"sequence": 10, "bids": {100.0: 1.0}, "asks": {101.0: 1.0}}})
+        exchange.update_order_book(_delta(9, 12, bids=[("100", "0", "10"), ("99", "2", "12")]))
+        return exchange
+
+    exchange = asyncio.run(run())
+    book = exchange.cache()[TOPIC]
+    assert not exchange._book_resyncing
+    assert book["sequence"] == 12
+    assert book["bids"] == {100.0: 1.0, 99.0: 2.0}
+
+
+def test_uninitialize_ws_closes_old_connections(exchange_config):
+    async def run():
+        exchange = KucoinExchange(exchange_config)
+        await exchange.connect_websocket_client()
+        clients = [exchange._ws_client._client, exchange._ws_private_client._client]
+        await asyncio.sleep(0.5)
+        await exchange.uninitialize_ws()
+        received = []
+        for client in clients:
+            client._conn._callback = received.append
+        await asyncio.sleep(0.5)
+        live = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return exchange, clients, received, live
+
+    exchange, clients, received, live = asyncio.run(run())
+    assert not exchange.ws_is_connected()
+    assert all(client._conn._socket.close_code is not None for client in clients)
+    assert received == []
+    assert live == []
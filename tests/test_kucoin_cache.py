@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from exchanges.kucoin.kucoin_cache import KucoinCacheStore, namespace_of
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+
+
+def _orders(count, status):
+    return {f"{status}-{index}": {"id": f"{status}-{index}", "status": status, "price": "100.0" * 10}
+            for index in range(count)}
+
+
+def test_keys_are_grouped_into_namespaces():
+    assert namespace_of("/market/level2:BTC-USDT") == "book"
+    assert namespace_of("/spotMarket/level2Depth5:BTC-USDT") == "book"
+    assert namespace_of("klines") == "candles"
+    assert namespace_of("/market/match:BTC-USDT") == "trades"
+    assert namespace_of("orders") == "orders"
+    assert namespace_of("position") == "balances"
+    assert namespace_of("fees") == "reference"
+
+
+def test_finished_orders_expire_and_open_ones_stay():
+    cache = KucoinCacheStore(max_age={"orders": 10})
+    cache["orders"] = dict(_orders(3, "done"), **_orders(2, "open"))
+    for oid in cache["orders"]:
+        cache.touch(oid)
+    cache._touched["done-0"] -= 60
+    cache._touched["open-0"] -= 60
+    cache.enforce("orders", force=True)
+    assert set(cache["orders"]) == {"done-1", "done-2", "open-0", "open-1"}
+    assert cache.stats()["orders"]["evicted"] == 1
+
+
+def test_least_recently_updated_finished_orders_go_first():
+    cache = KucoinCacheStore()
+    cache["orders"] = dict(_orders(40, "done"), **_orders(10, "open"))
+    for index in range(40):
+        cache.touch(f"done-{index}")
+    cache._budgets["orders"] = cache.size_of("orders") // 2
+    cache.enforce("orders", force=True)
+    remaining = [oid for oid in cache["orders"] if oid.startswith("done")]
+    assert len(remaining) < 40
+    # The survivors are the most recently touched ones.
+    assert remaining == [f"done-{index}" for index in range(40 - len(remaining), 40)]
+    assert all(f"open-{index}" in cache["orders"] for index in range(10))
+    assert cache.size_of("orders") <= cache._budgets["orders"]
+
+
+def test_open_orders_over_budget_are_kept(caplog):
+    cache = KucoinCacheStore(budgets={"orders": 100})
+    cache["orders"] = _orders(5, "open")
+    cache.enforce("orders", force=True)
+    assert len(cache["orders"]) == 5
+    assert "Open orders alone exceed" in caplog.text
+
+
+def test_old_trades_and_candles_are_trimmed():
+    cache = KucoinCacheStore(max_age={"trades": 60})
+    now_ns = time.time() * 1e9
+    cache["/market/match:BTC-USDT"] = [{"time": str(int(now_ns - 120e9))}, {"time": str(int(now_ns))}]
+    cache.enforce("trades", force=True)
+    assert len(cache["/market/match:BTC-USDT"]) == 1
+
+    cache["klines"] = [[minute, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0] for minute in range(100, 0, -1)]
+    cache._budgets["candles"] = cache.size_of("candles") // 4
+    cache.enforce("candles", force=True)
+    # Candles are newest first, so the oldest are cut from the end.
+    assert cache["klines"][0][0] == 100 and 0 < len(cache["klines"]) <= 25
+    assert cache.stats()["candles"]["evicted"] == 100 - len(cache["klines"])
+
+
+def test_reference_entries_are_never_evicted():
+    cache = KucoinCacheStore()
+    cache["fees"] = {"makerFeeRate": "0.001"}
+    cache.enforce("reference", force=True)
+    assert "fees" in cache
+    assert cache.stats()["reference"]["budget"] is None
+
+
+def test_budgets_are_checked_at_most_once_a_second():
+    cache = KucoinCacheStore(max_age={"orders": 10})
+    cache["orders"] = _orders(1, "done")
+    cache.enforce("orders")
+    cache.touch("done-0")
+    cache._touched["done-0"] -= 60
+    cache.enforce("orders")
+    assert "done-0" in cache["orders"]
+    cache.enforce("orders", force=True)
+    assert "done-0" not in cache["orders"]
+
+
+def test_candle_budget_applies_to_the_mock_backfill(exchange_config):
+    async def run():
+        exchange = KucoinExchange(dict(exchange_config, cache_budgets={"candles": 4096}))
+        await exchange.initialize_async()
+        return exchange
+
+    exchange = asyncio.run(run())
+    stats = exchange.cache().stats()["candles"]
+    assert stats["evicted"] > 0 and stats["bytes"] <= 4096
+    assert exchange.cache()["klines"]
@@ -0,0 +1,140 @@
+import asyncio
+import mmap
+import os
+
+from exchanges.kucoin.kucoin_cache import order_done
+from exchanges.kucoin.kucoin_checkpoint import _HEADER, KucoinCheckpoint
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+
+IDENTITY = {"symbol": "BTC-USDT", "account_type": "spot"}
+
+
+def _saved(path, *states, **kwargs):
+    checkpoint = KucoinCheckpoint(str(path), **kwargs)
+    for state in states:
+        checkpoint.save(dict(IDENTITY, **state))
+    checkpoint.close()
+    return checkpoint
+
+
+def test_newest_generation_is_loaded(tmp_path):
+    path = tmp_path / "checkpoint.bin"
+    _saved(path, {"value": 1}, {"value": 2}, {"value": 3})
+    checkpoint = KucoinCheckpoint(str(path))
+    assert checkpoint.load(IDENTITY)["value"] == 3
+    assert checkpoint.stats()["restored_age_seconds"] >= 0
+    # A save after loading continues the generation instead of overwriting the newest slot.
+    checkpoint.save(dict(IDENTITY, value=4))
+    assert checkpoint.stats()["generation"] == 4
+    checkpoint.close()
+    assert KucoinCheckpoint(str(path)).load(IDENTITY)["value"] == 4
+
+
+def test_torn_slot_falls_back_to_the_other_one(tmp_path, caplog):
+    path = tmp_path / "checkpoint.bin"
+    _saved(path, {"value": 1}, {"value": 2})
+    # Generation 2 lives in slot 0; flip a byte of its payload as a write cut short would.
+    with open(path, "r+b") as file:
+        file.seek(_HEADER.size + 5)
+        byte = file.read(1)
+        file.seek(_HEADER.size + 5)
+        file.write(bytes([byte[0] ^ 0xFF]))
+    assert KucoinCheckpoint(str(path)).load(IDENTITY)["value"] == 1
+    assert "torn" in caplog.text
+
+
+def test_large_state_grows_the_slots(tmp_path):
+    path = tmp_path / "checkpoint.bin"
+    initial_size = 2 * 64 * mmap.PAGESIZE
+    checkpoint = _saved(path, {"value": 1})
+    assert os.path.getsize(path) == initial_size
+    payload = "x" * (64 * mmap.PAGESIZE)
+    checkpoint.save(dict(IDENTITY, value=2, payload=payload))
+    checkpoint.save(dict(IDENTITY, value=3))
+    checkpoint.close()
+    assert os.path.getsize(path) == 2 * initial_size
+    assert checkpoint.stats()["slot_bytes"] == initial_size
+    loaded = KucoinCheckpoint(str(path)).load(IDENTITY)
+    assert loaded["value"] == 3
+    assert not os.path.exists(str(path) + ".tmp")
+
+
+def test_checkpoint_of_another_market_or_too_old_is_ignored(tmp_path):
+    path = tmp_path / "checkpoint.bin"
+    _saved(path, {"value": 1})
+    assert KucoinCheckpoint(str(path)).load(dict(IDENTITY, symbol="ETH-USDT")) is None
+    assert KucoinCheckpoint(str(path), max_age=-1).load(IDENTITY) is None
+    assert KucoinCheckpoint(str(path)).load(IDENTITY)["value"] == 1
+
+
+def test_missing_or_garbage_files_load_nothing(tmp_path):
+    assert KucoinCheckpoint(str(tmp_path / "missing.bin")).load() is None
+    path = tmp_path / "garbage.bin"
+    path.write_bytes(b"not a checkpoint" * 10)
+    assert KucoinCheckpoint(str(path)).load() is None
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"\0" * 2 * 64 * mmap.PAGESIZE)
+    assert KucoinCheckpoint(str(empty)).load() is None
+
+
+def test_restart_restores_the_checkpoint(exchange_config, tmp_path):
+    config = dict(exchange_config, checkpoint_path=str(tmp_path / "checkpoint.bin"))
+
+    async def run():
+        exchange = KucoinExchange(config)
+        await exchange.initialize_async()
+        await exchange.connect_websocket_client()
+        try:
+            await asyncio.wait_for(exchange.readiness().wait(), 10)
+            await asyncio.sleep(0.5)
+            # checkpoint_async() copies the state before its first await, so this is what it writes.
+            saved = exchange.checkpoint_state()
+            assert await exchange.checkpoint_async() > 0
+        finally:
+            await exchange.unsubscribe()
+            await exchange.uninitialize_ws()
+        exchange.checkpoint().close()
+
+        restarted = KucoinExchange(config)
+        await restarted.initialize_async()
+        return saved, restarted
+
+    saved, restarted = asyncio.run(run())
+    assert restarted._restored
+    assert restarted.checkpoint().stats()["restored_age_seconds"] < 60
+    klines = restarted.cache()["klines"]
+    assert klines[-1] == saved["klines"][-1]
+    assert restarted.last_price().sequence() >= saved["last_price"]["sequence"]
+    book = restarted.cache()["/market/level2:BTC-USDT"]
+    assert book["sequence"] >= saved["book"]["sequence"]
+
+
+def test_order_canceled_while_stopped_is_not_restored_as_open(exchange_config, tmp_path):
+    config = dict(exchange_config, checkpoint_path=str(tmp_path / "checkpoint.bin"))
+
+    async def run():
+        exchange = KucoinExchange(config)
+        await exchange.initialize_async()
+        await exchange.connect_websocket_client()
+        try:
+            await asyncio.wait_for(exchange.readiness().wait(), 10)
+            price = round(float(exchange.cache()["klines"][0][2]) / 2, 1)
+            placed = await asyncio.to_thread(exchange.trade().create_limit_order, "BTC-USDT", "buy", "0.01", price)
+            # Long enough for the order to be created before the catch-up window of the checkpoint.
+            await asyncio.sleep(8)
+            assert await exchange.checkpoint_async() > 0
+        finally:
+            await exchange.unsubscribe()
+            await exchange.uninitialize_ws()
+        exchange.checkpoint().close()
+        assert placed["orderId"] in exchange.checkpoint_state()["orders"]
+        assert await asyncio.to_thread(exchange.trade().cancel_order, orderId=placed["orderId"])
+
+        restarted = KucoinExchange(config)
+        await restarted.initialize_async()
+        return placed["orderId"], restarted
+
+    order_id, restarted = asyncio.run(run())
+    assert restarted._restored
+    orders = restarted.cache()["orders"]
+    assert order_id not in orders or order_done(orders[order_id])
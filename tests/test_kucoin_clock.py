@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from exchanges.kucoin.kucoin_clock import KucoinClock
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+
+OFFSET_MS = 1500.0
+
+
+def _feed(clock, drift_ppm, seconds=600, step=10, rtts=(0.004, 0.02, 0.05, 0.01)):
+    # Samples from `seconds` ago until now. The server answers at the midpoint of each request.
+    start = time.monotonic() - seconds
+    wall_offset = time.time() - time.monotonic()
+    for index in range(seconds // step):
+        sent = start + index * step
+        received = sent + rtts[index % len(rtts)]
+        midpoint_ms = (sent + received) * 500
+        server_ms = midpoint_ms + wall_offset * 1000 + OFFSET_MS + drift_ppm / 1e6 * (midpoint_ms - start * 1000)
+        clock.add_sample(sent, received, (sent + received) / 2 + wall_offset, server_ms)
+
+
+def test_offset_comes_from_the_fastest_sample():
+    clock = KucoinClock()
+    _feed(clock, drift_ppm=0)
+    stats = clock.stats()
+    assert stats["rtt_ms"] == pytest.approx(4.0)
+    assert stats["offset_ms"] == pytest.approx(OFFSET_MS, abs=0.01)
+    assert stats["drift_ppm"] == pytest.approx(0.0, abs=0.01)
+    assert clock.now_ms() - time.time() * 1000 == pytest.approx(OFFSET_MS, abs=5)
+
+
+def test_drift_is_fitted_over_the_window():
+    clock = KucoinClock(window=64)
+    _feed(clock, drift_ppm=100)
+    assert clock.stats()["drift_ppm"] == pytest.approx(100.0, abs=1.0)
+    # The estimate extrapolates from the last fastest sample with the fitted drift.
+    expected = time.time() * 1000 + OFFSET_MS + 100e-6 * 600 * 1000
+    assert clock.now_ms() == pytest.approx(expected, abs=5)
+
+
+def test_drift_is_clamped_and_needs_a_minute_of_samples():
+    clock = KucoinClock(max_drift_ppm=50)
+    _feed(clock, drift_ppm=1000)
+    assert clock.stats()["drift_ppm"] == pytest.approx(50.0)
+
+    short = KucoinClock()
+    _feed(short, drift_ppm=1000, seconds=50, step=5)
+    assert short.stats()["drift_ppm"] == 0.0
+
+
+def _feed_slow_tail(clock):
+    start = time.monotonic() - 640
+    for index in range(64):
+        sent = start + index * 10
+        # The last third is slow, and the reply spends most of the round trip on the way back.
+        rtt, late = (0.2, 0.09) if index >= 40 else (0.004, 0.0)
+        server_ms = (sent + rtt / 2 - late) * 1000 + OFFSET_MS
+        clock.add_sample(sent, sent + rtt, sent + rtt / 2, server_ms)
+
+
+def test_slow_round_trips_are_left_out_of_the_drift():
+    clock = KucoinClock(window=64)
+    _feed_slow_tail(clock)
+    assert clock.stats()["rtt_ms"] == pytest.approx(4.0)
+    assert clock.stats()["drift_ppm"] == pytest.approx(0.0, abs=0.01)
+
+    unfiltered = KucoinClock(window=64, rtt_factor=100)
+    _feed_slow_tail(unfiltered)
+    assert abs(unfiltered.stats()["drift_ppm"]) > 10
+
+
+def test_unsynced_clock_uses_local_time():
+    clock = KucoinClock(lambda: None)
+    assert not clock.sync()
+    assert not clock.synced()
+    assert clock.now_ms() == pytest.approx(time.time() * 1000, abs=50)
+    assert clock.stats()["offset_ms"] is None
+
+
+def test_sync_against_the_mock(exchange_config):
+    clock = KucoinExchange(exchange_config).clock()
+    assert clock.sync(samples=3)
+    stats = clock.stats()
+    assert stats["samples"] == 3
+    assert abs(stats["offset_ms"]) < 1000
+    assert abs(clock.feed_latency_ms(time.time() * 1000)) < 1000
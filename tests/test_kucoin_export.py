@@ -0,0 +1,57 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from exchanges.kucoin.kucoin_export import KucoinExport
+
+CACHE = {
+    "/market/level2:BTC-USDT": {"sequence": 3, "bids": {99.0: 1.0, 100.0: 2.0}, "asks": {102.0: 1.0, 101.0: 4.0}},
+    "klines": [[120, "2", "3", "4", "1", "10", "30"], [60, "1", "2", "3", "0.5", "5", "10"]],
+    "/market/match:BTC-USDT": [{"sequence": "5", "time": "1000", "price": "100.5", "size": "0.1", "side": "buy",
+                                "tradeId": "t1"}],
+    "orders": {"o1": {"id": "o1", "clientOid": "c1", "side": "sell", "type": "limit", "isActive": True,
+                      "price": "101", "size": "1", "dealSize": "0.5", "createdAt": 7},
+               # Merged from a websocket update, where "type" is the event.
+               "o2": {"id": "o2", "side": "buy", "type": "match", "orderType": "market", "status": "match",
+                      "size": "2", "filledSize": "1", "orderTime": 8}},
+}
+
+
+@pytest.fixture
+def export():
+    return KucoinExport(lambda: CACHE, "BTC-USDT")
+
+
+def test_book_sides_are_best_first(export):
+    assert export.book("bids").tolist() == [(100.0, 2.0), (99.0, 1.0)]
+    assert export.book("asks", depth=1).tolist() == [(101.0, 4.0)]
+
+
+def test_tables(export):
+    candles = export.candles()
+    assert candles["open_time"].tolist() == [120, 60]
+    assert candles["close"].tolist() == [3.0, 2.0]
+    assert export.trades()[0]["price"] == 100.5
+    orders = export.orders()
+    assert (orders[0]["id"], orders[0]["status"], orders[0]["dealSize"]) == ("o1", "open", 0.5)
+    assert orders["type"].tolist() == ["limit", "market"]
+
+
+def test_dump_feather(export, tmp_path):
+    paths = export.dump(str(tmp_path))
+    assert len(paths) == 5 and all(path.endswith(".feather") for path in paths)
+
+
+def test_dump_falls_back_to_npz_without_pyarrow(export, tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    paths = export.dump(str(tmp_path), fmt="parquet")
+    assert len(paths) == 1 and paths[0].endswith(".npz") and os.path.exists(paths[0])
+    with np.load(paths[0]) as archive:
+        assert archive["bids"].tolist() == [(100.0, 2.0), (99.0, 1.0)]
+
+
+def test_dump_rejects_unknown_formats(export, tmp_path):
+    with pytest.raises(ValueError):
+        export.dump(str(tmp_path), fmt="csv")
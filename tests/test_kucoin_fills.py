@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+from exchanges.kucoin.kucoin_fills import KucoinFillsLedger
+
+
+def _fill(trade_id, side, price, size, fee=0.0, fee_currency="USDT", created_at=None, symbol="BTC-USDT"):
+    return {"tradeId": trade_id, "symbol": symbol, "side": side, "price": str(price), "size": str(size),
+            "fee": str(fee), "feeCurrency": fee_currency, "createdAt": created_at or int(trade_id)}
+
+
+def _match(trade_id, side, price, size, liquidity="taker"):
+    return {"type": "match", "symbol": "BTC-USDT", "tradeId": trade_id, "side": side, "matchPrice": str(price),
+            "matchSize": str(size), "liquidity": liquidity, "ts": 1700000000000000000 + int(trade_id)}
+
+
+def test_adding_to_a_position_averages_the_cost():
+    ledger = KucoinFillsLedger("BTC-USDT")
+    assert ledger.apply_rest([_fill("1", "buy", 100, 1), _fill("2", "buy", 110, 3)]) == 2
+    assert ledger.position() == 4
+    assert ledger.average_price() == pytest.approx(107.5)
+    assert ledger.realized_pnl() == 0
+    assert ledger.unrealized_pnl(110) == pytest.approx(10.0)
+
+
+def test_reducing_realizes_against_the_average_cost():
+    ledger = KucoinFillsLedger("BTC-USDT")
+    ledger.apply_rest([_fill("1", "buy", 100, 2), _fill("2", "sell", 120, 0.5)])
+    assert ledger.position() == pytest.approx(1.5)
+    assert ledger.average_price() == pytest.approx(100)
+    assert ledger.realized_pnl() == pytest.approx(10.0)
+    ledger.apply_rest([_fill("3", "sell", 90, 1.5)])
+    assert ledger.position() == 0 and ledger.average_price() == 0
+    assert ledger.realized_pnl() == pytest.approx(-5.0)
+
+
+def test_a_flip_opens_the_remainder_at_the_fill_price():
+    ledger = KucoinFillsLedger("BTC-USDT")
+    ledger.apply_rest([_fill("1", "buy", 100, 1), _fill("2", "sell", 110, 3)])
+    assert ledger.position() == pytest.approx(-2)
+    assert ledger.average_price() == pytest.approx(110)
+    assert ledger.realized_pnl() == pytest.approx(10.0)
+    # Covering the short below its entry is a gain.
+    ledger.apply_rest([_fill("3", "buy", 105, 1)])
+    assert ledger.realized_pnl() == pytest.approx(15.0)
+    assert ledger.unrealized_pnl(100) == pytest.approx(10.0)
+
+
+def test_rest_batches_are_applied_in_trade_order_for_this_symbol():
+    ledger = KucoinFillsLedger("BTC-USDT")
+    added = ledger.apply_rest([_fill("2", "sell", 120, 1), _fill("1", "buy", 100, 1),
+                               _fill("3", "buy", 1, 1, symbol="ETH-USDT")])
+    assert added == 2
+    assert ledger.position() == 0
+    assert ledger.realized_pnl() == pytest.approx(20.0)
+    assert ledger.last_fill_ms() == 2
+
+
+def test_fees_in_the_base_currency_are_valued_at_the_fill_price():
+    ledger = KucoinFillsLedger("BTC-USDT")
+    ledger.apply_rest([_fill("1", "buy", 100, 1, fee=0.001, fee_currency="BTC"), _fill("2", "buy", 100, 1, fee=0.2)])
+    stats = ledger.stats(100)
+    assert stats["fees"] == pytest.approx(0.3)
+    assert stats["fees_by_currency"] == {"BTC": pytest.approx(0.001), "USDT": pytest.approx(0.2)}
+    assert stats["net_pnl"] == pytest.approx(-0.3)
+
+
+def test_estimated_websocket_fee_is_corrected_by_the_rest_fill():
+    ledger = KucoinFillsLedger("BTC-USDT", lambda liquidity: 0.001 if liquidity == "taker" else 0.0005)
+    assert ledger.apply_ws_match(_match("1", "buy", 100, 2))
+    assert ledger.fees() == pytest.approx(0.2)
+    assert not ledger.apply_ws_match(_match("1", "buy", 100, 2))
+    assert ledger.apply_rest([_fill("1", "buy", 100, 2, fee=0.1)]) == 0
+    assert ledger.apply_rest([_fill("1", "buy", 100, 2, fee=0.1)]) == 0
+    stats = ledger.stats()
+    assert stats["fees"] == pytest.approx(0.1)
+    assert stats["fees_by_currency"] == {"USDT": pytest.approx(0.1)}
+    assert stats["position"] == 2 and stats["fills"] == 1
+    assert stats["sources"] == {"ws": 1, "duplicates": 2, "fee_corrections": 1}
+
+
+def test_other_events_are_not_fills():
+    ledger = KucoinFillsLedger("BTC-USDT")
+    assert not ledger.apply_ws_match(dict(_match("1", "buy", 100, 1), type="open"))
+    assert not ledger.apply_ws_match(dict(_match("1", "buy", 100, 1), symbol="ETH-USDT"))
+    assert ledger.stats()["fills"] == 0
+
+
+def test_restored_totals_ignore_fills_already_counted():
+    ledger = KucoinFillsLedger("BTC-USDT", max_trades=2)
+    ledger.apply_rest([_fill("1", "buy", 100, 1), _fill("2", "buy", 120, 1), _fill("3", "sell", 130, 1)])
+    assert ledger.stats()["fills"] == 3
+    snapshot = ledger.snapshot(recent_trades=1)
+
+    restored = KucoinFillsLedger("BTC-USDT")
+    restored.restore(snapshot)
+    assert restored.apply_rest([_fill("3", "sell", 130, 1), _fill("4", "sell", 140, 1)]) == 1
+    assert restored.position() == 0
+    assert restored.realized_pnl() == pytest.approx(20.0 + 30.0)
+    assert restored.stats()["fills"] == 4
+
+
+def test_fill_on_the_mock_reaches_the_ledger(exchange_config):
+    async def run():
+        exchange = KucoinExchange(exchange_config)
+        await exchange.initialize_async()
+        await exchange.connect_websocket_client()
+        try:
+            await asyncio.wait_for(exchange.readiness().wait(), 10)
+            before = exchange.fills().stats()["fills"]
+            book = exchange.cache()["/market/level2:BTC-USDT"]
+            price = min(book["asks"]) + 100
+            await asyncio.to_thread(exchange.trade().create_limit_order, "BTC-USDT", "buy", "0.01", str(price))
+            for _ in range(100):
+                if exchange.fills().stats()["fills"] > before:
+                    break
+                await asyncio.sleep(0.05)
+            return exchange.fills(), before
+        finally:
+            await exchange.unsubscribe()
+            await exchange.uninitialize_ws()
+
+    fills, before = asyncio.run(run())
+    stats = fills.stats()
+    assert stats["fills"] > before
+    assert stats["position"] > 0 and stats["average_price"] > 0
@@ -0,0 +1,98 @@
+import asyncio
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+from exchanges.kucoin.kucoin_latency import KucoinOrderLatency
+
+
+def test_websocket_events_before_the_ack_are_kept():
+    latency = KucoinOrderLatency()
+    latency.submitted("a", "limit", "buy")
+    latency.ws_event({"clientOid": "a", "type": "received", "status": "new"})
+    latency.ws_event({"clientOid": "a", "type": "open", "status": "open"})
+    latency.acknowledged("a")
+    latency.ws_event({"clientOid": "a", "type": "match", "status": "match"})
+    latency.ws_event({"clientOid": "a", "type": "filled", "status": "done"})
+    intervals = latency.stats()["limit/buy"]
+    assert set(intervals) == {"submit_to_ack", "submit_to_received", "ack_to_received", "received_to_open",
+                              "submit_to_open", "submit_to_match", "submit_to_done"}
+    # The websocket beat the REST response here, so ack_to_received is negative.
+    assert intervals["ack_to_received"]["max_ms"] <= 0
+    assert latency.counts()["done"] == 1 and latency.counts()["in_flight"] == 0
+
+
+def test_order_done_before_the_ack_waits_for_it():
+    latency = KucoinOrderLatency()
+    latency.submitted("a", "market", "buy")
+    for event in ({"type": "received", "status": "new"}, {"type": "match", "status": "match"},
+                  {"type": "filled", "status": "done"}):
+        latency.ws_event(dict(event, clientOid="a"))
+    assert latency.stats() == {} and latency.counts()["in_flight"] == 1
+    latency.acknowledged("a")
+    intervals = latency.stats()["market/buy"]
+    assert {"submit_to_ack", "submit_to_received", "submit_to_match", "submit_to_done"} <= set(intervals)
+    assert latency.counts() == {"in_flight": 0, "submitted": 1, "done": 1, "rejected": 0, "expired": 0}
+
+
+def test_done_order_without_an_ack_is_recorded_after_the_grace_period():
+    latency = KucoinOrderLatency(grace=0)
+    latency.submitted("a", "limit", "sell")
+    latency.ws_event({"clientOid": "a", "type": "canceled", "status": "done"})
+    latency.ws_event({"clientOid": "other", "type": "received"})
+    assert list(latency.stats()["limit/sell"]) == ["submit_to_done"]
+    assert latency.counts()["done"] == 1 and latency.counts()["in_flight"] == 0
+
+
+def test_rejected_orders_only_measure_the_rest_path():
+    latency = KucoinOrderLatency()
+    latency.submitted("a", "market", "sell")
+    latency.acknowledged("a", accepted=False)
+    latency.ws_event({"clientOid": "a", "type": "received"})
+    assert list(latency.stats()["market/sell"]) == ["submit_to_ack"]
+    assert latency.counts()["rejected"] == 1
+    assert latency.stats()["market/sell"]["submit_to_ack"]["count"] == 1
+
+
+def test_unknown_orders_and_bodies_are_ignored():
+    latency = KucoinOrderLatency()
+    latency.acknowledged("unknown")
+    latency.ws_event({"clientOid": "unknown", "type": "filled", "status": "done"})
+    latency.ws_event(None)
+    assert latency.stats() == {}
+    assert latency.summary() == "No completed orders."
+
+
+def test_unfinished_orders_expire():
+    latency = KucoinOrderLatency(max_age=0)
+    for index in range(100):
+        latency.submitted(str(index), "limit", "buy")
+    latency.submitted("last", "limit", "buy")
+    latency.ws_event({"clientOid": "last", "type": "received"})
+    counts = latency.counts()
+    assert counts["expired"] == 101 and counts["in_flight"] == 0
+
+
+def test_filled_order_on_the_mock_is_timed(exchange_config):
+    async def run():
+        exchange = KucoinExchange(exchange_config)
+        await exchange.initialize_async()
+        await exchange.connect_websocket_client()
+        try:
+            await asyncio.wait_for(exchange.readiness().wait(), 10)
+            book = exchange.cache()["/market/level2:BTC-USDT"]
+            await asyncio.to_thread(exchange.trade().create_limit_order, "BTC-USDT", "buy", "0.01",
+                                    str(min(book["asks"]) + 100))
+            for _ in range(100):
+                if exchange.order_latency().counts()["done"]:
+                    break
+                await asyncio.sleep(0.05)
+            return exchange.order_latency()
+        finally:
+            await exchange.unsubscribe()
+            await exchange.uninitialize_ws()
+
+    latency = asyncio.run(run())
+    intervals = latency.stats()["limit/buy"]
+    assert intervals["submit_to_ack"]["count"] == 1
+    assert intervals["submit_to_done"]["count"] == 1
+    assert "limit/buy" in latency.summary()
+    assert latency.report_lines()[1] == "Order latency (0 in flight, 1 submitted, 1 done, 0 rejected, 0 expired):"
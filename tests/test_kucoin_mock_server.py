@@ -0,0 +1,43 @@
+import asyncio
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+
+
+def test_exchange_initializes_and_streams_from_the_mock(exchange_config, mock_server):
+    async def run():
+        exchange = KucoinExchange(exchange_config)
+        topics = set()
+        exchange.set_on_message(lambda data, message: topics.add(message["topic"].split(":")[0]))
+        await exchange.initialize_async()
+        await exchange.connect_websocket_client()
+        try:
+            await asyncio.wait_for(exchange.readiness().wait(), 10)
+            await asyncio.sleep(1.5)
+            return exchange, topics
+        finally:
+            await exchange.unsubscribe()
+            await exchange.uninitialize_ws()
+
+    exchange, topics = asyncio.run(run())
+    assert exchange.readiness().pending() == []
+    assert len(exchange.cache()["klines"]) > 0
+    assert exchange.balances().get("trade", "USDT")["available"] == 100000.0
+    book = exchange.cache()["/market/level2:BTC-USDT"]
+    assert book["sequence"] <= mock_server._sequence and max(book["bids"]) < min(book["asks"])
+    assert "/market/level2" in topics
+
+
+def test_private_topics_need_a_private_token(exchange_config):
+    async def run():
+        exchange = KucoinExchange(exchange_config)
+        await exchange.connect_websocket_client()
+        try:
+            private = exchange._ws_private_client.topics()
+            public = exchange._ws_client.topics()
+            return list(private), list(public)
+        finally:
+            await exchange.uninitialize_ws()
+
+    private, public = asyncio.run(run())
+    assert set(private) <= set(KucoinExchange._PRIVATE_TOPICS)
+    assert not set(public) & set(KucoinExchange._PRIVATE_TOPICS)
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+from exchanges.kucoin.kucoin_paginator import KucoinPaginator
+from exchanges.kucoin.kucoin_scheduler import KucoinRequestScheduler
+
+
+class _Endpoint:
+    def __init__(self, total, delay=0.0):
+        self.total = total
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, currentPage, pageSize, **kwargs):
+        with self._lock:
+            self.calls.append((currentPage, pageSize, kwargs))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        start = (currentPage - 1) * pageSize
+        items = [{"id": index} for index in range(start, min(start + pageSize, self.total))]
+        return {"currentPage": currentPage, "totalNum": self.total, "totalPage": -(-self.total // pageSize),
+                "items": items}
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = KucoinRequestScheduler(requests_per_second=1000, workers=8)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_every_page_is_read_with_bounded_concurrency(scheduler):
+    endpoint = _Endpoint(total=95, delay=0.02)
+    result = KucoinPaginator(scheduler, page_size=10, concurrency=3).fetch(endpoint, status="done")
+    assert result["totalNum"] == 95 and result["totalPage"] == 10 and result["pages"] == 10
+    assert sorted(item["id"] for item in result["items"]) == list(range(95))
+    assert endpoint.calls[0][0] == 1
+    assert sorted(call[0] for call in endpoint.calls) == list(range(1, 11))
+    assert all(call[1] == 10 and call[2] == {"status": "done"} for call in endpoint.calls)
+    assert endpoint.max_in_flight <= 3
+
+
+def test_pages_go_to_on_page_as_they_arrive(scheduler):
+    pages = {}
+    result = KucoinPaginator(scheduler, page_size=4).fetch(_Endpoint(total=10), on_page=pages.__setitem__)
+    assert result["items"] is None and result["count"] == 10
+    assert sorted(pages) == [1, 2, 3]
+    assert [len(pages[page]) for page in (1, 2, 3)] == [4, 4, 2]
+
+
+def test_max_pages_and_stats(scheduler):
+    endpoint = _Endpoint(total=100)
+    paginator = KucoinPaginator(scheduler, page_size=10, max_pages=2)
+    result = paginator.fetch(endpoint, pageSize=5)
+    assert result["pages"] == 2 and result["count"] == 10
+    (stats,) = paginator.stats().values()
+    assert stats["fetches"] == 1 and stats["pages"] == 2 and stats["items"] == 10
+
+
+def test_failed_first_page_reads_nothing_more(scheduler):
+    result = KucoinPaginator(scheduler).fetch(lambda currentPage, pageSize: None)
+    assert result["pages"] == 1 and result["count"] == 0 and result["items"] == []
+
+
+def test_order_history_pages_through_the_mock(exchange_config):
+    exchange = KucoinExchange(dict(exchange_config, history_page_size=2, history_concurrency=2))
+    trade = exchange.trade()
+    created = [trade.create_limit_order("BTC-USDT", "buy", "0.01", str(1000 + index))["orderId"]
+               for index in range(5)]
+    result = trade.get_order_history(status="active")
+    assert result["totalNum"] == 5 and result["pages"] == 3
+    assert set(created) <= set(exchange.cache()["orders"])
+
+    since_ms = max(order["createdAt"] for order in exchange.cache()["orders"].values())
+    assert trade.get_order_history(status="active", startAt=since_ms)["count"] >= 1
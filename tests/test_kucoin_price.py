@@ -0,0 +1,85 @@
+import asyncio
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+from exchanges.kucoin.kucoin_price import KucoinLastPrice
+
+
+def _ticker(sequence, price, time_ms=1700000000000):
+    return {"sequence": str(sequence), "price": str(price), "time": time_ms}
+
+
+def _match(sequence, price, time_ns=1700000000001000000):
+    return {"sequence": str(sequence), "price": str(price), "time": str(time_ns)}
+
+
+def test_newest_sequence_wins_across_topics():
+    price = KucoinLastPrice()
+    assert price.update(_match(11, 101.5), "match")
+    # The ticker summarizing trade 10 arrives after the match of trade 11.
+    assert not price.update(_ticker(10, 100.0), "ticker")
+    assert price.price() == 101.5
+    assert price.exchange_time_ms() == 1700000000001
+    assert price.update(_ticker(12, 102.0), "ticker")
+    assert price.exchange_time_ms() == 1700000000000
+    assert price.stats()["updates"] == {"ticker": 1, "match": 1, "stale": 1}
+
+
+def test_malformed_updates_are_ignored():
+    price = KucoinLastPrice()
+    assert not price.update({"price": "1"}, "ticker")
+    assert not price.update({"sequence": "1", "price": "n/a"}, "ticker")
+    assert price.price() is None and price.staleness() is None
+
+
+def test_callback_only_on_a_changed_price():
+    changes = []
+    price = KucoinLastPrice(on_change=lambda new, old: changes.append((new, old)))
+    price.update(_ticker(1, 100), "ticker")
+    price.update(_match(2, 100), "match")
+    price.update(_match(3, 99), "match")
+    assert changes == [(100.0, None), (99.0, 100.0)]
+
+    price.set_on_change(lambda new, old: 1 / 0)
+    assert price.update(_match(4, 98), "match")
+    assert price.price() == 98.0
+
+
+def test_restored_price_yields_to_newer_trades_only():
+    price = KucoinLastPrice()
+    price.restore(100.0, 50, 1700000000000)
+    assert price.stats()["source"] == "checkpoint" and price.staleness() is None
+    assert not price.update(_ticker(49, 90), "ticker")
+    assert price.update(_ticker(51, 101), "ticker")
+    assert price.price() == 101.0
+
+
+def test_decisions_record_the_price_age():
+    price = KucoinLastPrice()
+    assert price.decision() is None
+    assert price.stats()["decisions"] == 0
+    price.update(_ticker(1, 100), "ticker")
+    assert price.decision() == 100.0
+    stats = price.stats()
+    assert stats["decisions"] == 1 and stats["p99_decision_ms"] >= 0.0
+    assert price.report_lines()[0] == "Last price: 100.0"
+
+
+def test_exchange_tracks_the_price_from_the_mock(exchange_config):
+    async def run():
+        exchange = KucoinExchange(exchange_config)
+        await exchange.initialize_async()
+        await exchange.connect_websocket_client()
+        try:
+            await asyncio.wait_for(exchange.readiness().wait(), 10)
+            for _ in range(100):
+                if exchange.last_price().price() is not None:
+                    break
+                await asyncio.sleep(0.05)
+            return exchange.last_price()
+        finally:
+            await exchange.unsubscribe()
+            await exchange.uninitialize_ws()
+
+    price = asyncio.run(run())
+    assert price.price() > 0
+    assert price.stats()["source"] in ("ticker", "match")
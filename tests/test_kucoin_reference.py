@@ -0,0 +1,70 @@
+import threading
+import time
+
+from exchanges.kucoin.kucoin_reference import KucoinReferenceData
+
+
+class Fetcher:
+    def __init__(self, data):
+        self.data = data
+        self.calls = 0
+        self.called = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.called.set()
+        return self.data
+
+
+def test_missing_entry_is_fetched_once(tmp_path):
+    reference = KucoinReferenceData(str(tmp_path / "reference.json"))
+    fetch = Fetcher(["BTC", "USDT"])
+    assert reference.get("currencies", fetch) == ["BTC", "USDT"]
+    assert reference.get("currencies", fetch) == ["BTC", "USDT"]
+    assert fetch.calls == 1
+
+
+def test_stale_entry_is_served_while_refreshed(tmp_path):
+    reference = KucoinReferenceData(str(tmp_path / "reference.json"), ttls={"fiat_price": 0})
+    reference.put("fiat_price:USD", {"BTC": "1"})
+    fetch = Fetcher({"BTC": "2"})
+    assert reference.get("fiat_price:USD", fetch) == {"BTC": "1"}
+    assert fetch.called.wait(5)
+    for _ in range(100):
+        if reference.peek("fiat_price:USD") == {"BTC": "2"}:
+            break
+        time.sleep(0.01)
+    assert reference.peek("fiat_price:USD") == {"BTC": "2"}
+
+
+def test_failed_fetch_is_not_cached(tmp_path):
+    reference = KucoinReferenceData(str(tmp_path / "reference.json"))
+    assert reference.get("symbols", Fetcher(None)) is None
+    assert reference.peek("symbols") is None
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "reference.json")
+    KucoinReferenceData(path).get("markets", Fetcher(["USDS", "BTC"]))
+    fetch = Fetcher(None)
+    assert KucoinReferenceData(path).get("markets", fetch) == ["USDS", "BTC"]
+    assert fetch.calls == 0
+
+
+def test_unreadable_file_is_ignored(tmp_path):
+    path = tmp_path / "reference.json"
+    path.write_text("{not json")
+    assert KucoinReferenceData(str(path)).peek("markets") is None
+
+
+def test_concurrent_saves_keep_every_entry(tmp_path):
+    path = str(tmp_path / "reference.json")
+    reference = KucoinReferenceData(path)
+    threads = [threading.Thread(target=reference.put, args=(f"fiat_price:{i}", i)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    restored = KucoinReferenceData(path)
+    assert [restored.peek(f"fiat_price:{i}") for i in range(20)] == list(range(20))
+    assert [file.name for file in tmp_path.iterdir()] == ["reference.json"]
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from exchanges.kucoin.kucoin_scheduler import (PRIORITY_ACCOUNT_READ, PRIORITY_CANCEL, PRIORITY_MARKET_READ,
+                                               PRIORITY_PLACE, KucoinRequestScheduler, StaleRequestError)
+
+
+class Client:
+    def __init__(self):
+        self.calls = []
+
+    def read(self, name):
+        self.calls.append(name)
+        return name
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = KucoinRequestScheduler(requests_per_second=1000, workers=1)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def _block(scheduler):
+    # Occupies the only worker until the returned event is set.
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit(PRIORITY_CANCEL, blocker)
+    started.wait(5)
+    return release
+
+
+def test_dispatches_by_priority(scheduler):
+    order = []
+    release = _block(scheduler)
+    futures = [scheduler.submit(priority, order.append, name) for priority, name in [
+        (PRIORITY_MARKET_READ, "market"), (PRIORITY_ACCOUNT_READ, "account"), (PRIORITY_PLACE, "place"),
+        (PRIORITY_CANCEL, "cancel")]]
+    release.set()
+    for future in futures:
+        future.result(5)
+    assert order == ["cancel", "place", "account", "market"]
+
+
+def test_identical_reads_are_coalesced(scheduler):
+    client = Client()
+    release = _block(scheduler)
+    first = scheduler.submit(PRIORITY_MARKET_READ, client.read, "book", coalesce=True)
+    second = scheduler.submit(PRIORITY_MARKET_READ, client.read, "book", coalesce=True)
+    other = scheduler.submit(PRIORITY_MARKET_READ, client.read, "ticker", coalesce=True)
+    release.set()
+    assert first is second
+    assert first.result(5) == "book" and other.result(5) == "ticker"
+    assert client.calls == ["book", "ticker"]
+    assert scheduler.stats()["market_read"]["coalesced"] == 1
+
+
+def test_reads_of_different_clients_are_not_coalesced(scheduler):
+    clients = [Client(), Client()]
+    release = _block(scheduler)
+    futures = [scheduler.submit(PRIORITY_ACCOUNT_READ, client.read, "accounts", coalesce=True) for client in clients]
+    release.set()
+    assert futures[0] is not futures[1]
+    for future in futures:
+        future.result(5)
+    assert [client.calls for client in clients] == [["accounts"], ["accounts"]]
+
+
+def test_finished_read_is_not_reused(scheduler):
+    client = Client()
+    resubmitted = []
+    first = scheduler.submit(PRIORITY_MARKET_READ, client.read, "book", coalesce=True)
+    # Waiters woken by the result may issue the same read straight away.
+    first.add_done_callback(lambda future: resubmitted.append(
+        scheduler.submit(PRIORITY_MARKET_READ, client.read, "book", coalesce=True)))
+    first.result(5)
+    for _ in range(100):
+        if resubmitted:
+            break
+        time.sleep(0.01)
+    assert resubmitted[0] is not first
+    resubmitted[0].result(5)
+    assert client.calls == ["book", "book"]
+
+
+def test_stale_read_is_dropped(scheduler):
+    client = Client()
+    release = _block(scheduler)
+    read = scheduler.submit(PRIORITY_MARKET_READ, client.read, "book", deadline=0.01)
+    place = scheduler.submit(PRIORITY_PLACE, client.read, "order", deadline=0.01)
+    time.sleep(0.05)
+    release.set()
+    with pytest.raises(StaleRequestError):
+        read.result(5)
+    # A placement only expires when the caller gives it a deadline.
+    with pytest.raises(StaleRequestError):
+        place.result(5)
+    assert client.calls == []
+    assert scheduler.stats()["market_read"]["dropped"] == 1
+
+
+def test_cancels_and_placements_never_expire_by_default():
+    scheduler = KucoinRequestScheduler(requests_per_second=1000, workers=1, read_deadline=0.01)
+    try:
+        client = Client()
+        release = _block(scheduler)
+        place = scheduler.submit(PRIORITY_PLACE, client.read, "order")
+        read = scheduler.submit(PRIORITY_MARKET_READ, client.read, "book")
+        time.sleep(0.05)
+        release.set()
+        assert place.result(5) == "order"
+        with pytest.raises(StaleRequestError):
+            read.result(5)
+    finally:
+        scheduler.shutdown()
+
+
+def test_rate_limit():
+    scheduler = KucoinRequestScheduler(requests_per_second=20, workers=4)
+    try:
+        started = time.monotonic()
+        futures = [scheduler.submit(PRIORITY_MARKET_READ, time.time) for _ in range(30)]
+        for future in futures:
+            future.result(5)
+        # The bucket starts full (20 tokens); the other 10 requests wait for new ones.
+        assert time.monotonic() - started >= 0.4
+    finally:
+        scheduler.shutdown()
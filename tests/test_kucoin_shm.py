@@ -0,0 +1,121 @@
+import asyncio
+import math
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import pytest
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+from exchanges.kucoin.kucoin_shm import (_OWNER, _SEQ, STALE_SECONDS, KucoinSharedPublisher, KucoinSharedReader,
+                                         book_features)
+
+TOPIC = "/market/level2:BTC-USDT"
+
+
+@pytest.fixture
+def segments():
+    name = "test_" + uuid.uuid4().hex[:8]
+    publisher = KucoinSharedPublisher(name, depth=3, candles=2)
+    reader = KucoinSharedReader(name)
+    yield publisher, reader
+    reader.close()
+    publisher.close()
+
+
+def test_book_round_trip(segments):
+    publisher, reader = segments
+    publisher.publish_book({"sequence": 7, "bids": {99.0: 1.0, 98.0: 2.0, 97.0: 3.0, 96.0: 4.0},
+                            "asks": {101.0: 3.0}})
+    book = reader.book()
+    assert book["sequence"] == 7
+    assert book["bids"] == [(99.0, 1.0), (98.0, 2.0), (97.0, 3.0)]
+    assert book["asks"] == [(101.0, 3.0)]
+    assert book["mid"] == 100.0 and book["spread"] == 2.0
+    assert book["imbalance"] == -0.5
+    assert book["microprice"] == pytest.approx((101.0 * 1.0 + 99.0 * 3.0) / 4.0)
+
+
+def test_every_publish_changes_the_version(segments):
+    publisher, reader = segments
+    first = reader.version()
+    publisher.publish_book({"sequence": 1, "bids": {}, "asks": {}})
+    second = reader.version()
+    assert second[0] == first[0] + 2 and second[1] == first[1]
+    assert math.isnan(reader.book()["mid"])
+
+
+def test_candles_are_capped_to_capacity(segments):
+    publisher, reader = segments
+    klines = [[3, 1, 2, 3, 0.5, 10, 20], [2, 1, 1, 1, 1, 1, 1], [1, 1, 1, 1, 1, 1, 1]]
+    publisher.publish_candles(klines)
+    assert reader.candles() == [[3, 1.0, 2.0, 3.0, 0.5, 10.0, 20.0], [2, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0]]
+
+
+def test_features_without_a_side():
+    assert all(math.isnan(value) for value in book_features([], [(1.0, 1.0)]))
+
+
+def test_full_book_publishes_are_rate_limited(exchange_config):
+    async def run():
+        exchange = KucoinExchange(dict(exchange_config, shm_publish=True, shm_name="test_" + uuid.uuid4().hex[:8],
+                                       shm_interval=0.05))
+        exchange._loop = asyncio.get_running_loop()
+        published = []
+        publish_book = exchange._shm.publish_book
+        exchange._shm.publish_book = lambda book: (published.append(book["sequence"]), publish_book(book))
+        try:
+            exchange._initialize_order_book({"results": {"sequence": 10, "bids": {99.0: 1.0}, "asks": {101.0: 1.0}}})
+            for sequence in range(11, 31):
+                exchange.update_order_book({"topic": TOPIC, "data": {
+                    "sequenceStart": sequence, "sequenceEnd": sequence,
+                    "changes": {"bids": [["99", str(sequence), str(sequence)]], "asks": []}}})
+            during = list(published)
+            await asyncio.sleep(0.1)
+            return during, published
+        finally:
+            exchange.close_shared_memory()
+
+    during, published = asyncio.run(run())
+    assert during == [10, 11]
+    # The latest state is published once the interval has passed.
+    assert published == [10, 11, 30]
+
+
+def test_segment_of_a_live_publisher_is_not_taken_over(segments):
+    publisher, reader = segments
+    name = publisher._book.name[:-len("_book")]
+    with pytest.raises(FileExistsError, match=str(os.getpid())):
+        KucoinSharedPublisher(name, depth=3, candles=2)
+    # The live publisher's segments are untouched.
+    publisher.publish_book({"sequence": 3, "bids": {99.0: 1.0}, "asks": {101.0: 1.0}})
+    assert reader.book()["sequence"] == 3
+
+
+def test_segment_of_a_crashed_publisher_is_replaced():
+    name = "test_" + uuid.uuid4().hex[:8]
+    crashed = KucoinSharedPublisher(name, depth=3, candles=2)
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    for segment in (crashed._book, crashed._candles):
+        # Owned by a process that no longer exists.
+        _OWNER.pack_into(segment.buf, _SEQ.size, int(exited.stdout), time.time())
+        segment.close()
+    publisher = KucoinSharedPublisher(name, depth=3, candles=2)
+    try:
+        publisher.publish_book({"sequence": 5, "bids": {99.0: 1.0}, "asks": {101.0: 1.0}})
+        reader = KucoinSharedReader(name)
+        assert reader.book()["sequence"] == 5
+        reader.close()
+    finally:
+        publisher.close()
+
+
+def test_segment_without_a_recent_heartbeat_is_stale():
+    name = "test_" + uuid.uuid4().hex[:8]
+    quiet = KucoinSharedPublisher(name, depth=3, candles=2)
+    for segment in (quiet._book, quiet._candles):
+        _OWNER.pack_into(segment.buf, _SEQ.size, os.getpid(), time.time() - STALE_SECONDS - 1)
+        segment.close()
+    KucoinSharedPublisher(name, depth=3, candles=2).close()
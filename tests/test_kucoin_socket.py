@@ -0,0 +1,71 @@
+import asyncio
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+from exchanges.kucoin.kucoin_socket import KucoinSocket
+
+TOPIC = "/market/level2:BTC-USDT"
+
+
+def test_dropped_connection_reconnects_and_resyncs(exchange_config, mock_server):
+    async def run():
+        exchange = KucoinExchange(exchange_config)
+        resyncs = []
+        resync_async = exchange.resync_async
+
+        async def resync():
+            resyncs.append(exchange.cache()[TOPIC]["sequence"])
+            await resync_async()
+
+        exchange.resync_async = resync
+        await exchange.initialize_async()
+        await exchange.connect_websocket_client()
+        try:
+            await asyncio.wait_for(exchange.readiness().wait(), 10)
+            # The close handshake needs this loop, so the blocking call runs in a thread.
+            await asyncio.to_thread(mock_server.drop_connections)
+            for _ in range(100):
+                if len(resyncs) >= 2:
+                    break
+                await asyncio.sleep(0.1)
+            sequence = exchange.cache()[TOPIC]["sequence"]
+            await asyncio.sleep(1.5)
+            reconnects = [exchange._ws_client.reconnects, exchange._ws_private_client.reconnects]
+            return exchange, resyncs, reconnects, sequence
+        finally:
+            await exchange.unsubscribe()
+            await exchange.uninitialize_ws()
+
+    exchange, resyncs, reconnects, sequence = asyncio.run(run())
+    # One resync per reconnected socket, and the book streams again on the new connection.
+    assert reconnects == [1, 1]
+    assert len(resyncs) == 2
+    assert exchange.cache()[TOPIC]["sequence"] > sequence
+
+
+def test_close_reports_tasks_that_do_not_end(exchange_config, monkeypatch):
+    async def run():
+        exchange = KucoinExchange(exchange_config)
+        socket = await KucoinSocket(exchange._token, exchange._receive_ws_message).open()
+        await socket.subscribe(TOPIC)
+        release = asyncio.Event()
+
+        async def ignores_cancellation():
+            while not release.is_set():
+                try:
+                    await release.wait()
+                except asyncio.CancelledError:
+                    pass
+
+        stuck = asyncio.ensure_future(ignores_cancellation())
+        await asyncio.sleep(0)
+        tasks = KucoinSocket._connection_tasks(socket._client._conn) + [stuck]
+        monkeypatch.setattr(KucoinSocket, "CLOSE_TIMEOUT", 0.2)
+        monkeypatch.setattr(KucoinSocket, "_connection_tasks", staticmethod(lambda connection: tasks))
+        closed = await socket.close()
+        release.set()
+        await asyncio.gather(stuck, return_exceptions=True)
+        return closed, socket.topics()
+
+    closed, topics = asyncio.run(run())
+    assert closed is False
+    assert topics == []
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+from exchanges.kucoin.kucoin_subaccounts import KucoinSubAccounts
+
+KEYS = {"strategy-a": {"api_key": "a", "api_secret": "a", "api_passphrase": "a"}}
+
+
+@pytest.fixture
+def exchange(exchange_config):
+    return KucoinExchange(dict(exchange_config, sub_accounts=True, sub_account_keys=KEYS))
+
+
+def test_discovery_reads_every_balance_at_once(exchange):
+    sub_accounts = exchange.sub_accounts()
+    asyncio.run(sub_accounts.refresh())
+    view = sub_accounts.view()
+    assert set(view) == {"strategy-a", "strategy-b"}
+    assert view["strategy-a"]["balances"]["trade"]["USDT"]["total"] == pytest.approx(50000)
+    assert view["strategy-b"]["balances"]["trade"]["USDT"]["total"] == pytest.approx(100000 / 3)
+    # Only the sub-account with a key has its open orders listed.
+    assert view["strategy-a"]["orders_at"] is not None and view["strategy-b"]["orders_at"] is None
+    stats = sub_accounts.stats()
+    assert stats["sub_accounts"] == 2 and stats["refreshes"] == 1 and stats["stale"] == []
+
+
+def test_open_orders_count_towards_exposure(exchange):
+    order_id = exchange.trade().create_limit_order("BTC-USDT", "buy", "0.5", "1000")["orderId"]
+    sub_accounts = exchange.sub_accounts()
+    asyncio.run(sub_accounts.refresh())
+    assert order_id in sub_accounts.view()["strategy-a"]["orders"]
+    exposure = sub_accounts.exposure()
+    assert exposure["sub_accounts"]["strategy-a"]["open_buy_funds"] == pytest.approx(500)
+    assert exposure["sub_accounts"]["strategy-b"]["open_buy_funds"] == 0
+    total = exposure["total"]
+    assert total["quote"] == pytest.approx(sum(values["quote"] for values in exposure["sub_accounts"].values()))
+    # No trade has been seen yet, so there is no price to value the balances at.
+    assert total["value"] is None
+
+
+def test_failed_refresh_keeps_the_last_data_and_marks_it_stale(exchange, monkeypatch):
+    sub_accounts = exchange.sub_accounts()
+    asyncio.run(sub_accounts.refresh())
+    before = sub_accounts.view()["strategy-b"]["balances"]
+    monkeypatch.setattr(exchange.account(), "get_sub_account", lambda sub_user_id: None)
+    asyncio.run(sub_accounts.refresh())
+    stats = sub_accounts.stats()
+    assert set(stats["stale"]) == {"strategy-a", "strategy-b"}
+    assert stats["errors"] == {"strategy-a": 1, "strategy-b": 1}
+    assert sub_accounts.view()["strategy-b"]["balances"] == before
+
+
+def test_removed_sub_accounts_are_dropped_on_discovery(exchange_config, mock_server):
+    exchange = KucoinExchange(dict(exchange_config, sub_accounts=True))
+    sub_accounts = KucoinSubAccounts(dict(exchange_config), exchange.account(), exchange.scheduler(),
+                                     exchange.last_price().price, discover_every=1)
+    asyncio.run(sub_accounts.refresh())
+    mock_server.sub_accounts.remove("strategy-b")
+    asyncio.run(sub_accounts.refresh())
+    assert set(sub_accounts.view()) == {"strategy-a"}
+    assert sub_accounts.stats()["refreshes"] == 2
+
+
+def test_value_uses_the_last_price(exchange_config):
+    exchange = KucoinExchange(exchange_config)
+    sub_accounts = KucoinSubAccounts(dict(exchange_config), exchange.account(), exchange.scheduler(),
+                                     lambda: 20000.0)
+    asyncio.run(sub_accounts.refresh())
+    for values in sub_accounts.exposure()["sub_accounts"].values():
+        assert values["value"] == pytest.approx(values["base"] * 20000.0 + values["quote"])
+    unpriced = KucoinSubAccounts(dict(exchange_config), exchange.account(), exchange.scheduler())
+    asyncio.run(unpriced.refresh())
+    assert unpriced.exposure()["total"]["value"] is None
+
+
+def test_refreshes_do_not_overlap(exchange):
+    sub_accounts = exchange.sub_accounts()
+
+    async def run():
+        await asyncio.gather(sub_accounts.refresh(), sub_accounts.refresh())
+
+    asyncio.run(run())
+    assert sub_accounts.stats()["refreshes"] == 1
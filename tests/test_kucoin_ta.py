@@ -0,0 +1,19 @@
+import numpy as np
+
+from exchanges.kucoin.kucoin_ta import bollinger_bands
+
+
+def test_bands_match_a_rolling_window():
+    close = np.array([10.0, 11.0, 13.0, 12.0, 15.0, 14.0])
+    bands = bollinger_bands(close, 3, [1, 2])
+    assert bands.shape == (6, 2, 2)
+    assert np.isnan(bands[:2]).all()
+    for row in range(2, 6):
+        window = close[row - 2:row + 1]
+        for column, level in enumerate([1, 2]):
+            assert np.allclose(bands[row, column], [window.mean() + level * window.std(),
+                                                    window.mean() - level * window.std()])
+
+
+def test_fewer_candles_than_the_period():
+    assert np.isnan(bollinger_bands(np.array([1.0, 2.0]), 3, [1])).all()
@@ -0,0 +1,142 @@
+import asyncio
+import email
+
+import pytest
+
+from conftest import _free_port
+from mailer import Mailer
+
+CONFIG = {"receiver_email": "to@example.com", "sender_email": "from@example.com", "password": "", "server": "smtp",
+          "port": 25}
+
+
+async def _send_alerts(alerts):
+    mailer = Mailer(CONFIG, window=0.2)
+    sent = []
+
+    async def send(subject, body):
+        sent.append((subject, body))
+
+    mailer._send = send
+    for alert in alerts:
+        mailer.alert(*alert)
+    await asyncio.sleep(0)
+    await mailer.stop()
+    return mailer, sent
+
+
+def test_alerts_of_one_window_are_sent_together():
+    mailer, sent = asyncio.run(_send_alerts([("Error", "first"), ("Warning", "second")]))
+    assert sent == [("Error (+1 more)", "Error\nfirst\n\nWarning\nsecond")]
+    assert mailer.sent == 1
+
+
+def test_repeated_alerts_are_folded_into_a_count():
+    mailer, sent = asyncio.run(_send_alerts([("Error", "socket closed", "socket")] * 3))
+    assert len(sent) == 1
+    assert sent[0][0] == "Error"
+    assert "repeated 3 times" in sent[0][1]
+    assert mailer.deduplicated == 2
+
+
+def test_alert_without_event_loop_is_dropped():
+    mailer = Mailer(CONFIG)
+    mailer.alert("Error", "no loop")
+    assert mailer.sent == 0
+
+
+def test_starttls_defaults_to_the_submission_port():
+    assert Mailer(dict(CONFIG, port=587)).start_tls
+    assert not Mailer(CONFIG).start_tls
+    assert Mailer(dict(CONFIG, smtp_starttls=True)).start_tls
+
+
+def test_daily_report_is_built_from_registered_sections():
+    async def send_report():
+        mailer = Mailer(CONFIG, window=0.2)
+        sent = []
+
+        async def send(subject, body):
+            sent.append((subject, body))
+
+        mailer._send = send
+        mailer.report().register("first", lambda: ["Balances: 1"])
+        mailer.report().register("second", lambda: ["Cache: 2"])
+        mailer.send_daily_report()
+        await mailer.stop()
+        return sent
+
+    sent = asyncio.run(send_report())
+    assert len(sent) == 1
+    assert sent[0][1].splitlines()[-2:] == ["Balances: 1", "Cache: 2"]
+
+
+class Inbox:
+    # An aiosmtpd handler that keeps the messages it accepts and rejects the first `reject` ones.
+    def __init__(self, reject=0):
+        self.messages = []
+        self.reject = reject
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reject:
+            self.reject -= 1
+            return "554 Transaction failed"
+        self.messages.append(email.message_from_bytes(envelope.content))
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server():
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    pytest.importorskip("aiosmtplib")
+    controllers = []
+
+    def start(inbox):
+        controller = controller_module.Controller(inbox, hostname="127.0.0.1", port=_free_port())
+        controller.start()
+        controllers.append(controller)
+        return dict(CONFIG, server="127.0.0.1", port=controller.port)
+
+    yield start
+    for controller in controllers:
+        controller.stop()
+
+
+async def _deliver(config, alerts, rounds=1):
+    mailer = Mailer(config, window=0.2)
+    for _ in range(rounds):
+        for alert in alerts:
+            mailer.alert(*alert)
+        await mailer.stop()
+    return mailer
+
+
+def test_queued_alerts_are_sent_as_one_smtp_message(smtp_server):
+    inbox = Inbox()
+    config = smtp_server(inbox)
+    mailer = asyncio.run(_deliver(config, [("Error", "first"), ("Warning", "second")]))
+    assert mailer.sent == 1
+    assert len(inbox.messages) == 1
+    message = inbox.messages[0]
+    assert message["Subject"] == "Error (+1 more)"
+    assert message["From"] == "from@example.com" and message["To"] == "to@example.com"
+    assert message.get_payload().splitlines() == ["Error", "first", "", "Warning", "second"]
+
+
+def test_starttls_is_required_when_enabled(smtp_server):
+    # The test server does not offer STARTTLS, so a mailer that asks for it must not send in plain text.
+    inbox = Inbox()
+    config = dict(smtp_server(inbox), smtp_starttls=True)
+    mailer = asyncio.run(_deliver(config, [("Error", "secret")]))
+    assert mailer.start_tls
+    assert mailer.sent == 0
+    assert inbox.messages == []
+
+
+def test_rejected_message_is_logged_and_later_alerts_are_sent(smtp_server, caplog):
+    inbox = Inbox(reject=1)
+    config = smtp_server(inbox)
+    mailer = asyncio.run(_deliver(config, [("Error", "again")], rounds=2))
+    assert "Could not send 1 alert(s)" in caplog.text
+    assert mailer.sent == 1
+    assert [message["Subject"] for message in inbox.messages] == ["Error"]
@@ -0,0 +1,38 @@
+import collections
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+from metrics import ReportSections, percentiles
+
+
+def test_percentiles_in_milliseconds():
+    samples = collections.deque((i / 1000 for i in range(1, 101)), maxlen=100)
+    summary = percentiles(samples, points=(50, 90, 99))
+    assert summary == {"count": 100, "p50": 51.0, "p90": 91.0, "p99": 100.0, "max": 100.0}
+
+
+def test_percentiles_without_samples_or_scaling():
+    assert percentiles([]) == {"count": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+    assert percentiles([0.25, 0.125], points=(99,), scale=1.0, digits=None) == {"count": 2, "p99": 0.25,
+                                                                                 "max": 0.25}
+
+
+def test_failing_section_does_not_cost_the_report():
+    report = ReportSections()
+    report.register("first", lambda: ["one"])
+    report.register("broken", lambda: 1 / 0)
+    report.register("last", lambda: ["two", "three"])
+    assert report.build() == ["one", "broken: unavailable", "two", "three"]
+    report.register("first", lambda: ["replaced"])
+    report.unregister("broken")
+    assert report.names() == ["first", "last"]
+    assert report.build() == ["replaced", "two", "three"]
+
+
+def test_exchange_sections_build_from_memory(exchange_config):
+    report = ReportSections()
+    KucoinExchange(exchange_config).register_report_sections(report)
+    lines = report.build()
+    assert not [line for line in lines if line.endswith(": unavailable") and not line.startswith("Last price")]
+    assert "Symbol: BTC-USDT" in lines
+    assert any(line.startswith("Load shedding: normal") for line in lines)
+    assert any(line.startswith("Order latency (0 in flight") for line in lines)
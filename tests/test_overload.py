@@ -0,0 +1,44 @@
+from overload import OverloadController, message_time_ms
+
+
+def _controller(**kwargs):
+    return OverloadController(thresholds_ms=(100, 200, 300), recover_seconds=0, min_dwell_seconds=0, alpha=1.0,
+                              **kwargs)
+
+
+def test_message_time_units():
+    assert message_time_ms({"time": 1700000000000}) == 1700000000000
+    assert message_time_ms({"ts": 1700000000000000000}) == 1700000000000
+    assert message_time_ms({"time": "bad"}) is None
+    assert message_time_ms(None) is None
+
+
+def test_steps_up_one_level_at_a_time_and_recovers():
+    overload = _controller()
+    overload.observe(1000)
+    assert overload.mode == "skip_render"
+    overload.observe(1000)
+    overload.observe(1000)
+    assert overload.defer_ta and overload.coalesce_book and overload.skip_render
+    overload.observe(1000)
+    assert overload.mode == "defer_ta"
+
+    # The first calm observation starts the recovery period, the next one steps down.
+    overload.observe(0)
+    assert overload.mode == "defer_ta"
+    overload.observe(0)
+    assert overload.mode == "coalesce_book"
+
+
+def test_transitions_are_counted_past_the_history_length():
+    overload = _controller(history=2)
+    seen = []
+    overload.on_transition(seen.append)
+    for _ in range(3):
+        overload.observe(1000)
+    for _ in range(6):
+        overload.observe(0)
+    assert len(seen) == 6
+    assert len(overload.history()) == 2
+    assert overload.stats()["transitions"] == 6
+    assert overload.mode == "normal"
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from timer_wheel import TimerWheel
+
+
+async def _run_for(wheel, seconds):
+    runner = asyncio.ensure_future(wheel.run())
+    await asyncio.sleep(seconds)
+    wheel.stop()
+    await runner
+
+
+def test_tasks_run_at_their_interval():
+    wheel = TimerWheel(tick=0.01)
+    runs = {"fast": 0, "slow": 0}
+    wheel.schedule("fast", 0.05, lambda: runs.__setitem__("fast", runs["fast"] + 1))
+    wheel.schedule("slow", 0.2, lambda: runs.__setitem__("slow", runs["slow"] + 1))
+    asyncio.run(_run_for(wheel, 0.43))
+    assert 6 <= runs["fast"] <= 9
+    assert runs["slow"] == 2
+    stats = wheel.stats()
+    assert stats["fast"]["runs"] == runs["fast"] and stats["fast"]["errors"] == 0
+    assert stats["fast"]["p99_wakeup_ms"] >= stats["fast"]["p50_wakeup_ms"] >= 0.0
+
+
+def test_timers_wait_out_full_turns_of_the_wheel():
+    # Four slots of 10ms: a 95ms timer goes round the wheel twice before it is due.
+    wheel = TimerWheel(tick=0.01, slots=4)
+    fired = []
+    started = time.monotonic()
+    wheel.schedule("long", 0.095, lambda: fired.append(time.monotonic() - started))
+    asyncio.run(_run_for(wheel, 0.15))
+    assert len(fired) == 1
+    assert 0.09 <= fired[0] < 0.14
+
+
+def test_first_delay_cancel_and_replace():
+    wheel = TimerWheel(tick=0.01)
+    fired = []
+    wheel.schedule("soon", 10, lambda: fired.append("soon"), first_delay=0.02)
+    wheel.schedule("cancelled", 0.02, lambda: fired.append("cancelled"))
+    wheel.cancel("cancelled")
+    wheel.schedule("replaced", 0.02, lambda: fired.append("old"))
+    wheel.schedule("replaced", 10, lambda: fired.append("new"))
+    asyncio.run(_run_for(wheel, 0.1))
+    assert fired == ["soon"]
+    assert set(wheel.stats()) == {"soon", "replaced"}
+
+
+def test_errors_of_plain_and_coroutine_callbacks_are_counted():
+    wheel = TimerWheel(tick=0.01)
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    wheel.schedule("plain", 0.03, lambda: 1 / 0)
+    wheel.schedule("coroutine", 0.03, failing)
+    asyncio.run(_run_for(wheel, 0.08))
+    stats = wheel.stats()
+    assert stats["plain"]["errors"] == stats["plain"]["runs"] >= 1
+    assert stats["coroutine"]["errors"] == stats["coroutine"]["runs"] >= 1
+
+
+def test_a_stall_skips_missed_runs_instead_of_bursting():
+    wheel = TimerWheel(tick=0.01)
+    runs = []
+
+    def task():
+        runs.append(time.monotonic())
+        if len(runs) == 1:
+            time.sleep(0.2)
+
+    wheel.schedule("stalling", 0.02, task)
+    asyncio.run(_run_for(wheel, 0.3))
+    # Ten intervals were missed during the stall; only a handful of runs follow it.
+    assert len(runs) <= 7
+    assert wheel.stats()["stalling"]["max_wakeup_ms"] >= 100
+    assert wheel.report_lines()[0] == "Periodic tasks:"
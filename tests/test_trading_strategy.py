@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from exchanges.kucoin.kucoin_exchange import KucoinExchange
+from trading_strategy import TradingStrategy
+
+
+@pytest.fixture
+def strategy(exchange_config, monkeypatch):
+    strategy = TradingStrategy(dict(exchange_config, ta_min_interval=60), KucoinExchange(exchange_config))
+    refreshes = []
+
+    def update_market_data():
+        refreshes.append(strategy._exchange.candle_version())
+        strategy._ta_version = strategy._exchange.candle_version()
+        strategy._ta_closes = strategy._exchange.candle_closes()
+        strategy._ta_at = time.monotonic()
+
+    monkeypatch.setattr(strategy, "update_market_data", update_market_data)
+    strategy.refreshes = refreshes
+    update_market_data()
+    return strategy
+
+
+def test_open_candle_updates_refresh_without_load_shedding(strategy):
+    assert not strategy._ta_due()
+    strategy._exchange._candle_version += 1
+    assert strategy._ta_due()
+
+
+def test_open_candle_updates_are_throttled_while_shedding_load(strategy):
+    strategy._exchange.overload()._level = 1
+    strategy._exchange._candle_version += 1
+    assert not strategy._ta_due()
+    strategy._ta_at = 0.0
+    assert strategy._ta_due()
+
+
+def test_candle_close_always_refreshes(strategy):
+    strategy._exchange._candle_version += 1
+    strategy._exchange._candle_closes += 1
+    assert strategy._ta_due()
+
+
+def test_deferred_ta_waits_for_the_close(strategy):
+    overload = strategy._exchange.overload()
+    overload._level = 3
+    strategy._ta_at = 0.0
+    strategy._exchange._candle_version += 1
+    assert not strategy._ta_due()
+    strategy._exchange._candle_closes += 1
+    assert strategy._ta_due()
+
+
+def test_ta_min_interval_is_hot_applied(strategy):
+    strategy._exchange.overload()._level = 1
+    strategy.apply_config({"ta_min_interval": 0})
+    strategy._exchange._candle_version += 1
+    assert strategy._ta_due()
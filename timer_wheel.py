@@ -0,0 +1,156 @@
+import asyncio
+import collections
+import inspect
+import logging
+import random
+import time
+
+from metrics import percentiles
+
+log = logging.getLogger("TimerWheel")
+
+
+class _Timer:
+    __slots__ = ("name", "callback", "interval", "jitter", "deadline", "rounds", "cancelled", "stats")
+
+    def __init__(self, name, callback, interval, jitter):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.jitter = jitter
+        self.deadline = 0.0
+        self.rounds = 0
+        self.cancelled = False
+        self.stats = {"runs": 0, "errors": 0, "latencies": collections.deque(maxlen=1000)}
+
+
+class TimerWheel:
+    """
+    Runs periodic tasks from a hashed timer wheel on the event loop.
+
+    The wheel has `slots` buckets of `tick` seconds each. A timer is placed in the bucket its
+    deadline falls in, with the number of full turns left before it is due, so each tick only
+    looks at one bucket whatever the number of timers. Each run is rescheduled from its previous
+    deadline plus the interval and a random jitter, so tasks do not drift and tasks with the same
+    interval do not all wake together. The delay between a deadline and the actual run (the
+    wake-up latency) is recorded per task.
+    """
+
+    def __init__(self, tick=0.1, slots=512):
+        self._tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._timers = {}
+        self._started = time.monotonic()
+        self._current_tick = 0
+        self._running = False
+        self._random = random.Random()
+
+    def schedule(self, name, interval, callback, jitter=0.0, first_delay=None):
+        """
+        Runs callback every `interval` seconds, give or take `jitter`.
+
+        Args:
+            name (str): Identifies the task in stats() and cancel(); an existing task is replaced.
+            interval (float): Seconds between runs.
+            callback (callable): A function or coroutine function taking no arguments.
+            jitter (float): Optional; each run is moved by a random amount within +/- jitter.
+            first_delay (float): Optional; seconds until the first run, defaulting to the interval.
+        """
+        self.cancel(name)
+        timer = _Timer(name, callback, interval, jitter)
+        timer.deadline = time.monotonic() + (interval if first_delay is None else first_delay)
+        self._timers[name] = timer
+        self._insert(timer)
+        return timer
+
+    def cancel(self, name):
+        timer = self._timers.pop(name, None)
+        if timer is not None:
+            timer.cancelled = True
+
+    def _insert(self, timer):
+        due_tick = max(self._current_tick + 1, int((timer.deadline - self._started) / self._tick) + 1)
+        ticks = due_tick - self._current_tick
+        timer.rounds = (ticks - 1) // len(self._slots)
+        self._slots[due_tick % len(self._slots)].append(timer)
+
+    async def run(self):
+        """
+        Advances the wheel until stop() is called.
+        """
+        self._running = True
+        while self._running:
+            next_tick = self._started + (self._current_tick + 1) * self._tick
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            # After a stall, catch up on every tick that was missed.
+            target_tick = int((time.monotonic() - self._started) / self._tick)
+            while self._current_tick < target_tick:
+                self._current_tick += 1
+                self._advance(self._slots[self._current_tick % len(self._slots)])
+
+    def stop(self):
+        self._running = False
+
+    def _advance(self, slot):
+        due = []
+        waiting = []
+        for timer in slot:
+            if timer.cancelled:
+                continue
+            if timer.rounds > 0:
+                timer.rounds -= 1
+                waiting.append(timer)
+            else:
+                due.append(timer)
+        slot[:] = waiting
+        for timer in due:
+            self._fire(timer)
+
+    def _fire(self, timer):
+        now = time.monotonic()
+        timer.stats["latencies"].append(max(0.0, now - timer.deadline))
+        timer.stats["runs"] += 1
+        timer.deadline += timer.interval + self._random.uniform(-timer.jitter, timer.jitter)
+        if timer.deadline <= now:
+            # The loop stalled past a whole interval; skip the missed runs rather than bursting.
+            timer.deadline = now + timer.interval
+        self._insert(timer)
+        try:
+            result = timer.callback()
+            if inspect.isawaitable(result):
+                asyncio.ensure_future(self._await(timer, result))
+        except Exception as ex:
+            timer.stats["errors"] += 1
+            log.error(f"Periodic task {timer.name} failed: {ex}")
+
+    @staticmethod
+    async def _await(timer, result):
+        try:
+            await result
+        except Exception as ex:
+            timer.stats["errors"] += 1
+            log.error(f"Periodic task {timer.name} failed: {ex}")
+
+    def stats(self):
+        """
+        Returns runs, errors and wake-up latency in milliseconds per task.
+        """
+        result = {}
+        for name, timer in self._timers.items():
+            wakeup = percentiles(timer.stats["latencies"])
+            result[name] = {
+                "interval": timer.interval,
+                "runs": timer.stats["runs"],
+                "errors": timer.stats["errors"],
+                "p50_wakeup_ms": wakeup["p50"],
+                "p99_wakeup_ms": wakeup["p99"],
+                "max_wakeup_ms": wakeup["max"],
+            }
+        return result
+
+    def report_lines(self):
+        lines = ["Periodic tasks:"]
+        for name, stats in self.stats().items():
+            lines.append(f"  {name}: {stats['runs']} runs, {stats['errors']} errors, wake-up p50 "
+                         f"{stats['p50_wakeup_ms']}ms, p99 {stats['p99_wakeup_ms']}ms")
+        return lines
@@ -1,8 +1,9 @@
 import os
-import pandas as pd
 import logging
+import time
 from exchanges.kucoin.kucoin_exchange import KucoinExchange
-from tabulate import tabulate
+from exchanges.kucoin.kucoin_ta import load_pandas
+from overload import NORMAL
 
 
 class TradingStrategy:
@@ -13,9 +14,14 @@ class TradingStrategy:
 
         self._orderbook = None
         self.ta_list = None
+        self.bands = None
+        self.last_price = None
+        self._ta_version = None
+        self._ta_closes = None
+        self._ta_at = 0.0
+        self._ta_table = None
 
         self.log = logging.getLogger("TradingStrategy")
-        self.log.setLevel(config["log_level"])
         if not isinstance(exchange, KucoinExchange):
             raise TypeError("Exchange is wrong type.")
         self._exchange = exchange
@@ -25,14 +31,37 @@ class TradingStrategy:
         self._exchange.set_on_message(self.receive_ws_update)
 
         self._s_length = int(config["sma_period"])
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', None)
-        pd.set_option('display.max_colwidth', None)
+        # Seconds between indicator refreshes on updates of the open candle; closes always refresh.
+        self._ta_min_interval = float(config.get("ta_min_interval", 1.0))
+        if hasattr(config, "subscribe"):
+            config.subscribe(self.apply_config)
+
+    def apply_config(self, changes):
+        """
+        Hot-swaps strategy parameters after a configuration reload.
+
+        The indicators and the order grid are rebuilt from the candles already in the cache, so no
+        data is re-downloaded and the websocket stays connected.
+        """
+        if "order_volumes" in changes:
+            self.order_volumes = changes["order_volumes"]
+        if "order_levels" in changes:
+            self.standard_deviations = changes["order_levels"]
+        if "sma_period" in changes:
+            self._s_length = int(changes["sma_period"])
+            self._exchange.ta().set_period(self._s_length)
+        if "ta_min_interval" in changes:
+            self._ta_min_interval = float(changes["ta_min_interval"])
+
+        if not self.not_initialized():
+            self.update_market_data()
 
     def initialize(self):
         self._exchange.initialize()
 
+    async def initialize_async(self):
+        await self._exchange.initialize_async()
+
     def receive_ws_update(self, ws_data=None, msg=None):
         if self.not_initialized():
             return
@@ -56,38 +85,59 @@ class TradingStrategy:
                 # Check the type of the order event
 
                 if event_type == 'received':
-                    logging.info(f'Received new order {data}')
+                    self.log.info('Received new order %s', data)
 
                 elif event_type == 'done':
                     if order_status == 'cancelled':
-                        logging.info(f'Order cancelled: {data}')
+                        self.log.info('Order cancelled: %s', data)
 
                         # Perform a strategy update when an order is cancelled.
                         # For example, you might want to place a new order here.
                         # self.update(event)
 
                     if order_status == 'filled' or order_status == 'matched':
-                        logging.info(f'Order {data["orderId"]} has been {order_status}: {data}')
+                        self.log.info('Order %s has been %s: %s', data["orderId"], order_status, data)
 
                         # Perform a strategy update when an order is filled.
                         # For example, you might want to place a new order here.
                         self.place_match_orders(data)
 
                 elif event_type == 'open':
-                    logging.info(f'Order {data["orderId"]} is open: {data}')
+                    self.log.info('Order %s is open: %s', data["orderId"], data)
 
                 else:
-                    logging.warning(f'Unknown order event type: {event_type}')
+                    self.log.warning('Unknown order event type: %s', event_type)
+        if self._ta_due():
+            self.update_market_data()
         self.print_market_data()
 
+    def _ta_due(self):
+        if self._exchange.candle_closes() != self._ta_closes:
+            return True
+        overload = self._exchange.overload()
+        # At the last load shedding step the indicators wait for the candle to close.
+        if overload.defer_ta or self._exchange.candle_version() == self._ta_version:
+            return False
+        # Every open-candle update refreshes them, unless the bot is shedding load.
+        return overload.level == NORMAL or time.monotonic() - self._ta_at >= self._ta_min_interval
+
     def not_initialized(self):
-        return self._orderbook is None
+        return self._orderbook is None or not self._exchange.readiness().is_ready()
 
     def update_market_data(self):
+        pd = load_pandas()
+        self._ta_version = self._exchange.candle_version()
+        self._ta_closes = self._exchange.candle_closes()
+        self._ta_at = time.monotonic()
         self._orderbook = self._exchange.market().ws_get_order_book()
+        self.last_price = self._exchange.last_price().decision()
         _ochl = self._exchange.ta().get_ta()
-        # Calculate the Bollinger Bands
-        _bbands = _ochl.ta.bbands(close="close", length=self._s_length, std=2)
+        # Calculate the Bollinger Bands for every order level at once: (candles, levels, [upper, lower])
+        self.bands = self._exchange.ta().get_bands(self.standard_deviations)
+        _bbands = pd.DataFrame(index=_ochl.index)
+        for index, level in enumerate(self.standard_deviations):
+            _bbands[f"BBU_{level}"] = self.bands[:, index, 0]
+            _bbands[f"BBL_{level}"] = self.bands[:, index, 1]
         # Reverse the DataFrames
         reversed_ochl = _ochl.round(2)
         reversed_bbands = _bbands.round(2)  # Round to 2 decimal places
@@ -98,6 +148,8 @@ class TradingStrategy:
 
         # Convert DataFrame to list of dictionaries for tabulation
         self.ta_list = combined_df.to_dict('records')
+        self._ta_table = None
+        self._exchange.readiness().mark_first_decision()
         return
 
     def print_market_data(self):
@@ -105,8 +157,10 @@ class TradingStrategy:
         if self.ta_list is None:
             self.update_market_data()
         # Get the asks and bids
-        if self.not_initialized():
+        if self.not_initialized() or self._exchange.overload().skip_render:
             return
+        from tabulate import tabulate
+
         asks = sorted(self._orderbook['asks'].items())[:10]
         asks = asks[::-1]
         bids = sorted(self._orderbook['bids'].items(), reverse=True)[:10]
@@ -119,7 +173,10 @@ class TradingStrategy:
         last_price = self._exchange.market().ws_get_last_price()
 
         # Format the tables
-        ta_table = tabulate(self.ta_list, headers='keys', tablefmt='pretty').split('\n')  # use self.ta_list here
+        # The indicator table only changes with ta_list, so it is formatted once per refresh.
+        if self._ta_table is None:
+            self._ta_table = tabulate(self.ta_list, headers='keys', tablefmt='pretty').split('\n')
+        ta_table = self._ta_table
         bids_table = tabulate(bids, headers='keys', tablefmt='pretty').split('\n')
         asks_table = tabulate(asks, headers='keys', tablefmt='pretty').split('\n')
 